@@ -0,0 +1,229 @@
+# ----------------------------------------------------------------------------
+# Datei:  batch.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Stapel-Verarbeitung: liest Anfragen aus einer JSONL Datei (eine Anfrage pro
+# Zeile), schickt sie parallel an den Server, und schreibt jede Antwort als
+# eine Zeile in die Ausgabe-Datei, sobald sie fertig ist:
+#
+#    python batch.py uebungen.jsonl antworten.jsonl --workers 8
+#
+# Eine Anfrage sieht so aus (alles außer "messages" ist optional):
+#
+#    {"custom_id": "uebung-1", "model": "gpt-3.5-turbo", "temperature": 0.7,
+#     "max_tokens": 200, "top_p": 1, "messages": [{"role": "user", ...}]}
+#
+# Zeilen im Format der OpenAI Batch API ({"custom_id": ..., "body": {...}})
+# werden ebenfalls verstanden. Die Ausgabe-Datei ist gleichzeitig der Check-
+# point: wird ein Lauf unterbrochen und neu gestartet, werden alle bereits
+# erfolgreich beantworteten custom_id's übersprungen.
+#
+#    python batch.py uebungen.jsonl --emit-batch-api upload.jsonl
+#
+# schreibt die Anfragen stattdessen als Eingabe-Datei für die OpenAI Batch API
+# (zum Hochladen, ohne selbst etwas zu senden).
+#
+# Alle Anfragen laufen auf LANE_BATCH des Rate-Limit "scheduler"; mit --rpm
+# und --tpm lassen sich dessen Startwerte vorgeben.
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import json          # JSONL in, JSONL out
+import os            # operating system stuff
+import sys           # system specifies
+import time          # latency
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from chatclient import complete_chat, scheduler, DEFAULT_MODEL, LANE_BATCH
+from metrics    import RequestMetrics
+
+BATCH_API_URL = "/v1/chat/completions"
+
+# ----------------------------------------------------------------------------
+# die Anfragen aus der Eingabe-Datei lesen (als Generator - die Datei wird
+# nie komplett in den Speicher geladen).
+# ----------------------------------------------------------------------------
+def read_requests(path):
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            spec = json.loads(line)
+            body = spec.get("body", spec)
+            yield {
+                "custom_id"  : str(spec.get("custom_id") or f"zeile-{number}"),
+                "model"      : body.get("model", DEFAULT_MODEL),
+                "messages"   : body["messages"],
+                "temperature": body.get("temperature", 0.7),
+                "max_tokens" : body.get("max_tokens", 200),
+                "top_p"      : body.get("top_p", 1),
+            }
+
+# ----------------------------------------------------------------------------
+# custom_id's, die in der Ausgabe-Datei bereits ohne Fehler stehen ...
+# ----------------------------------------------------------------------------
+def finished_ids(path):
+    done = {}
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue   # halbe Zeile vom Abbruch
+            done[result["custom_id"]] = result.get("error") is None
+    return {custom_id for custom_id, ok in done.items() if ok}
+
+# ----------------------------------------------------------------------------
+# eine einzelne Anfrage (läuft in einem Arbeits-Thread) ...
+# ----------------------------------------------------------------------------
+def run_request(request):
+    metrics = RequestMetrics("batch", request["model"])
+    result  = { "custom_id": request["custom_id"], "model": request["model"] }
+    try:
+        result["response"] = complete_chat(request["messages"],
+            model       = request["model"],
+            temperature = request["temperature"],
+            max_tokens  = request["max_tokens"],
+            top_p       = request["top_p"],
+            metrics     = metrics,
+            lane        = LANE_BATCH)
+        result["error"] = None
+    except Exception as ex:
+        metrics.finish(f"{ex}")
+        result["response"] = None
+        result["error"]    = f"{type(ex).__name__}: {ex}"
+
+    result["usage"]      = { "prompt_tokens": metrics.prompt_tokens,
+                             "completion_tokens": metrics.completion_tokens }
+    result["latency_ms"] = round(metrics.total() * 1000, 1)
+    result["retries"]    = metrics.retries
+    return result
+
+# ----------------------------------------------------------------------------
+# nach einem Abbruch kann die Ausgabe-Datei mit einer halben Zeile enden -
+# sie wird abgeschnitten, sonst hinge das nächste Ergebnis daran (und wäre
+# beim nächsten Lauf ebenfalls unlesbar).
+# ----------------------------------------------------------------------------
+def drop_partial_line(path, block=65536):
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb+") as file:
+        end = file.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            return
+
+        position = end
+        while position > 0:
+            start = max(0, position - block)
+            file.seek(start)
+            newline = file.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                file.truncate(start + newline + 1)
+                return
+            position = start
+        file.truncate(0)
+
+def run_batch(input_path, output_path, workers=4, progress=None):
+    drop_partial_line(output_path)
+    skip  = finished_ids(output_path)
+    stats = { "done": 0, "skipped": 0, "errors": 0 }
+
+    # ------------------------------------------------------------------------
+    # es sind nie mehr als 2 * workers Anfragen gleichzeitig unterwegs, auch
+    # wenn die Eingabe-Datei hunderttausende Zeilen hat.
+    # ------------------------------------------------------------------------
+    with open(output_path, "a", encoding="utf-8") as output, \
+         ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+
+        running = set()
+
+        def collect(finished):
+            for future in finished:
+                result = future.result()
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                stats["done"]   += 1
+                stats["errors"] += result["error"] is not None
+                if progress is not None:
+                    progress(stats)
+
+        for request in read_requests(input_path):
+            if request["custom_id"] in skip:
+                stats["skipped"] += 1
+                continue
+
+            if len(running) >= 2 * workers:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+            running.add(pool.submit(run_request, request))
+
+        finished, running = wait(running)
+        collect(finished)
+
+    return stats
+
+# ----------------------------------------------------------------------------
+# Anfragen als Eingabe-Datei für die OpenAI Batch API schreiben ...
+# ----------------------------------------------------------------------------
+def emit_batch_api(input_path, output_path):
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as output:
+        for request in read_requests(input_path):
+            body = { key: request[key]
+                for key in ("model", "messages", "temperature", "max_tokens", "top_p") }
+            output.write(json.dumps({
+                "custom_id": request["custom_id"],
+                "method"   : "POST",
+                "url"      : BATCH_API_URL,
+                "body"     : body,
+            }, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Anfragen aus einer JSONL Datei abarbeiten")
+    parser.add_argument("input", help="Anfragen (JSONL)")
+    parser.add_argument("output", nargs="?", help="Antworten (JSONL, wird fortgesetzt)")
+    parser.add_argument("--workers", type=int, default=4, help="gleichzeitige Anfragen")
+    parser.add_argument("--rpm", type=int, help="Anfragen pro Minute (Startwert)")
+    parser.add_argument("--tpm", type=int, help="Token pro Minute (Startwert)")
+    parser.add_argument("--emit-batch-api", metavar="DATEI",
+        help="nur eine Eingabe-Datei für die OpenAI Batch API schreiben")
+    args = parser.parse_args(argv)
+
+    if args.emit_batch_api:
+        count = emit_batch_api(args.input, args.emit_batch_api)
+        print(f"{count} Anfragen nach {args.emit_batch_api} geschrieben")
+        return 0
+
+    if not args.output:
+        parser.error("Ausgabe-Datei fehlt")
+
+    scheduler.configure(rpm=args.rpm, tpm=args.tpm, batch_reserve=0.0)
+
+    begin = time.perf_counter()
+    stats = run_batch(args.input, args.output, args.workers,
+        lambda stats: print(f"{stats['done']} fertig, {stats['errors']} Fehler", end="\r"))
+
+    print()
+    print(f"fertig: {stats['done']}, übersprungen: {stats['skipped']}, "
+        + f"Fehler: {stats['errors']} ({time.perf_counter() - begin:.1f} s)")
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
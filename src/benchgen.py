@@ -0,0 +1,111 @@
+# ----------------------------------------------------------------------------
+# Datei:  benchgen.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Erzeugt künstliche Chat-Datenbanken für die Messungen in benchmark.py:
+#
+#    python benchgen.py bench.db --sessions 100000 --messages 100000
+#
+# Die Hälfte der Nachrichten landet in einer einzigen, großen Session (für
+# das Laden und Scrollen langer Verläufe), der Rest wird reihum auf alle
+# Sessions verteilt. Mit gleichem "--seed" entsteht immer dieselbe Datenbank.
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import datetime      # date, and time routines
+import os            # operating system stuff
+import random        # synthetic data
+import sys           # system specifies
+
+from database import open_database
+from tokens   import count_tokens
+
+WORDS = (
+    "Hallo Welt Python Qt Datenbank Session Nachricht Antwort Frage Tutor "
+    "Programm Funktion Klasse Schleife Variable Fehler Beispiel Übung Lösung "
+    "SQLite Index Abfrage Fenster Liste Zeile Text Token Modell Server Anfrage "
+    "schnell langsam groß klein neu alt gut einfach schwierig warum wie was"
+).split()
+
+BIG_SESSION_NAME = "benchmark: große Session"
+
+# ----------------------------------------------------------------------------
+# ein zufälliger Text mit "low" bis "high" Wörtern ...
+# ----------------------------------------------------------------------------
+def random_text(rnd, low=5, high=120):
+    return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(low, high)))
+
+def generate_database(path, sessions, messages, seed=4711, batch=10000, progress=None):
+    rnd   = random.Random(seed)
+    start = datetime.datetime(2023, 1, 1)
+
+    if os.path.exists(path):
+        os.remove(path)
+    conn = open_database(path)
+    conn.execute("PRAGMA synchronous = OFF")
+
+    try:
+        # --------------------------------------------------------------------
+        # Sessions (eine pro Minute, aufsteigend) ...
+        # --------------------------------------------------------------------
+        with conn:
+            rows = []
+            for number in range(max(1, sessions)):
+                stamp = start + datetime.timedelta(minutes=number)
+                name  = BIG_SESSION_NAME if number == 0 else f"Session {number}"
+                rows.append((stamp.strftime("%Y-%m-%d"), stamp.strftime("%H:%M:%S"), name))
+            conn.executemany("INSERT INTO session (datum,zeit,name) VALUES (?,?,?)", rows)
+
+        ids = [row[0] for row in conn.execute("SELECT id FROM session ORDER BY id")]
+        big = ids[0]
+
+        # --------------------------------------------------------------------
+        # Nachrichten, in Paketen zu "batch" Zeilen pro Transaktion ...
+        # --------------------------------------------------------------------
+        done = 0
+        while done < messages:
+            rows = []
+            for number in range(done, min(messages, done + batch)):
+                session_id = big if number % 2 == 0 else ids[(number // 2) % len(ids)]
+                stamp      = start + datetime.timedelta(seconds=number)
+                content    = random_text(rnd)
+                rows.append((session_id,
+                    "user" if number % 4 < 2 else "assistant",
+                    stamp.strftime("%Y-%m-%d"), stamp.strftime("%H:%M:%S"),
+                    content, count_tokens(content)))
+
+            with conn:
+                conn.executemany('''
+                    INSERT INTO messages (session_id, role, datum, zeit, content, tokens)
+                    VALUES (?,?,?,?,?,?)
+                ''', rows)
+
+            done += len(rows)
+            if progress is not None:
+                progress(done, messages)
+
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    return big
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="künstliche Chat-Datenbank erzeugen")
+    parser.add_argument("path", help="Ziel-Datenbank (wird überschrieben)")
+    parser.add_argument("--sessions", type=int, default=1000, help="Anzahl Sessions")
+    parser.add_argument("--messages", type=int, default=1000, help="Anzahl Nachrichten")
+    parser.add_argument("--seed", type=int, default=4711, help="Startwert für den Zufall")
+    args = parser.parse_args(argv)
+
+    generate_database(args.path, args.sessions, args.messages, args.seed,
+        progress=lambda done, total: print(f"{done}/{total}", end="\r"))
+    print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+# ----------------------------------------------------------------------------
+# Datei:  benchmark.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Messungen für die zeitkritischen Stellen der Anwendung - ohne Bildschirm
+# (Qt läuft mit QT_QPA_PLATFORM=offscreen) und ohne Netzwerk:
+#
+#    python benchmark.py                          => Größen 1k und 100k
+#    python benchmark.py --sizes 1k 100k 1m       => auch 1 Million Zeilen
+#    python benchmark.py --output bench.json      => Ergebnisse als JSON
+#    python benchmark.py --baseline alt.json      => mit älterem Lauf vergleichen
+#    python benchmark.py --no-gui                 => nur die SQLite Abfragen
+#
+# Die Test-Datenbanken erzeugt benchgen.py (einmalig, im Verzeichnis
+# data/bench). Jede Messung hat eine feste Obergrenze (THRESHOLDS_MS); mit
+# --baseline gilt zusätzlich: nicht mehr als "--tolerance" mal langsamer als
+# beim letzten Lauf. Bei einer Überschreitung ist der Rückgabe-Wert 1.
+# ----------------------------------------------------------------------------
+import os            # operating system stuff
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse      # command line
+import datetime      # date, and time routines
+import json          # machine readable results
+import platform      # system information
+import random        # synthetic data
+import sqlite3       # database: sqlite
+import statistics    # median
+import sys           # system specifies
+import time          # high resolution timer
+
+from benchgen import generate_database, random_text, BIG_SESSION_NAME
+from database import open_database, create_session, add_turn, session_page
+from database import session_exists
+from database import latest_messages, search_messages, DATA_PATH
+
+SIZES = { "1k": 1000, "100k": 100000, "1m": 1000000 }
+
+# ----------------------------------------------------------------------------
+# Obergrenzen (Median einer einzelnen Ausführung, in Millisekunden) ...
+# ----------------------------------------------------------------------------
+THRESHOLDS_MS = {
+    "db.session_page"          :   5.0,
+    "db.session_page_deep"     :   5.0,
+    "db.latest_messages"       :  20.0,
+    "db.session_lookup"        :   1.0,
+    "db.search"                : 100.0,
+    "db.create_session"        :  10.0,
+    "db.add_turn"              :  10.0,
+    "gui.add_chat_item"        :  10.0,
+    "gui.load_session"         : 100.0,
+    "gui.populate_transcript"  : 500.0,
+    "gui.scroll"               :  50.0,
+    "gui.resize"               :  50.0,
+    "gui.select_all"           :  50.0,
+    "gui.new_session"          :  20.0,
+    "gui.ist_session_vorhanden":   1.0,
+    "gui.filter_sessions"      :  20.0,
+}
+
+# ----------------------------------------------------------------------------
+# "func" mehrmals aufrufen; zurück kommen Median, Minimum und Maximum in ms.
+# ----------------------------------------------------------------------------
+def measure(func, repeat=20):
+    times = []
+    for number in range(repeat):
+        begin = time.perf_counter()
+        func(number)
+        times.append((time.perf_counter() - begin) * 1000)
+
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms"   : min(times),
+        "max_ms"   : max(times),
+        "runs"     : repeat,
+    }
+
+# ----------------------------------------------------------------------------
+# Test-Datenbank für eine Größe holen (bzw. beim ersten Mal erzeugen) ...
+# ----------------------------------------------------------------------------
+def bench_database(workdir, label, regenerate=False):
+    path = os.path.join(workdir, f"bench_{label}.db")
+    if regenerate or not os.path.exists(path):
+        print(f"erzeuge {path} ...", file=sys.stderr)
+        generate_database(path, SIZES[label], SIZES[label])
+    return path
+
+def big_session(conn):
+    return conn.execute(
+        "SELECT id FROM session WHERE name = ? ORDER BY id LIMIT 1",
+        (BIG_SESSION_NAME,)).fetchone()[0]
+
+# ----------------------------------------------------------------------------
+# Messungen direkt auf der Datenbank ...
+# ----------------------------------------------------------------------------
+def db_benchmarks(conn, size, repeat):
+    results = {}
+    big     = big_session(conn)
+    middle  = conn.execute('''
+        SELECT datum, zeit, id FROM session
+        ORDER BY datum DESC, zeit DESC, id DESC LIMIT 1 OFFSET ?
+    ''', (size // 2,)).fetchone()
+
+    results["db.session_page"] = measure(
+        lambda number: session_page(conn, 50), repeat)
+    results["db.session_page_deep"] = measure(
+        lambda number: session_page(conn, 50, middle), repeat)
+    results["db.latest_messages"] = measure(
+        lambda number: latest_messages(conn, big), repeat)
+    results["db.session_lookup"] = measure(
+        lambda number: session_exists(conn, f"Session {size - 1 - number}"), repeat)
+    results["db.search"] = measure(
+        lambda number: search_messages(conn, "Datenbank Ind"), repeat)
+
+    # ------------------------------------------------------------------------
+    # schreibende Messungen: die neuen Zeilen werden danach wieder entfernt,
+    # damit die Test-Datenbank für den nächsten Lauf gleich bleibt.
+    # ------------------------------------------------------------------------
+    results["db.create_session"] = measure(
+        lambda number: create_session(conn, f"benchmark {number}"), repeat)
+    results["db.add_turn"] = measure(
+        lambda number: add_turn(conn, big, [
+            ("user",      "2024-01-01", "12:00:00", random_text(random.Random(number))),
+            ("assistant", "2024-01-01", "12:00:01", random_text(random.Random(number))) ]),
+        repeat)
+
+    return results
+
+# ----------------------------------------------------------------------------
+# Messungen mit dem echten HauptFenster (offscreen) ...
+# ----------------------------------------------------------------------------
+def gui_benchmarks(path, size, repeat):
+    import gettext
+    gettext.NullTranslations().install()
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    import main
+    from chatview import ChatMessage
+
+    main.conn        = open_database(path)
+    main.conn_cursor = main.conn.cursor()
+
+    results = {}
+    fenster = main.HauptFenster()
+    app.processEvents()
+
+    big  = big_session(main.conn)
+    view = fenster.listbox_widget
+
+    def run(func):
+        def step(number):
+            func(number)
+            app.processEvents()
+        return step
+
+    results["gui.load_session"] = measure(
+        run(lambda number: fenster.load_session(big)), repeat)
+
+    # ------------------------------------------------------------------------
+    # den gesamten Verlauf (bis zu "size" Nachrichten) in das Model laden ...
+    # ------------------------------------------------------------------------
+    rows     = latest_messages(main.conn, big, size)
+    messages = lambda: [
+        ChatMessage(content, main.USER_MODE if role == "user" else main.ASSISTANT_MODE,
+            date_str, time_str, msg_id, tokens)
+        for msg_id, role, date_str, time_str, content, tokens in rows ]
+
+    results["gui.populate_transcript"] = measure(
+        run(lambda number: fenster.chat_model.set_messages(messages())),
+        max(3, repeat // 5))
+
+    scrollbar = view.verticalScrollBar()
+    results["gui.scroll"] = measure(
+        run(lambda number: scrollbar.setValue(
+            scrollbar.maximum() * (number % 20) // 19)), repeat)
+
+    # ------------------------------------------------------------------------
+    # zwischen zwei Fenster-Breiten wechseln: ab dem zweiten Wechsel kommen
+    # alle Layouts aus dem DocumentCache.
+    # ------------------------------------------------------------------------
+    results["gui.resize"] = measure(
+        run(lambda number: fenster.resize(900 + (number % 2) * 240, 700)), repeat)
+
+    results["gui.select_all"] = measure(
+        run(lambda number: fenster.checkbox_click_header_right(2 if number % 2 == 0 else 0)),
+        repeat)
+
+    results["gui.add_chat_item"] = measure(
+        run(lambda number: fenster.add_chat_item(f"Frage {number}", main.USER_MODE)),
+        repeat)
+
+    results["gui.new_session"] = measure(
+        run(lambda number: fenster.new_session(f"benchmark gui {number}")), repeat)
+
+    # ------------------------------------------------------------------------
+    # Prüfung auf doppelte Namen und Filter der Session-Liste über den Katalog
+    # (in der Anwendung wird er nach dem Start im Hintergrund geladen) ...
+    # ------------------------------------------------------------------------
+    from catalog import SessionCatalog
+    fenster.session_catalog = SessionCatalog.load(main.conn)
+
+    results["gui.filter_sessions"] = measure(
+        run(lambda number: (fenster.entryfield_left.setText(f"Session {number % 10}"),
+            fenster.filter_sessions())), repeat)
+
+    results["gui.ist_session_vorhanden"] = measure(
+        lambda number: fenster.ist_session_vorhanden(f"Session {size - 1 - number}"),
+        repeat)
+
+    fenster.executor.shutdown()
+    fenster.close()
+    main.conn.close()
+    return results
+
+# ----------------------------------------------------------------------------
+# Zeilen, die während der Messungen neu angelegt wurden, wieder entfernen ...
+# ----------------------------------------------------------------------------
+def restore_database(path, last_session, last_message):
+    conn = open_database(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM messages WHERE id > ?", (last_message,))
+            conn.execute("DELETE FROM session  WHERE id > ?", (last_session,))
+    finally:
+        conn.close()
+
+# ----------------------------------------------------------------------------
+# Ergebnisse gegen die Obergrenzen und (optional) einen älteren Lauf prüfen.
+# ----------------------------------------------------------------------------
+def check_results(results, baseline=None, tolerance=1.5):
+    previous = {}
+    if baseline:
+        previous = {(entry["size"], entry["name"]): entry["median_ms"]
+            for entry in baseline["results"]}
+
+    failed = 0
+    for entry in results:
+        reasons = []
+
+        limit = THRESHOLDS_MS.get(entry["name"])
+        entry["threshold_ms"] = limit
+        if limit is not None and entry["median_ms"] > limit:
+            reasons.append(f"über {limit} ms")
+
+        before = previous.get((entry["size"], entry["name"]))
+        entry["baseline_ms"] = before
+        if before is not None and entry["median_ms"] > max(before * tolerance, before + 1.0):
+            reasons.append(f"{entry['median_ms'] / before:.1f}x langsamer als zuvor")
+
+        entry["ok"] = not reasons
+        if reasons:
+            failed += 1
+            entry["reason"] = ", ".join(reasons)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Messungen ohne Bildschirm und Netzwerk")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["1k", "100k"],
+        help="Größen der Test-Datenbanken")
+    parser.add_argument("--repeat", type=int, default=20, help="Wiederholungen pro Messung")
+    parser.add_argument("--workdir", default=os.path.join(DATA_PATH, "bench"),
+        help="Verzeichnis für die Test-Datenbanken")
+    parser.add_argument("--regenerate", action="store_true", help="Test-Datenbanken neu erzeugen")
+    parser.add_argument("--no-gui", action="store_true", help="nur die Datenbank messen")
+    parser.add_argument("--output", help="Ergebnisse als JSON in diese Datei schreiben")
+    parser.add_argument("--baseline", help="Ergebnisse eines älteren Laufs (JSON)")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+        help="erlaubter Faktor gegenüber --baseline")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = []
+    for label in args.sizes:
+        path = bench_database(args.workdir, label, args.regenerate)
+
+        conn = open_database(path)
+        last_session = conn.execute("SELECT MAX(id) FROM session" ).fetchone()[0]
+        last_message = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0]
+        try:
+            measured = db_benchmarks(conn, SIZES[label], args.repeat)
+        finally:
+            conn.close()
+
+        if not args.no_gui:
+            measured.update(gui_benchmarks(path, SIZES[label], args.repeat))
+
+        restore_database(path, last_session, last_message)
+
+        for name, values in measured.items():
+            results.append(dict(size=label, name=name, **values))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    failed = check_results(results, baseline, args.tolerance)
+
+    for entry in results:
+        print(f"{entry['size']:>5} {entry['name']:<26} {entry['median_ms']:9.3f} ms"
+            + ("" if entry["ok"] else f"  FEHLER: {entry['reason']}"))
+
+    if args.output:
+        report = {
+            "created" : datetime.datetime.now().isoformat(timespec="seconds"),
+            "python"  : platform.python_version(),
+            "sqlite"  : sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "results" : results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# ----------------------------------------------------------------------------
+# Datei:  cache.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Zwischenspeicher (Cache) für Antworten von chat.completions. Wird die gleiche
+# Anfrage (gleiches Model, gleiche Nachrichten, gleiche Temperatur, max_tokens
+# und top_p) ein zweites Mal gestellt, kommt die Antwort direkt aus der SQLite
+# Datenbank der Anwendung - ohne Wartezeit und ohne Kosten. Das gilt nur für
+# Anfragen mit Temperatur 0: bei allen anderen ist jede Antwort eine neue
+# Stichprobe, und eine gespeicherte würde immer wieder gleich ausgespielt.
+#
+# Der Schlüssel ist ein SHA-256 Hash über die normalisierte Anfrage. Häufig
+# benutzte Einträge liegen zusätzlich im Speicher (LRU), damit ein Treffer nur
+# wenige Mikrosekunden kostet. Alte oder selten benutzte Einträge werden nach
+# Anzahl, Größe und Alter wieder entfernt.
+# ----------------------------------------------------------------------------
+import hashlib       # sha256
+import json          # canonical request form
+import time          # timestamps
+
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------------
+# Standard-Grenzen für den Cache ...
+# ----------------------------------------------------------------------------
+CACHE_MAX_ENTRIES = 10000
+CACHE_MAX_BYTES   = 64 * 1024 * 1024
+CACHE_MAX_AGE     = 30 * 24 * 60 * 60   # 30 Tage in Sekunden
+CACHE_MEMORY_SIZE = 512                 # Einträge im Speicher
+
+# ----------------------------------------------------------------------------
+# Nachrichten normalisieren: nur "role" und "content" zählen, und Leerzeichen
+# am Anfang/Ende spielen keine Rolle.
+# ----------------------------------------------------------------------------
+def normalize_messages(messages):
+    return [
+        { "role": message["role"], "content": f"{message['content']}".strip() }
+        for message in messages
+    ]
+
+# ----------------------------------------------------------------------------
+# nur deterministische Anfragen (Temperatur 0) kommen in den Cache ...
+# ----------------------------------------------------------------------------
+def cacheable(temperature):
+    return float(temperature) == 0
+
+# ----------------------------------------------------------------------------
+# der Schlüssel für eine Anfrage ...
+# ----------------------------------------------------------------------------
+def cache_key(model, messages, temperature, max_tokens, top_p):
+    canonical = json.dumps({
+        "model"       : model,
+        "messages"    : normalize_messages(messages),
+        "temperature" : float(temperature),
+        "max_tokens"  : int(max_tokens),
+        "top_p"       : float(top_p),
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+# ----------------------------------------------------------------------------
+# der Cache selbst. Er arbeitet auf der (bereits geöffneten) Verbindung zur
+# Datenbank der Anwendung und darf nur aus dem Thread benutzt werden, der die
+# Verbindung geöffnet hat (bei uns: dem GUI-Thread).
+# ----------------------------------------------------------------------------
+class CompletionCache:
+    def __init__(self, conn,
+        max_entries = CACHE_MAX_ENTRIES,
+        max_bytes   = CACHE_MAX_BYTES,
+        max_age     = CACHE_MAX_AGE,
+        memory_size = CACHE_MEMORY_SIZE,
+        evict_now   = True):
+
+        self.conn        = conn
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.max_age     = max_age
+        self.memory_size = memory_size
+
+        self.memory  = OrderedDict()   # key => (response, created) (LRU im Speicher)
+        self.touched = {}              # key => last_used, noch nicht gespeichert
+        self.hits    = 0
+        self.misses  = 0
+        self.count   = 0               # Anzahl Einträge in der Tabelle
+        self.size    = 0               # Summe der Antwort-Größen (Bytes)
+
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS completion_cache (
+                key       TEXT PRIMARY KEY,
+                model     TEXT,
+                response  TEXT,
+                created   REAL,
+                last_used REAL,
+                hits      INTEGER DEFAULT 0,
+                size      INTEGER
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS completion_cache_last_used
+            ON completion_cache (last_used)
+        ''')
+
+        # ----------------------------------------
+        # evict() liest die gesamte Tabelle - beim
+        # Programm-Start wird es deshalb erst nach
+        # dem ersten Zeichnen aufgerufen.
+        # ----------------------------------------
+        if evict_now:
+            self.evict()
+
+    # ----------------------------------------
+    # Antwort suchen; None, wenn es (noch)
+    # keine gibt.
+    # ----------------------------------------
+    def get(self, key):
+        now = time.time()
+
+        row = self.memory.get(key)
+        if row is not None:
+            self.memory.move_to_end(key)
+        else:
+            row = self.conn.execute(
+                "SELECT response, created FROM completion_cache WHERE key = ?",
+                (key,)).fetchone()
+
+        if row is None or now - row[1] > self.max_age:
+            self.memory.pop(key, None)
+            self.misses += 1
+            return None
+
+        response = row[0]
+        self.remember(key, response, row[1])
+
+        # ----------------------------------------
+        # last_used wird nur vorgemerkt, und erst
+        # beim nächsten flush() geschrieben.
+        # ----------------------------------------
+        self.touched[key] = now
+        self.hits += 1
+        return response
+
+    def put(self, key, model, response):
+        if not response.strip():   # leere Antwort (abgebrochen): nicht merken
+            return
+
+        now  = time.time()
+        size = len(response.encode("utf-8"))
+
+        old = self.conn.execute(
+            "SELECT size FROM completion_cache WHERE key = ?", (key,)).fetchone()
+        if old is not None:
+            self.count -= 1
+            self.size  -= old[0]
+
+        self.conn.execute('''
+            INSERT OR REPLACE INTO completion_cache
+            (key, model, response, created, last_used, hits, size)
+            VALUES (?,?,?,?,?,0,?)
+        ''', (key, model, response, now, now, size))
+
+        self.count += 1
+        self.size  += size
+
+        self.remember(key, response, now)
+        self.touched.pop(key, None)
+
+        if self.count > self.max_entries or self.size > self.max_bytes:
+            self.evict()
+        else:
+            self.flush()
+
+    def remember(self, key, response, created):
+        self.memory[key] = (response, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    # ----------------------------------------
+    # vorgemerkte Zugriffe in einer einzigen
+    # Transaktion speichern ...
+    # ----------------------------------------
+    def flush(self):
+        if self.touched:
+            self.conn.executemany('''
+                UPDATE completion_cache
+                SET last_used = ?, hits = hits + 1
+                WHERE key = ?
+            ''', [(last_used, key) for key, last_used in self.touched.items()])
+            self.touched = {}
+        self.conn.commit()
+
+    # ----------------------------------------
+    # zu alte Einträge löschen, danach die am
+    # längsten nicht benutzten (LRU), bis An-
+    # zahl und Größe wieder passen.
+    # ----------------------------------------
+    def evict(self):
+        self.flush()
+
+        self.conn.execute(
+            "DELETE FROM completion_cache WHERE created < ?",
+            (time.time() - self.max_age,))
+
+        self.count, self.size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completion_cache").fetchone()
+
+        while self.count > self.max_entries or self.size > self.max_bytes:
+            rows = self.conn.execute('''
+                SELECT key, size FROM completion_cache
+                ORDER BY last_used LIMIT 100
+            ''').fetchall()
+            if not rows:
+                break
+
+            doomed = []
+            for key, size in rows:
+                if self.count <= self.max_entries and self.size <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                self.count -= 1
+                self.size  -= size
+                self.memory.pop(key, None)
+
+            self.conn.executemany(
+                "DELETE FROM completion_cache WHERE key = ?", doomed)
+
+        self.memory = OrderedDict(
+            (key, row) for key, row in self.memory.items()
+            if self.conn.execute(
+                "SELECT 1 FROM completion_cache WHERE key = ?", (key,)).fetchone())
+
+        self.conn.commit()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
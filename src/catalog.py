@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------
+# Datei:  catalog.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Verzeichnis (catalog) aller Session-Namen im Speicher, als Spiegel der
+# Tabelle "session":
+#
+#    names   Name => id                      ist ein Name vergeben? (O(1))
+#    keys    sortiert: (Name klein, id)      Namen mit einem Anfang (Präfix)
+#
+# Die Suche nach einem Präfix ist eine binäre Suche (bisect) im sortierten
+# Array; die Treffer liegen dort direkt hintereinander. Seiten werden wie
+# in der Datenbank über den Schlüssel der letzten Zeile geholt (keyset) -
+# auch wenn zwischendurch Sessions dazukommen oder gelöscht werden.
+#
+# Der Katalog wird aus dem GUI-Thread benutzt; geladen werden kann er in
+# einem Hintergrund-Job (mit eigener Datenbank-Verbindung).
+# ----------------------------------------------------------------------------
+from bisect import bisect_left, bisect_right, insort
+
+from database import live_sessions
+
+def name_key(name):
+    return f"{name or ''}".casefold()
+
+class SessionCatalog:
+    def __init__(self, rows=()):
+        self.names   = {}   # Name => id
+        self.entries = {}   # id   => (datum, zeit, Name)
+        self.keys    = []   # sortiert: (Name klein, id)
+
+        for session_id, date_str, time_str, name in rows:
+            self.names[name]         = session_id
+            self.entries[session_id] = (date_str, time_str, name)
+            self.keys.append((name_key(name), session_id))
+        self.keys.sort()
+
+    @classmethod
+    def load(cls, conn):
+        return cls(live_sessions(conn))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def exists(self, name):
+        return name in self.names
+
+    def add(self, session_id, date_str, time_str, name):
+        if session_id in self.entries:
+            return
+        self.names[name]         = session_id
+        self.entries[session_id] = (date_str, time_str, name)
+        insort(self.keys, (name_key(name), session_id))
+
+    def remove(self, session_id):
+        entry = self.entries.pop(session_id, None)
+        if entry is None:
+            return
+        name = entry[2]
+        if self.names.get(name) == session_id:
+            del self.names[name]
+
+        key   = (name_key(name), session_id)
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    # ----------------------------------------
+    # Bereich (von, bis) der Namen mit dem
+    # Anfang "prefix" in self.keys ...
+    # ----------------------------------------
+    def prefix_range(self, prefix):
+        prefix = name_key(prefix)
+        first  = bisect_left(self.keys, (prefix,))
+        if not prefix:
+            return first, len(self.keys)
+
+        # ----------------------------------------
+        # das Ende: der erste Schlüssel, der nicht
+        # mehr mit "prefix" beginnt - alle Schlüs-
+        # sel mit dem Präfix sind < prefix + max.
+        # ----------------------------------------
+        last = bisect_left(self.keys, (prefix + "\U0010ffff",), first)
+        return first, last
+
+    def count(self, prefix):
+        first, last = self.prefix_range(prefix)
+        return last - first
+
+    # ----------------------------------------
+    # eine Seite mit Sessions, deren Name mit
+    # "prefix" beginnt, nach Namen sortiert;
+    # "after" ist der Schlüssel der letzten
+    # Zeile der vorherigen Seite. Zurück kom-
+    # men (id, datum, zeit, Name) Tupel.
+    # ----------------------------------------
+    def page(self, prefix, limit=50, after=None):
+        first, last = self.prefix_range(prefix)
+        if after is not None:
+            first = max(first, bisect_right(self.keys, after, first, last))
+
+        return [ (session_id,) + self.entries[session_id]
+            for key, session_id in self.keys[first:min(last, first + limit)] ]
+
+    def ids(self, prefix):
+        first, last = self.prefix_range(prefix)
+        return [ session_id for key, session_id in self.keys[first:last] ]
+
+    def key(self, session_id):
+        return (name_key(self.entries[session_id][2]), session_id)
@@ -0,0 +1,363 @@
+# ----------------------------------------------------------------------------
+# Datei:  chatclient.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Hier befindet sich alles, was direkt mit dem OpenAI Server spricht. Der
+# Client wird erst beim ersten Gebrauch erzeugt; der API-Key kommt aus der
+# Umgebungs-Variable OPENAI_API_KEY. Auch das (große) openai Paket wird erst
+# dann geladen - der Start der Anwendung muss darauf nicht warten.
+#
+# Mit OPENAI_BASE_URL (z.B. http://127.0.0.1:8808/v1) spricht der Client mit
+# einem anderen Server - etwa mit mockserver.py für Last-Tests.
+#
+# Jede Anfrage wartet vorher auf eine Freigabe vom "scheduler" (siehe
+# scheduler.py); Chat-Eingaben laufen auf LANE_INTERACTIVE, Arbeiten im
+# Hintergrund sollten "lane=LANE_BATCH" mitgeben.
+#
+# Gleiche Chat-Anfragen, die zur selben Zeit laufen, gehen nur einmal an den
+# Server (siehe singleflight.py); die anderen bekommen dieselbe Antwort bzw.
+# lesen denselben Stream mit.
+# ----------------------------------------------------------------------------
+import hashlib       # assistant config hash
+import json          # canonical config for the hash
+import os            # operating system stuff
+import time          # retry delay
+
+from cache        import cache_key
+from database     import get_assistant_ids, save_assistant_ids
+from scheduler    import RateLimitScheduler, CancelledError, LANE_INTERACTIVE, LANE_BATCH
+from singleflight import SingleFlight
+from tokens       import count_tokens
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = "Ich bin Dein persönlicher Tutor. Gerne stehe ich Dir bei Fragen zur Verfügung."
+
+# ----------------------------------------------------------------------------
+# so oft wird eine Anfrage bei 429 (Rate-Limit), 5xx oder Verbindungs-Fehlern
+# wiederholt. Der Client selbst wiederholt nichts (max_retries=0), damit wir
+# die Wiederholungen zählen können.
+# ----------------------------------------------------------------------------
+MAX_RETRIES = 2
+
+_client = None
+
+scheduler = RateLimitScheduler()
+flights   = SingleFlight()
+
+# ----------------------------------------------------------------------------
+# den (einzigen) OpenAI Client holen, bzw. beim ersten Aufruf erstellen ...
+# ----------------------------------------------------------------------------
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI         # ChatGPT like AI
+        _client = OpenAI(
+            api_key     = os.environ['OPENAI_API_KEY'],
+            base_url    = os.environ.get('OPENAI_BASE_URL'),
+            max_retries = 0,
+        )
+    return _client
+
+# ----------------------------------------------------------------------------
+# den Client verwerfen (z.B. nach Änderung von OPENAI_BASE_URL); beim
+# nächsten get_client() wird ein neuer erstellt.
+# ----------------------------------------------------------------------------
+def reset_client():
+    global _client
+    _client = None
+
+# ----------------------------------------------------------------------------
+# "call" ausführen, und bei vorübergehenden Fehlern wiederholen. "call" muss
+# die rohe Antwort liefern (....with_raw_response.create), damit die
+# x-ratelimit-* Header beim scheduler ankommen. Vor jedem Versuch wird auf
+# eine Freigabe für "tokens" (geschätzte) Token gewartet. Die Anzahl der
+# Wiederholungen landet in "metrics" (metrics.RequestMetrics, optional).
+#
+# "cancelled" (z.B. job.is_cancelled) beendet das Warten auf die Freigabe mit
+# scheduler.CancelledError - ein abgebrochener Job verbraucht kein Kontingent.
+# ----------------------------------------------------------------------------
+def with_retries(call, metrics=None, lane=LANE_INTERACTIVE, tokens=0, cancelled=None):
+    from openai import RateLimitError, APIConnectionError, InternalServerError
+
+    attempt = 0
+    while True:
+        scheduler.acquire(tokens, lane, cancelled)
+        if metrics is not None:
+            metrics.start()
+        try:
+            raw = call()
+        except (RateLimitError, APIConnectionError, InternalServerError) as ex:
+            response = getattr(ex, "response", None)
+            if response is not None:
+                scheduler.update_from_headers(response.headers)
+            if attempt >= MAX_RETRIES:
+                raise
+            attempt += 1
+            if metrics is not None:
+                metrics.retries = attempt
+            time.sleep(scheduler.backoff(attempt, retry_after(ex),
+                isinstance(ex, RateLimitError)))
+            continue
+
+        scheduler.update_from_headers(raw.headers)
+        return raw.parse()
+
+def retry_after(ex):
+    response = getattr(ex, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return None
+
+# ----------------------------------------------------------------------------
+# Token einer Anfrage schätzen: der Server rechnet max_tokens für die Antwort
+# schon beim Eintreffen gegen das TPM-Limit.
+# ----------------------------------------------------------------------------
+def estimate_tokens(messages, max_tokens=0, model=DEFAULT_MODEL):
+    return sum(count_tokens(message["content"], model) for message in messages) + max_tokens
+
+def settle_usage(estimated, usage):
+    if usage is not None:
+        scheduler.settle(estimated, usage.prompt_tokens + usage.completion_tokens)
+
+# ----------------------------------------------------------------------------
+# bricht der ab, der eine geteilte Anfrage gestartet hat (solange er noch auf
+# die Freigabe wartet), bekommen alle, die mitwarten, CancelledError - wer
+# nicht selbst abgebrochen hat, versucht es dann noch einmal.
+# ----------------------------------------------------------------------------
+def cancelled_by_other(cancelled):
+    return cancelled is None or not cancelled()
+
+# ----------------------------------------------------------------------------
+# wer einer laufenden Anfrage nur folgt, startet seine Zeitmessung beim Dazu-
+# kommen - seine Zeit bis zum ersten Token ist die echte Wartezeit. Wer sie
+# selbst sendet, startet erst nach der Freigabe (with_retries).
+# ----------------------------------------------------------------------------
+def start_on_join(metrics):
+    def joined(leader):
+        if metrics is not None and not leader:
+            metrics.start()
+    return joined
+
+# ----------------------------------------------------------------------------
+# eine Anfrage, deren Antwort am Stück zurück kommt (wie in Anfrage_1). Wer
+# nur mitwartet ("geteilt"), bekommt Zeiten und Token der Antwort in seine
+# "metrics" übernommen; seine Wartezeit beginnt, sobald er dazukommt.
+# ----------------------------------------------------------------------------
+def complete_chat(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=200, top_p=1,
+    metrics=None, lane=LANE_INTERACTIVE, cancelled=None):
+    estimated = estimate_tokens(messages, max_tokens, model)
+
+    def call():
+        response = with_retries(lambda: get_client().chat.completions.with_raw_response.create(
+            model       = model,
+            messages    = messages,
+            temperature = temperature,
+            max_tokens  = max_tokens,
+            top_p       = top_p,
+        ), metrics, lane, estimated, cancelled)
+        settle_usage(estimated, response.usage)
+        return response
+
+    key = cache_key(model, messages, temperature, max_tokens, top_p)
+    while True:
+        try:
+            response, shared = flights.call(key, call, start_on_join(metrics))
+            break
+        except CancelledError:
+            if not cancelled_by_other(cancelled):
+                raise
+
+    if metrics is not None:
+        metrics.start()
+        metrics.first()
+        metrics.finish()
+        if response.usage is not None:
+            metrics.set_usage(response.usage)
+    return response.choices[0].message.content
+
+# ----------------------------------------------------------------------------
+# eine Anfrage, deren Antwort Stück für Stück (stream) eintrifft. Es wird ein
+# Generator zurückgegeben, der die einzelnen Text-Teile liefert, sobald sie
+# vom Server gesendet werden.
+#
+# Geteilt werden die rohen Stücke (chunks) - so kommt auch die Token-Zahl
+# am Ende bei jedem an, der mitliest.
+# ----------------------------------------------------------------------------
+def stream_chat(messages, model=DEFAULT_MODEL, temperature=0.7, max_tokens=200, top_p=1,
+    metrics=None, lane=LANE_INTERACTIVE, cancelled=None):
+    estimated = estimate_tokens(messages, max_tokens, model)
+
+    def chunks():
+        stream = with_retries(lambda: get_client().chat.completions.with_raw_response.create(
+            model          = model,
+            messages       = messages,
+            temperature    = temperature,
+            max_tokens     = max_tokens,
+            top_p          = top_p,
+            stream         = True,
+            stream_options = { "include_usage": True },
+        ), metrics, lane, estimated, cancelled)
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    settle_usage(estimated, usage)
+                yield chunk
+        finally:
+            stream.close()
+
+    def shared_chunks(key):
+        while True:
+            shared  = flights.stream(key, chunks, start_on_join(metrics))
+            started = False
+            try:
+                for chunk in shared:
+                    started = True
+                    yield chunk
+                return
+            except CancelledError:
+                if started or not cancelled_by_other(cancelled):
+                    raise
+            finally:
+                shared.close()
+
+    shared = shared_chunks(cache_key(model, messages, temperature, max_tokens, top_p))
+    try:
+        for chunk in shared:
+            usage = getattr(chunk, "usage", None)
+            if usage is not None and metrics is not None:
+                metrics.set_usage(usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if metrics is not None:
+                    metrics.start()
+                    metrics.first()
+                yield delta
+    finally:
+        shared.close()
+        if metrics is not None:
+            metrics.finish()
+
+# ----------------------------------------------------------------------------
+# der Assistent (who is that :) - Anweisungen, Tools und Modell bestimmen den
+# Schlüssel, unter dem Assistent und Thread in der Datenbank gespeichert sind.
+# ----------------------------------------------------------------------------
+ASSISTANT_CONFIG = {
+    "instructions": SYSTEM_PROMPT,
+    "description" : "Online-Lehrkraft",
+    "name"        : "Jens Kallup",
+    "tools"       : [{"type": "code_interpreter"}],
+    "model"       : "gpt-4",
+}
+
+class AssistantNotFoundError(Exception):
+    pass
+
+def assistant_key(config=ASSISTANT_CONFIG):
+    text = json.dumps(config, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ----------------------------------------------------------------------------
+# einen Assistenten erstellen ...
+# ----------------------------------------------------------------------------
+def create_assistant(metrics=None, lane=LANE_INTERACTIVE, config=ASSISTANT_CONFIG):
+    assistant = with_retries(lambda: get_client().beta.assistants.with_raw_response.create(
+        **config), metrics, lane)
+
+    if metrics is not None:
+        metrics.finish()
+    return assistant
+
+# ----------------------------------------------------------------------------
+# einen Thread für Aufgaben und Berechnungen (optional mit einer ersten
+# Nachricht) ...
+# ----------------------------------------------------------------------------
+def create_thread(content=None, metrics=None, lane=LANE_INTERACTIVE):
+    messages = [{ "role": "user", "content": content }] if content else []
+    thread = with_retries(lambda: get_client().beta.threads.with_raw_response.create(
+        messages=messages), metrics, lane)
+
+    if metrics is not None:
+        metrics.finish()
+    return thread
+
+# ----------------------------------------------------------------------------
+# (assistant_id, thread_id) für "config" holen: aus der Datenbank, oder -
+# beim ersten Mal, bzw. mit "renew" - neu auf dem Server anlegen und
+# speichern. Nur dann werden "metrics" und "thread_metrics" benutzt.
+# ----------------------------------------------------------------------------
+def ensure_assistant(conn, config=ASSISTANT_CONFIG, metrics=None, thread_metrics=None,
+    lane=LANE_BATCH, renew=False):
+    key = assistant_key(config)
+    ids = None if renew else get_assistant_ids(conn, key)
+    if ids is not None:
+        return tuple(ids)
+
+    assistant = create_assistant(metrics, lane, config)
+    if thread_metrics is not None and metrics is not None:
+        thread_metrics.submitted = metrics.finished
+    thread = create_thread(None, thread_metrics, lane)
+
+    save_assistant_ids(conn, key, assistant.id, thread.id)
+    return (assistant.id, thread.id)
+
+# ----------------------------------------------------------------------------
+# eine Frage im Thread stellen, und die Antwort des Assistenten als Stream
+# von Ereignissen lesen: die Frage wird mit dem Run zusammen gesendet
+# (additional_messages), der Text kommt mit "thread.message.delta" - eine
+# Anfrage, kein Abfragen (polling) des Run-Status. Gibt es Assistent oder
+# Thread auf dem Server nicht mehr, kommt AssistantNotFoundError.
+# ----------------------------------------------------------------------------
+RUN_FAILED = ("thread.run.failed", "thread.run.cancelled", "thread.run.expired",
+              "thread.run.incomplete", "thread.run.requires_action")
+
+def stream_run(thread_id, assistant_id, content, metrics=None, lane=LANE_INTERACTIVE,
+    model=ASSISTANT_CONFIG["model"], cancelled=None):
+    from openai import NotFoundError
+
+    estimated = count_tokens(content, model)
+    try:
+        stream = with_retries(lambda: get_client().beta.threads.runs.with_raw_response.create(
+            thread_id,
+            assistant_id        = assistant_id,
+            additional_messages = [{ "role": "user", "content": content }],
+            stream              = True,
+        ), metrics, lane, estimated, cancelled)
+    except NotFoundError as ex:
+        raise AssistantNotFoundError(f"{ex}") from ex
+
+    try:
+        for event in stream:
+            if event.event == "thread.message.delta":
+                for part in event.data.delta.content or []:
+                    text = getattr(getattr(part, "text", None), "value", None)
+                    if text:
+                        if metrics is not None:
+                            metrics.first()
+                        yield text
+            elif event.event == "thread.run.completed":
+                usage = event.data.usage
+                settle_usage(estimated, usage)
+                if metrics is not None and usage is not None:
+                    metrics.set_usage(usage)
+            elif event.event in RUN_FAILED:
+                error = event.data.last_error
+                raise RuntimeError(error.message if error is not None
+                    else f"Run beendet: {event.data.status}")
+            elif event.event == "error":
+                raise RuntimeError(f"{event.data.message}")
+    finally:
+        stream.close()
+        if metrics is not None:
+            metrics.finish()
@@ -0,0 +1,579 @@
+# ----------------------------------------------------------------------------
+# Datei:  chatview.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Der Chat-Verlauf (rechte ListBox) wird nicht mehr aus einzelnen QWidget's
+# zusammengebaut (pro Nachricht: QCheckBox, QPushButton, drei Layouts und
+# zwei QLabels), sondern nach dem Model/View Prinzip von Qt dargestellt:
+#
+#    ChatListModel    => hält die Nachrichten als schlanke Python-Objekte
+#    ChatItemDelegate => zeichnet nur die Zeilen, die gerade sichtbar sind
+#
+# Dadurch bleiben Speicherverbrauch und Zeichen-Zeit auch bei 100.000 Nach-
+# richten (nahezu) konstant.
+#
+# Das Model hält außerdem nie den gesamten Verlauf einer Session: geladen wird
+# die neueste Seite, ältere (bzw. neuere) Seiten kommen beim Scrollen dazu,
+# und Seiten weit außerhalb des sichtbaren Bereichs werden wieder verdrängt
+# (has_older / has_newer merken sich, ob es davor bzw. danach noch etwas in
+# der Datenbank gibt).
+# ----------------------------------------------------------------------------
+import datetime      # date, and time routines
+
+from PyQt5.QtWidgets import QStyle, QStyledItemDelegate, QStyleOptionButton
+from PyQt5.QtWidgets import QStyleOptionViewItem
+from PyQt5.QtGui     import QFont, QFontMetrics, QColor, QPalette, QDesktopServices
+from PyQt5.QtCore    import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent
+from PyQt5.QtCore    import QPointF, QUrl, pyqtSignal
+
+from richtext  import DocumentCache, content_key, PLAIN, MARKDOWN, HTML
+from selection import CheckSelection
+from tokens    import count_tokens
+
+# ----------------------------------------------------------------------------
+# zusätzliche Rollen, über die der Delegate an die Daten einer Zeile kommt:
+# ----------------------------------------------------------------------------
+ModeRole = Qt.UserRole + 1   # "Du", "paule32", ...
+DateRole = Qt.UserRole + 2   # Datum und Zeit als Tupel
+
+CHAT_PAGE_SIZE = 50    # Nachrichten pro nachgeladener Seite
+CHAT_MAX_ROWS  = 300   # ab so vielen Zeilen wird verdrängt ...
+CHAT_KEEP_ROWS = 100   # ... bis auf so viele über/unter dem sichtbaren Bereich
+
+# ----------------------------------------------------------------------------
+# eine einzelne Chat-Nachricht. __slots__ sorgt dafür, das pro Nachricht kein
+# eigenes __dict__ angelegt wird - bei sehr vielen Nachrichten spart das eine
+# Menge Speicher.
+# ----------------------------------------------------------------------------
+class ChatMessage:
+    __slots__ = ("text", "mode", "date_str", "time_str", "size_cache", "msg_id", "tokens",
+                 "text_key", "rich", "links")
+
+    def __init__(self, text, mode, date_str=None, time_str=None, msg_id=None, tokens=None):
+        now = datetime.datetime.now()
+
+        self.tokens     = tokens   # Anzahl Token (wird bei Bedarf einmal berechnet)
+        self.msg_id     = msg_id   # id in der Tabelle "messages" (sofern gespeichert)
+        self.text       = text
+        self.mode       = mode
+        self.date_str   = date_str or now.strftime("%Y-%m-%d")
+        self.time_str   = time_str or now.strftime("%H:%M:%S")
+        self.size_cache = None   # (breite, höhe) der letzten Berechnung
+        self.text_key   = None   # hash des Inhalts (für den DocumentCache)
+        self.rich       = None   # aufbereitetes HTML (postprocess.py)
+        self.links      = ()     # Links im Text (postprocess.py)
+
+    def token_count(self):
+        if self.tokens is None:
+            self.tokens = count_tokens(self.text)
+        return self.tokens
+
+# ----------------------------------------------------------------------------
+# das Model für die rechte ListBox ...
+# ----------------------------------------------------------------------------
+class ChatListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super(ChatListModel, self).__init__(parent)
+        self.messages  = []
+        self.checks    = CheckSelection()   # Schlüssel: das ChatMessage Objekt
+        self.has_older = False              # ältere Nachrichten in der Datenbank
+        self.has_newer = False              # neuere (nach dem Verdrängen)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        message = self.messages[index.row()]
+
+        if role == Qt.DisplayRole:
+            return message.text
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checks.is_checked(message) else Qt.Unchecked
+        if role == ModeRole:
+            return message.mode
+        if role == DateRole:
+            return (message.date_str, message.time_str)
+        if role == Qt.ToolTipRole and message.links:
+            return "\n".join(message.links)    # die Links der Antwort
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+
+        self.checks.set_checked(self.messages[index.row()], value == Qt.Checked)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    # ----------------------------------------
+    # neue Nachricht am Ende anfügen ...
+    # ----------------------------------------
+    def add_message(self, message):
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(message)
+        self.endInsertRows()
+        return row
+
+    # ----------------------------------------
+    # alle Nachrichten auf einmal ersetzen (z.B.
+    # beim Öffnen einer Session) ...
+    # ----------------------------------------
+    def set_messages(self, messages, has_older=False, has_newer=False):
+        self.beginResetModel()
+        self.messages  = list(messages)
+        self.has_older = has_older
+        self.has_newer = has_newer
+        self.checks.set_all(False)
+        self.endResetModel()
+
+    # ----------------------------------------
+    # nachgeladene Seiten vorne bzw. hinten
+    # anfügen. Markierte Nachrichten, die
+    # zwischenzeitlich verdrängt waren, sind
+    # noch in "checks" - sie werden wieder-
+    # verwendet, damit die Markierung bleibt.
+    # ----------------------------------------
+    def adopt(self, messages):
+        kept = { message.msg_id: message for message in self.checks.toggled
+            if message.msg_id is not None }
+        if not kept:
+            return list(messages)
+        return [ kept.get(message.msg_id, message) for message in messages ]
+
+    def prepend_messages(self, messages, has_older):
+        self.has_older = has_older
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self.messages[0:0] = self.adopt(messages)
+        self.endInsertRows()
+
+    def append_messages(self, messages, has_newer):
+        self.has_newer = has_newer
+        if not messages:
+            return
+        first = len(self.messages)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self.messages.extend(self.adopt(messages))
+        self.endInsertRows()
+
+    # ----------------------------------------
+    # Zeilen weit außerhalb des sichtbaren Be-
+    # reichs verdrängen: die ersten "count",
+    # bzw. alle ab "row". Noch nicht gespei-
+    # cherte Nachrichten (msg_id None) bleiben
+    # immer im Model.
+    # ----------------------------------------
+    def drop_older(self, count):
+        count = min(count, len(self.messages))
+        if count <= 0 or any(message.msg_id is None for message in self.messages[:count]):
+            return False
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        del self.messages[:count]
+        self.has_older = True
+        self.endRemoveRows()
+        return True
+
+    def drop_newer(self, row):
+        if row >= len(self.messages) or row < 0 \
+            or any(message.msg_id is None for message in self.messages[row:]):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, len(self.messages) - 1)
+        del self.messages[row:]
+        self.has_newer = True
+        self.endRemoveRows()
+        return True
+
+    def first_id(self):
+        for message in self.messages:
+            if message.msg_id is not None:
+                return message.msg_id
+        return None
+
+    def last_id(self):
+        for message in reversed(self.messages):
+            if message.msg_id is not None:
+                return message.msg_id
+        return None
+
+    # ----------------------------------------
+    # Zeile einer Nachricht suchen - neue Nach-
+    # richten stehen am Ende, deshalb suchen
+    # wir von hinten.
+    # ----------------------------------------
+    def row_of(self, message):
+        for row in range(len(self.messages) - 1, -1, -1):
+            if self.messages[row] is message:
+                return row
+        return -1
+
+    # ----------------------------------------
+    # Text an eine (gestreamte) Nachricht an-
+    # hängen; die gepufferte Höhe ist danach
+    # ungültig.
+    # ----------------------------------------
+    def append_text(self, message, text):
+        message.text      += text
+        message.size_cache = None
+        message.tokens     = None
+        message.text_key   = None
+        message.rich       = None
+        message.links      = ()
+
+        row = self.row_of(message)
+        if row < 0:
+            return None
+
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+        return index
+
+    # ----------------------------------------
+    # Nachricht aus dem Model entfernen ...
+    # ----------------------------------------
+    def remove_row(self, row):
+        if row < 0 or row >= len(self.messages):
+            return False
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.checks.forget(self.messages[row])
+        del self.messages[row]
+        self.endRemoveRows()
+        return True
+
+    # ----------------------------------------
+    # alle markierten Nachrichten auf einmal
+    # entfernen (ein einziges Reset statt
+    # einem Signal pro Zeile). Zurück kommen
+    # die entfernten Nachrichten.
+    # ----------------------------------------
+    def remove_checked(self):
+        if not self.checks.any():
+            return []
+
+        keep, removed = [], []
+        for message in self.messages:
+            (removed if self.checks.is_checked(message) else keep).append(message)
+
+        self.beginResetModel()
+        self.messages = keep
+        self.checks.set_all(False)
+        self.endResetModel()
+        return removed
+
+    # ----------------------------------------
+    # alle Einträge (ab)wählen - es wird nur
+    # ein Flag gesetzt, und ein einziges
+    # dataChanged Signal für den gesamten
+    # Bereich gesendet.
+    # ----------------------------------------
+    def set_all_checked(self, checked):
+        self.checks.set_all(checked)
+        if not self.messages:
+            return
+
+        self.dataChanged.emit(
+            self.index(0),
+            self.index(len(self.messages) - 1),
+            [Qt.CheckStateRole])
+
+    def checked_rows(self):
+        return [row for row, message in enumerate(self.messages)
+            if self.checks.is_checked(message)]
+
+# ----------------------------------------------------------------------------
+# der Delegate zeichnet eine Chat-Zeile so, wie es früher die einzelnen
+# Widgets getan haben:
+#
+#    +------------------------------------------------+
+#    | Du   2023-12-15   20:33:00                     |
+#    | [x]  Text der Nachricht ...              [DEL] |
+#    +------------------------------------------------+
+#
+# Checkbox und DEL-Button sind nur gezeichnet - Mausklicks werden in
+# editorEvent ausgewertet. Der Text wird als Markdown (bei Nachrichten mit
+# einem Modus aus "markdown_modes") bzw. als reiner Text gesetzt; geparste
+# und umgebrochene Dokumente hält der DocumentCache (richtext.py).
+#
+# Mit einem "postprocessor" (postprocess.py) werden fertige Markdown-Nach-
+# richten zu HTML aufbereitet (Code-Farben, Tabellen, Links) - lange im
+# Pool von Prozessen. Bis das HTML da ist, steht dort der rohe Text.
+# ----------------------------------------------------------------------------
+class ChatItemDelegate(QStyledItemDelegate):
+    delete_clicked = pyqtSignal(int)
+    rich_ready     = pyqtSignal(object, object)   # key, Processed (aus dem Pool)
+
+    margin       = 6
+    spacing      = 4
+    button_width = 50
+
+    def __init__(self, view, markdown_modes=None, postprocessor=None):
+        super(ChatItemDelegate, self).__init__(view)
+        self.view           = view
+        self.markdown_modes = markdown_modes   # None: alle Nachrichten
+        self.postprocessor  = postprocessor
+        self.documents      = DocumentCache(view.font())
+        self.waiting        = {}               # key => [ChatMessage, ...]
+
+        self.rich_ready.connect(self.apply_rich)
+
+    # ----------------------------------------
+    # Geometrie der einzelnen Bereiche:
+    # ----------------------------------------
+    def header_height(self, option):
+        return QFontMetrics(option.font).height()
+
+    def button_height(self, option):
+        return QFontMetrics(option.font).height() + 8
+
+    def checkbox_rect(self, option):
+        style = self.view.style()
+        size  = style.pixelMetric(QStyle.PM_IndicatorWidth)
+        top   = option.rect.top() + self.margin + self.header_height(option) + self.spacing
+        return QRect(option.rect.left() + self.margin, top, size, size)
+
+    def button_rect(self, option):
+        top = option.rect.top() + self.margin + self.header_height(option) + self.spacing
+        return QRect(
+            option.rect.right() - self.margin - self.button_width, top,
+            self.button_width, self.button_height(option))
+
+    def text_rect(self, option, height):
+        check_rect  = self.checkbox_rect(option)
+        button_rect = self.button_rect(option)
+
+        left  = check_rect.right() + self.margin
+        right = button_rect.left() - self.margin
+        return QRect(left, check_rect.top(), max(right - left, 1), height)
+
+    def is_markdown(self, message):
+        return self.markdown_modes is None or message.mode in self.markdown_modes
+
+    # ----------------------------------------
+    # wie wird der Text gesetzt? Lange Texte
+    # ohne HTML (noch nicht fertig, oder die
+    # Aufbereitung ist fehlgeschlagen) als
+    # reiner Text - Markdown zu parsen würde
+    # die GUI dann spürbar anhalten.
+    # ----------------------------------------
+    def text_format(self, message):
+        if not self.is_markdown(message):
+            return PLAIN
+        if message.rich:
+            return HTML
+        if self.postprocessor is not None \
+            and len(message.text) > self.postprocessor.inline_limit:
+            return PLAIN
+        return MARKDOWN
+
+    # ----------------------------------------
+    # eine fertige Nachricht aufbereiten: kur-
+    # ze sofort, lange im Pool - das HTML kommt
+    # dann über "rich_ready" zurück in den GUI-
+    # Thread (apply_rich). "notify" = die
+    # Zeile neu zeichnen (nicht nötig, wenn
+    # sie gerade gezeichnet wird).
+    # ----------------------------------------
+    def postprocess(self, message, notify=True):
+        if self.postprocessor is None or message.rich is not None \
+            or not self.is_markdown(message):
+            return
+
+        key      = content_key(message.text, MARKDOWN)
+        messages = self.waiting.get(key)
+        if messages is not None:   # schon unterwegs
+            if message not in messages:
+                messages.append(message)
+            return
+        self.waiting[key] = [message]
+
+        result = self.postprocessor.request(key, message.text, self.rich_ready.emit)
+        if result is not None:
+            self.apply_rich(key, result, notify)
+
+    def apply_rich(self, key, result, notify=True):
+        model = self.view.model()
+        for message in self.waiting.pop(key, []):
+            message.rich       = result.html  if result is not None else ""   # "" = fehlgeschlagen
+            message.links      = result.links if result is not None else ()
+            message.size_cache = None
+            message.text_key   = None
+
+            row = model.row_of(message) if notify else -1
+            if row >= 0:
+                index = model.index(row)
+                model.dataChanged.emit(index, index, [Qt.DisplayRole])
+                self.sizeHintChanged.emit(index)
+
+    # ----------------------------------------
+    # das umgebrochene Dokument einer Nachricht
+    # (und seine Höhe) für eine Breite ...
+    # ----------------------------------------
+    def text_document(self, option, message, width):
+        if message.rich is None and message.msg_id is not None:
+            self.postprocess(message, notify=False)
+
+        kind = self.text_format(message)
+        if message.text_key is None:
+            message.text_key = content_key(message.text, kind)
+
+        self.documents.set_font(option.font)
+        return self.documents.layout(message.text_key,
+            message.rich if kind == HTML else message.text, kind, width,
+            transient=message.msg_id is None)
+
+    # ----------------------------------------
+    # Höhe des Textes bei gegebener Breite; das
+    # Ergebnis wird in der Nachricht gepuffert,
+    # damit nicht jedes Scrollen neu rechnet.
+    # ----------------------------------------
+    def text_height(self, option, message, width):
+        if message.size_cache is not None and message.size_cache[0] == width:
+            return message.size_cache[1]
+
+        document, height = self.text_document(option, message, width)
+
+        message.size_cache = (width, height)
+        return height
+
+    def sizeHint(self, option, index):
+        message = index.model().messages[index.row()]
+
+        width  = self.view.viewport().width()
+        option = QStyleOptionViewItem(option)
+        option.rect = QRect(0, 0, width, 0)
+
+        text_width = self.text_rect(option, 0).width()
+        body       = max(self.text_height(option, message, text_width), self.button_height(option))
+
+        return QSize(width,
+            self.margin + self.header_height(option) + self.spacing + body + self.margin)
+
+    def paint(self, painter, option, index):
+        message = index.model().messages[index.row()]
+        style   = self.view.style()
+
+        painter.save()
+
+        # ----------------------------------------
+        # Hintergrund (Auswahl, Hover, ...)
+        # ----------------------------------------
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, self.view)
+
+        # ----------------------------------------
+        # header (Modus, Datum und Zeit)
+        # ----------------------------------------
+        font = option.font
+        x    = option.rect.left() + self.margin
+        y    = option.rect.top()  + self.margin
+        h    = self.header_height(option)
+
+        bold_font = QFont(font)
+        bold_font.setBold(True)
+        painter.setFont(bold_font)
+        painter.drawText(QRect(x, y, option.rect.width(), h), Qt.AlignLeft, message.mode)
+        x += QFontMetrics(bold_font).horizontalAdvance(message.mode + "   ")
+
+        painter.setFont(font)
+        painter.setPen(QColor("green"))
+        painter.drawText(QRect(x, y, option.rect.width(), h), Qt.AlignLeft, message.date_str)
+        x += QFontMetrics(font).horizontalAdvance(message.date_str + "   ")
+
+        italic_font = QFont(font)
+        italic_font.setItalic(True)
+        painter.setFont(italic_font)
+        painter.drawText(QRect(x, y, option.rect.width(), h), Qt.AlignLeft, message.time_str)
+
+        # ----------------------------------------
+        # Checkbox ...
+        # ----------------------------------------
+        check_option = QStyleOptionButton()
+        check_option.rect  = self.checkbox_rect(option)
+        check_option.state = QStyle.State_Enabled | \
+            (QStyle.State_On if index.model().checks.is_checked(message) else QStyle.State_Off)
+        style.drawControl(QStyle.CE_CheckBox, check_option, painter, self.view)
+
+        # ----------------------------------------
+        # DEL-Button ...
+        # ----------------------------------------
+        button_option = QStyleOptionButton()
+        button_option.rect  = self.button_rect(option)
+        button_option.text  = "DEL"
+        button_option.state = QStyle.State_Enabled | QStyle.State_Raised
+        style.drawControl(QStyle.CE_PushButton, button_option, painter, self.view)
+
+        # ----------------------------------------
+        # Text der Nachricht ...
+        # ----------------------------------------
+        text_width       = self.text_rect(option, 0).width()
+        document, height = self.text_document(option, message, text_width)
+        self.documents.draw(painter, document, self.text_rect(option, height),
+            option.palette.color(QPalette.Text))
+
+        painter.restore()
+
+    # ----------------------------------------
+    # Mausklicks auf Checkbox, DEL-Button und
+    # Links im Text:
+    # ----------------------------------------
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease,
+                                QEvent.MouseButtonDblClick):
+            return False
+
+        if event.button() != Qt.LeftButton:
+            return False
+
+        on_checkbox = self.checkbox_rect(option).contains(event.pos())
+        on_button   = self.button_rect  (option).contains(event.pos())
+
+        if not (on_checkbox or on_button):
+            if event.type() != QEvent.MouseButtonRelease:
+                return False
+            return self.open_link(option, index, event.pos())
+
+        if event.type() == QEvent.MouseButtonRelease:
+            if on_checkbox:
+                state = index.data(Qt.CheckStateRole)
+                model.setData(index,
+                    Qt.Unchecked if state == Qt.Checked else Qt.Checked,
+                    Qt.CheckStateRole)
+            else:
+                self.delete_clicked.emit(index.row())
+        return True
+
+    # ----------------------------------------
+    # Klick auf einen Link im Text: im Browser
+    # öffnen ...
+    # ----------------------------------------
+    def open_link(self, option, index, pos):
+        message          = index.model().messages[index.row()]
+        text_width       = self.text_rect(option, 0).width()
+        document, height = self.text_document(option, message, text_width)
+
+        rect = self.text_rect(option, height)
+        if not rect.contains(pos):
+            return False
+
+        anchor = document.documentLayout().anchorAt(QPointF(pos - rect.topLeft()))
+        if not anchor:
+            return False
+
+        QDesktopServices.openUrl(QUrl(anchor))
+        return True
@@ -0,0 +1,244 @@
+# ----------------------------------------------------------------------------
+# Datei:  cli.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Chat ohne Fenster - z.B. auf einem Server, oder in Skripten. Die Antworten
+# werden Stück für Stück auf stdout ausgegeben; Fragen und Antworten landen in
+# derselben Datenbank wie bei der Anwendung mit Fenster (data/chat.db):
+#
+#    python start.py --cli "Was ist eine Schleife?"     => eine Frage
+#    python start.py --cli --file fragen.txt            => eine Frage pro Zeile
+#    echo "Was ist def?" | python start.py --cli        => Fragen von stdin
+#    python start.py --cli --session "Python"           => Session fortsetzen
+#    python start.py --cli                              => fragen, bis Ende
+#
+# Hier wird kein Qt Modul geladen (auch nicht über main.py) - der Start ist
+# dadurch schnell, und es wird kein Bildschirm gebraucht.
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import configparser  # .ini files
+import datetime      # date, and time routines
+import os            # operating system stuff
+import sys           # system specifies
+
+from cache      import CompletionCache, cache_key, cacheable         # Antwort-Cache
+from chatclient import stream_chat, scheduler                        # OpenAI Anfragen
+from chatclient import DEFAULT_MODEL, SYSTEM_PROMPT
+from context    import fit_messages, CONTEXT_BUDGET                  # Token-Budget
+from database   import open_database, default_database_path          # Datenbank
+from database   import create_session, add_turn, latest_messages, get_summary
+from database   import free_session_name
+from metrics    import MetricsStore, RequestMetrics                  # Messwerte
+from semcache   import semantic_cache_from_config                    # ähnliche Fragen
+from tokens     import count_tokens
+
+# ----------------------------------------------------------------------------
+# die Fragen: aus den Argumenten, aus einer Datei (eine pro Zeile, "-" =
+# stdin), von einer umgeleiteten Eingabe, oder - im Terminal - nacheinander
+# abgefragt.
+# ----------------------------------------------------------------------------
+def read_prompts(prompts, path=None, stdin=None):
+    stdin = stdin or sys.stdin
+    if prompts:
+        yield from prompts
+        return
+
+    if path is not None:
+        file = stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            for line in file:
+                if line.strip():
+                    yield line.strip()
+        finally:
+            if file is not stdin:
+                file.close()
+        return
+
+    if not stdin.isatty():
+        yield from read_prompts(None, "-", stdin)
+        return
+
+    while True:
+        try:
+            line = input("Du: ")
+        except EOFError:
+            print()
+            return
+        if line.strip():
+            yield line.strip()
+
+# ----------------------------------------------------------------------------
+# Session zu einem Namen suchen (die neueste, wenn es mehrere gibt) ...
+# ----------------------------------------------------------------------------
+def find_session(conn, name):
+    row = conn.execute('''
+        SELECT id FROM session WHERE name = ? AND deleted = 0
+        ORDER BY id DESC LIMIT 1
+    ''', (name,)).fetchone()
+    return row[0] if row else None
+
+# ----------------------------------------------------------------------------
+# Verlauf der Session (so viel in das Token-Budget passt) plus neue Frage,
+# im Format für chat.completions.create ...
+# ----------------------------------------------------------------------------
+def build_messages(conn, session_id, prompt, budget=CONTEXT_BUDGET):
+    summary = None
+    history = []
+    if session_id is not None:
+        summary = get_summary(conn, session_id)
+        history = [ (role, content, tokens)
+            for msg_id, role, date_str, time_str, content, tokens
+            in latest_messages(conn, session_id)
+            if summary is None or msg_id > summary[0] ]
+
+    history.append(("user", prompt, count_tokens(prompt)))
+    messages, dropped = fit_messages(SYSTEM_PROMPT, history, budget,
+        summary[1] if summary else None)
+    return messages
+
+class HeadlessChat:
+    def __init__(self, conn, session_name=None, budget=CONTEXT_BUDGET, use_cache=True,
+        save=True, temperature=0.7, max_tokens=200, top_p=1, out=None, semantic_cache=None):
+
+        self.conn         = conn
+        self.session_name = session_name
+        self.session_id   = find_session(conn, session_name) if session_name else None
+        self.budget       = budget
+        self.save         = save
+        self.temperature  = temperature
+        self.max_tokens   = max_tokens
+        self.top_p        = top_p
+        self.out          = out or sys.stdout
+        self.cache        = CompletionCache(conn, evict_now=False) if use_cache else None
+        self.semantic     = semantic_cache if use_cache else None
+        self.metrics      = MetricsStore(conn)
+
+    # ----------------------------------------
+    # eine Frage stellen; die Antwort wird
+    # beim Eintreffen ausgegeben, und danach
+    # (als Ganzes) zurückgegeben.
+    # ----------------------------------------
+    def ask(self, prompt):
+        now      = datetime.datetime.now()
+        messages = build_messages(self.conn, self.session_id, prompt, self.budget)
+        metrics  = RequestMetrics("cli", DEFAULT_MODEL)
+        key      = cache_key(DEFAULT_MODEL, messages, self.temperature, self.max_tokens,
+                       self.top_p)
+        use_cache = cacheable(self.temperature)
+
+        answer = self.cache.get(key) if self.cache is not None and use_cache else None
+        if answer is None and self.semantic is not None and use_cache:
+            found  = self.semantic.lookup(DEFAULT_MODEL, messages)
+            answer = found[0] if found is not None else None
+        if answer is not None:
+            metrics.cache_hit = True
+            metrics.first()
+            self.out.write(answer)
+        else:
+            parts = []
+            try:
+                for delta in stream_chat(messages,
+                    temperature = self.temperature,
+                    max_tokens  = self.max_tokens,
+                    top_p       = self.top_p,
+                    metrics     = metrics):
+                    parts.append(delta)
+                    self.out.write(delta)
+                    self.out.flush()
+            except Exception as ex:
+                metrics.finish(f"{ex}")
+                self.metrics.record(metrics)
+                raise
+            answer = "".join(parts)
+            if self.cache is not None and use_cache:
+                self.cache.put(key, DEFAULT_MODEL, answer)
+            if self.semantic is not None and use_cache:
+                self.semantic.put(DEFAULT_MODEL, messages, answer)
+
+        self.out.write("\n")
+        self.out.flush()
+        self.metrics.record(metrics)
+
+        if self.save:
+            self.save_turn(now, prompt, answer)
+        return answer
+
+    def save_turn(self, now, prompt, answer):
+        date_str = now.strftime("%Y-%m-%d")
+        time_str = now.strftime("%H:%M:%S")
+        if self.session_id is None:
+            self.session_id = create_session(self.conn, free_session_name(self.conn,
+                self.session_name or f"Chat {date_str} {time_str}"), date_str, time_str)
+
+        turn = [ ("user", date_str, time_str, prompt) ]
+        if answer:
+            answered = datetime.datetime.now()
+            turn.append(("assistant", answered.strftime("%Y-%m-%d"),
+                answered.strftime("%H:%M:%S"), answer))
+        add_turn(self.conn, self.session_id, turn)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.flush()
+
+def main(argv=None, translate=None):
+    _ = translate or (lambda text: text)
+
+    parser = argparse.ArgumentParser(prog="start.py --cli",
+        description="Chat ohne Fenster; die Antworten erscheinen auf stdout")
+    parser.add_argument("prompts", nargs="*", help="Fragen (sonst --file bzw. stdin)")
+    parser.add_argument("--file", help="Fragen aus einer Datei, eine pro Zeile (- = stdin)")
+    parser.add_argument("--session", help="Session mit diesem Namen fortsetzen bzw. anlegen")
+    parser.add_argument("--database", default=default_database_path(), help="Datenbank")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--top-p", type=float, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="Antwort-Cache umgehen")
+    parser.add_argument("--no-save", action="store_true", help="nichts in der Datenbank speichern")
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+
+    scheduler.configure(
+        rpm = config.getint("ratelimit", "rpm", fallback=None),
+        tpm = config.getint("ratelimit", "tpm", fallback=None))
+
+    conn = open_database(args.database)
+    chat = HeadlessChat(conn,
+        semantic_cache = semantic_cache_from_config(conn, config,
+            os.path.join(os.path.dirname(os.path.abspath(args.database)), "semantic")),
+        session_name = args.session,
+        budget       = config.getint("context", "budget", fallback=CONTEXT_BUDGET),
+        use_cache    = not args.no_cache,
+        save         = not args.no_save,
+        temperature  = args.temperature,
+        max_tokens   = args.max_tokens,
+        top_p        = args.top_p)
+
+    failed = 0
+    try:
+        for prompt in read_prompts(args.prompts, args.file):
+            try:
+                chat.ask(prompt)
+            except KeyboardInterrupt:
+                raise
+            except Exception as ex:
+                failed += 1
+                print(_("\05\02\02\05") + f"{ex}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print(file=sys.stderr)
+        return 130
+    finally:
+        chat.close()
+        conn.close()
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+# ----------------------------------------------------------------------------
+# Datei:  context.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Bei langen Unterhaltungen würde jede Anfrage den gesamten Chat-Verlauf an
+# den Server senden - Wartezeit und Kosten würden ohne Grenze wachsen. Hier
+# wird deshalb nur ein Fenster (sliding window) der neuesten Nachrichten ge-
+# sendet, das in ein festes Token-Budget passt. Ältere Nachrichten werden im
+# Hintergrund zu einer Zusammenfassung verdichtet, die dem Fenster voran-
+# gestellt wird.
+# ----------------------------------------------------------------------------
+from chatclient import complete_chat, LANE_BATCH
+from tokens     import count_tokens
+
+# ----------------------------------------------------------------------------
+# Standard-Werte (können in config.ini, Abschnitt [context], gesetzt werden):
+# ----------------------------------------------------------------------------
+CONTEXT_BUDGET       = 3000   # Token für System-Prompt, Zusammenfassung und Verlauf
+COMPACTION_THRESHOLD = 750    # ab so vielen nicht zusammengefassten Token verdichten
+
+# ----------------------------------------------------------------------------
+# jede Nachricht kostet neben dem Inhalt noch ein paar Token für Rolle und
+# Trennzeichen.
+# ----------------------------------------------------------------------------
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = "Fasse das bisherige Gespräch knapp zusammen. Behalte Namen, " \
+    + "Fakten, Entscheidungen und offene Fragen. Antworte nur mit der Zusammenfassung."
+
+# ----------------------------------------------------------------------------
+# die Nachrichten für chat.completions.create zusammenstellen. "history" ist
+# eine Liste von (role, content, tokens) Tupeln, die älteste zuerst. Es werden
+# von hinten (neueste zuerst) so viele Nachrichten übernommen, wie in das
+# Budget passen; die neueste Nachricht wird immer gesendet.
+#
+# Zurück kommen die Nachrichten und die Anzahl der nicht gesendeten (ältesten)
+# Einträge aus "history".
+# ----------------------------------------------------------------------------
+def fit_messages(system_prompt, history, budget=CONTEXT_BUDGET, summary=None):
+    head = [{ "role": "system", "content": system_prompt }]
+    used = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+
+    if summary:
+        head.append({ "role": "system",
+            "content": "Zusammenfassung des bisherigen Gesprächs: " + summary })
+        used += count_tokens(summary) + MESSAGE_OVERHEAD
+
+    window = []
+    start  = len(history)
+    for role, content, tokens in reversed(history):
+        cost = tokens + MESSAGE_OVERHEAD
+        if window and used + cost > budget:
+            break
+        window.append({ "role": role, "content": content })
+        used  += cost
+        start -= 1
+
+    window.reverse()
+    return head + window, start
+
+# ----------------------------------------------------------------------------
+# ältere Nachrichten zusammenfassen (läuft als Job im RequestExecutor). Eine
+# bereits vorhandene Zusammenfassung wird mit einbezogen.
+# ----------------------------------------------------------------------------
+def summarize(previous_summary, history, metrics=None, cancelled=None):
+    messages = [{ "role": "system", "content": SUMMARY_PROMPT }]
+    if previous_summary:
+        messages.append({ "role": "system",
+            "content": "Bisherige Zusammenfassung: " + previous_summary })
+    for role, content, tokens in history:
+        messages.append({ "role": role, "content": content })
+    messages.append({ "role": "user", "content": SUMMARY_PROMPT })
+
+    return complete_chat(messages, temperature=0, max_tokens=300, metrics=metrics,
+        lane=LANE_BATCH, cancelled=cancelled)
@@ -0,0 +1,518 @@
+# ----------------------------------------------------------------------------
+# Datei:  database.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Alles rund um die SQLite Datenbank der Anwendung: das Anlegen der Tabellen,
+# und das Speichern/Laden von Sessions und Chat-Nachrichten.
+#
+#    session  => eine Zeile pro Chat-Session (Datum, Zeit, Name)
+#    messages => eine Zeile pro Chat-Nachricht, verknüpft über session_id
+#
+# Gelöscht wird zunächst nur "weich" (deleted = 1) - das geht auch für viele
+# tausend Zeilen sofort. Das eigentliche Entfernen erledigt purge_deleted()
+# später im Hintergrund.
+# ----------------------------------------------------------------------------
+import datetime      # date, and time routines
+import json          # id lists for SQL
+import os            # operating system stuff
+import sqlite3       # database: sqlite
+
+from tokens import count_tokens
+
+# ----------------------------------------------------------------------------
+# alle Sessions liegen in einer einzigen, langlebigen Datenbank. Früher wurde
+# bei jedem Start eine neue Datei data/chat_<datum>__<zeit>.db angelegt - diese
+# können mit importer.py übernommen werden.
+# ----------------------------------------------------------------------------
+DATA_PATH     = "data"
+DATABASE_NAME = "chat.db"
+
+def default_database_path():
+    return os.path.join(DATA_PATH, DATABASE_NAME)
+
+# ----------------------------------------------------------------------------
+# Datenbank öffnen: im WAL-Modus (write ahead log) können Leser und ein
+# Schreiber gleichzeitig arbeiten, und ein commit muss nicht jedes Mal die
+# ganze Datei synchronisieren.
+# ----------------------------------------------------------------------------
+SCHEMA_VERSION = 4   # bei jeder Änderung an create_schema erhöhen
+
+def open_database(path=None, check_same_thread=True):
+    conn = sqlite3.connect(path or default_database_path(),
+        check_same_thread = check_same_thread)
+
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous  = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+
+    # ------------------------------------------------------------------------
+    # das Schema nur anlegen/erweitern, wenn die Datenbank noch nicht auf dem
+    # aktuellen Stand ist - das spart bei jedem Start (und jedem Hintergrund-
+    # Job) ein gutes Dutzend Anweisungen.
+    # ------------------------------------------------------------------------
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        create_schema(conn)
+    return conn
+
+# ----------------------------------------------------------------------------
+# falls noch kein Datenbestand vorliegt (zum Beispiel bei der ersten in-
+# betriebnahme der Anwendung), erstellen wir erstmal alle nötigen Daten-
+# Objekte (Tabellen), die später die abgefragten Daten speichern.
+# ----------------------------------------------------------------------------
+def create_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS session (
+            id    INTEGER PRIMARY KEY,
+            datum TEXT,
+            zeit  TEXT,
+            name  TEXT
+        )
+    ''')
+
+    # ------------------------------------------------------------------------
+    # die Chat-Nachrichten. "tokens" ist die Anzahl der Token des Inhalts, und
+    # wird beim Speichern einmal berechnet.
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id         INTEGER PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES session(id),
+            role       TEXT    NOT NULL,
+            datum      TEXT,
+            zeit       TEXT,
+            content    TEXT    NOT NULL,
+            tokens     INTEGER NOT NULL DEFAULT 0,
+            deleted    INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # ------------------------------------------------------------------------
+    # ältere Datenbanken kennen die Spalte "deleted" noch nicht ...
+    # ------------------------------------------------------------------------
+    add_column(conn, "session",  "deleted", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "messages", "deleted", "INTEGER NOT NULL DEFAULT 0")
+
+    # ------------------------------------------------------------------------
+    # "die letzten N Nachrichten der Session X": der Index ist nach session_id
+    # und id sortiert, und enthält alle Spalten außer dem Inhalt. Die Abfrage
+    # läuft damit rückwärts über den Index und bricht nach N Zeilen ab; der
+    # Inhalt wird direkt über die rowid (id) geholt - ohne Table-Scan. Weich
+    # gelöschte Zeilen stehen gar nicht erst im Index.
+    # ------------------------------------------------------------------------
+    conn.execute("DROP INDEX IF EXISTS messages_session_latest")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS messages_live
+        ON messages (session_id, id, role, datum, zeit, tokens)
+        WHERE deleted = 0
+    ''')
+
+    # ------------------------------------------------------------------------
+    # die Session-Liste wird seitenweise (keyset pagination) nach Datum, Zeit
+    # und id geladen - dieser Index macht jede Seite gleich schnell, egal wie
+    # viele Sessions es gibt.
+    # ------------------------------------------------------------------------
+    conn.execute("DROP INDEX IF EXISTS session_order")
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS session_live
+        ON session (datum, zeit, id, name)
+        WHERE deleted = 0
+    ''')
+
+    # ------------------------------------------------------------------------
+    # Session-Namen sind eindeutig (unter den nicht gelöschten Sessions); die
+    # Prüfung "gibt es den Namen schon?" ist damit eine Suche im Index. In
+    # älteren Datenbanken kann ein Name mehrfach vorkommen - die späteren
+    # Sessions bekommen ihre id angehängt.
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        UPDATE session SET name = name || ' (' || id || ')'
+        WHERE deleted = 0 AND name IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM session WHERE deleted = 0 GROUP BY name)
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS session_name
+        ON session (name) WHERE deleted = 0
+    ''')
+
+    # ------------------------------------------------------------------------
+    # für das Aufräumen im Hintergrund: gelöschte Zeilen schnell finden ...
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS messages_deleted
+        ON messages (session_id) WHERE deleted = 1
+    ''')
+
+    # ------------------------------------------------------------------------
+    # ... und alle Nachrichten einer Session, egal ob gelöscht oder nicht:
+    # beim endgültigen Löschen einer Session ("hat sie noch Nachrichten?")
+    # und für die Prüfung des Fremdschlüssels. Ohne ihn wäre jede gelöschte
+    # Session ein Scan über alle Nachrichten.
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS messages_session
+        ON messages (session_id)
+    ''')
+
+    # ------------------------------------------------------------------------
+    # Zusammenfassung älterer Nachrichten pro Session: sie umfasst alle Nach-
+    # richten bis einschließlich "upto_id".
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS summaries (
+            session_id INTEGER PRIMARY KEY REFERENCES session(id),
+            upto_id    INTEGER NOT NULL,
+            content    TEXT    NOT NULL,
+            tokens     INTEGER NOT NULL
+        )
+    ''')
+
+    # ------------------------------------------------------------------------
+    # Assistent und Thread auf dem Server werden wiederverwendet - nicht bei
+    # jedem Start neu angelegt. Schlüssel ist ein Hash über Anweisungen, Tools
+    # und Modell (chatclient.assistant_key); ändert sich davon etwas, wird
+    # ein neuer Assistent angelegt.
+    # ------------------------------------------------------------------------
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS assistants (
+            config_hash  TEXT PRIMARY KEY,
+            assistant_id TEXT NOT NULL,
+            thread_id    TEXT NOT NULL,
+            created      TEXT
+        )
+    ''')
+    create_search_index(conn)
+
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+# ----------------------------------------------------------------------------
+# eine Spalte nachträglich anlegen, sofern es sie noch nicht gibt ...
+# ----------------------------------------------------------------------------
+def add_column(conn, table, column, definition):
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+# ----------------------------------------------------------------------------
+# Volltext-Suche (FTS5) über den Inhalt aller Nachrichten. Der Index speichert
+# den Text nicht doppelt (content='messages'), und wird über Trigger bei jedem
+# INSERT, UPDATE und DELETE auf "messages" nachgeführt.
+#
+# Ist SQLite ohne FTS5 übersetzt worden, gibt es keinen Index - die Suche
+# fällt dann auf LIKE zurück.
+# ----------------------------------------------------------------------------
+def has_search_index(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+    ).fetchone() is not None
+
+def create_search_index(conn):
+    if has_search_index(conn):
+        return True
+
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE messages_fts USING fts5(
+                content,
+                content       = 'messages',
+                content_rowid = 'id',
+                tokenize      = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return False
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    ''')
+
+    # ------------------------------------------------------------------------
+    # bereits vorhandene Nachrichten einmalig in den Index übernehmen ...
+    # ------------------------------------------------------------------------
+    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    return True
+
+# ----------------------------------------------------------------------------
+# eine neue Session anlegen; zurück kommt die id der Session.
+# ----------------------------------------------------------------------------
+def create_session(conn, name, date_str=None, time_str=None):
+    now = datetime.datetime.now()
+
+    date_str = date_str or now.strftime("%Y-%m-%d")
+    time_str = time_str or now.strftime("%H:%M:%S")
+
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO session (datum,zeit,name) VALUES (?,?,?)",
+            (date_str, time_str, name))
+    return cursor.lastrowid
+
+# ----------------------------------------------------------------------------
+# gibt es eine (nicht gelöschte) Session mit diesem Namen? Bzw. ein noch
+# freier Name: "name", sonst "name (2)", "name (3)", ... - für Sessions, die
+# beim Import oder automatisch angelegt werden.
+# ----------------------------------------------------------------------------
+def session_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM session WHERE name = ? AND deleted = 0",
+        (name,)).fetchone() is not None
+
+def free_session_name(conn, name):
+    candidate = name
+    number    = 1
+    while session_exists(conn, candidate):
+        number   += 1
+        candidate = f"{name} ({number})"
+    return candidate
+
+# ----------------------------------------------------------------------------
+# alle Sessions (id, datum, zeit, name) - für den SessionCatalog ...
+# ----------------------------------------------------------------------------
+def live_sessions(conn):
+    return conn.execute(
+        "SELECT id, datum, zeit, name FROM session WHERE deleted = 0").fetchall()
+
+# ----------------------------------------------------------------------------
+# eine Seite der Session-Liste laden, die neueste Session zuerst. "after" ist
+# der Schlüssel (datum, zeit, id) der letzten Zeile der vorherigen Seite; es
+# wird also nie ein OFFSET übersprungen, sondern direkt im Index aufgesetzt.
+# Zurück kommen (id, datum, zeit, name) Tupel.
+# ----------------------------------------------------------------------------
+def session_page(conn, limit=50, after=None):
+    if after is None:
+        return conn.execute('''
+            SELECT id, datum, zeit, name FROM session
+            WHERE deleted = 0
+            ORDER BY datum DESC, zeit DESC, id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
+    datum, zeit, session_id = after
+    return conn.execute('''
+        SELECT id, datum, zeit, name FROM session
+        WHERE deleted = 0 AND (datum, zeit, id) < (?, ?, ?)
+        ORDER BY datum DESC, zeit DESC, id DESC LIMIT ?
+    ''', (datum, zeit, session_id, limit)).fetchall()
+
+# ----------------------------------------------------------------------------
+# speichert die Nachrichten eines Chat-Durchgangs (z.B. Frage und Antwort) in
+# einer einzigen Transaktion. "turn" ist eine Liste von (role, datum, zeit,
+# content) Tupeln; zurück kommen die ids der neuen Zeilen.
+# ----------------------------------------------------------------------------
+def add_turn(conn, session_id, turn):
+    ids = []
+    with conn:
+        for role, date_str, time_str, content in turn:
+            cursor = conn.execute('''
+                INSERT INTO messages (session_id, role, datum, zeit, content, tokens)
+                VALUES (?,?,?,?,?,?)
+            ''', (session_id, role, date_str, time_str, content, count_tokens(content)))
+            ids.append(cursor.lastrowid)
+    return ids
+
+# ----------------------------------------------------------------------------
+# die letzten "limit" Nachrichten einer Session laden - die älteste zuerst.
+# Optional nur Nachrichten, die älter sind als "before_id".
+# ----------------------------------------------------------------------------
+def latest_messages(conn, session_id, limit=200, before_id=None):
+    if before_id is None:
+        rows = conn.execute('''
+            SELECT id, role, datum, zeit, content, tokens FROM messages
+            WHERE session_id = ? AND deleted = 0
+            ORDER BY id DESC LIMIT ?
+        ''', (session_id, limit)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT id, role, datum, zeit, content, tokens FROM messages
+            WHERE session_id = ? AND deleted = 0 AND id < ?
+            ORDER BY id DESC LIMIT ?
+        ''', (session_id, before_id, limit)).fetchall()
+
+    rows.reverse()
+    return rows
+
+# ----------------------------------------------------------------------------
+# die nächsten "limit" Nachrichten nach "after_id" (für das Nachladen beim
+# Scrollen nach unten) - die älteste zuerst.
+# ----------------------------------------------------------------------------
+def messages_after(conn, session_id, after_id, limit=200):
+    return conn.execute('''
+        SELECT id, role, datum, zeit, content, tokens FROM messages
+        WHERE session_id = ? AND deleted = 0 AND id > ?
+        ORDER BY id LIMIT ?
+    ''', (session_id, after_id, limit)).fetchall()
+
+# ----------------------------------------------------------------------------
+# die Nachrichten rund um "msg_id" laden (z.B. für einen Sprung aus der Suche
+# heraus) - die älteste zuerst.
+# ----------------------------------------------------------------------------
+def messages_around(conn, session_id, msg_id, before=100, after=100):
+    rows = latest_messages(conn, session_id, before + 1, msg_id + 1)
+    rows += messages_after(conn, session_id, msg_id, after)
+    return rows
+
+# ----------------------------------------------------------------------------
+# Steuerzeichen, mit denen die Fundstellen in einem snippet markiert sind -
+# sie können im Text selbst nicht vorkommen (anders als z.B. "<b>").
+# ----------------------------------------------------------------------------
+SNIPPET_START = "\x02"
+SNIPPET_END   = "\x03"
+
+# ----------------------------------------------------------------------------
+# Benutzer-Eingabe in eine FTS5 Abfrage umwandeln: jedes Wort wird in An-
+# führungszeichen gesetzt (damit Sonderzeichen wie - oder : keine Operatoren
+# sind), das letzte Wort darf auch nur der Anfang eines Wortes sein.
+# ----------------------------------------------------------------------------
+def fts_query(text):
+    words = text.split()
+    if not words:
+        return None
+
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+# ----------------------------------------------------------------------------
+# Volltext-Suche über alle Sessions. Zurück kommen (msg_id, session_id,
+# session-name, datum, zeit, snippet) Tupel, die besten Treffer zuerst. Im
+# snippet sind die Fundstellen mit SNIPPET_START ... SNIPPET_END markiert.
+# ----------------------------------------------------------------------------
+def search_messages(conn, text, limit=50):
+    query = fts_query(text)
+    if query is None:
+        return []
+
+    if has_search_index(conn):
+        return conn.execute('''
+            SELECT m.id, m.session_id, s.name, m.datum, m.zeit,
+                   snippet(messages_fts, 0, char(2), char(3), '...', 12)
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN session  s ON s.id = m.session_id
+            WHERE messages_fts MATCH ? AND m.deleted = 0 AND s.deleted = 0
+            ORDER BY rank LIMIT ?
+        ''', (query, limit)).fetchall()
+
+    return conn.execute('''
+        SELECT m.id, m.session_id, s.name, m.datum, m.zeit, substr(m.content, 1, 80)
+        FROM messages m
+        JOIN session s ON s.id = m.session_id
+        WHERE m.content LIKE ? AND m.deleted = 0 AND s.deleted = 0
+        ORDER BY m.id DESC LIMIT ?
+    ''', ("%" + text.strip() + "%", limit)).fetchall()
+
+# ----------------------------------------------------------------------------
+# Zusammenfassung einer Session lesen/schreiben. get_summary liefert (upto_id,
+# content, tokens) oder None.
+# ----------------------------------------------------------------------------
+def get_summary(conn, session_id):
+    return conn.execute(
+        "SELECT upto_id, content, tokens FROM summaries WHERE session_id = ?",
+        (session_id,)).fetchone()
+
+def save_summary(conn, session_id, upto_id, content):
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO summaries (session_id, upto_id, content, tokens)
+            VALUES (?,?,?,?)
+        ''', (session_id, upto_id, content, count_tokens(content)))
+
+# ----------------------------------------------------------------------------
+# gespeicherte (assistant_id, thread_id) zu einem Konfigurations-Hash, oder
+# None ...
+# ----------------------------------------------------------------------------
+def get_assistant_ids(conn, config_hash):
+    return conn.execute(
+        "SELECT assistant_id, thread_id FROM assistants WHERE config_hash = ?",
+        (config_hash,)).fetchone()
+
+def save_assistant_ids(conn, config_hash, assistant_id, thread_id):
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO assistants (config_hash, assistant_id, thread_id, created)
+            VALUES (?,?,?,datetime('now'))
+        ''', (config_hash, assistant_id, thread_id))
+
+def forget_assistant_ids(conn, config_hash):
+    with conn:
+        conn.execute("DELETE FROM assistants WHERE config_hash = ?", (config_hash,))
+
+# ----------------------------------------------------------------------------
+# weiches Löschen in einer einzigen Transaktion. Entweder werden die ids
+# angegeben, oder - bei "Alles auswählen" - alle Zeilen außer "except_ids".
+# ----------------------------------------------------------------------------
+def delete_sessions(conn, ids=None, except_ids=None):
+    with conn:
+        if ids is not None:
+            conn.executemany(
+                "UPDATE session SET deleted = 1 WHERE id = ?",
+                [(session_id,) for session_id in ids])
+        else:
+            conn.execute('''
+                UPDATE session SET deleted = 1
+                WHERE deleted = 0 AND id NOT IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(except_ids or [])),))
+
+def delete_messages(conn, ids=None, session_id=None, except_ids=None):
+    with conn:
+        if ids is not None:
+            conn.executemany(
+                "UPDATE messages SET deleted = 1 WHERE id = ?",
+                [(msg_id,) for msg_id in ids])
+        else:
+            conn.execute('''
+                UPDATE messages SET deleted = 1
+                WHERE session_id = ? AND deleted = 0
+                AND id NOT IN (SELECT value FROM json_each(?))
+            ''', (session_id, json.dumps(list(except_ids or []))))
+
+# ----------------------------------------------------------------------------
+# weich gelöschte Zeilen endgültig entfernen (läuft im Hintergrund, mit einer
+# eigenen Verbindung). Es wird in kleinen Portionen gelöscht, damit die GUI
+# zwischendurch immer wieder schreiben kann.
+# ----------------------------------------------------------------------------
+def purge_deleted(conn, chunk=5000, cancelled=None):
+    removed = 0
+
+    statements = [
+        '''DELETE FROM messages WHERE id IN (
+               SELECT id FROM messages WHERE deleted = 1 LIMIT ?)''',
+        '''DELETE FROM messages WHERE id IN (
+               SELECT m.id FROM messages m JOIN session s ON s.id = m.session_id
+               WHERE s.deleted = 1 LIMIT ?)''',
+        '''DELETE FROM summaries WHERE session_id IN (
+               SELECT id FROM session WHERE deleted = 1 LIMIT ?)''',
+        '''DELETE FROM session WHERE id IN (
+               SELECT s.id FROM session s WHERE s.deleted = 1
+               AND NOT EXISTS (SELECT 1 FROM messages m WHERE m.session_id = s.id)
+               LIMIT ?)''',
+    ]
+
+    for statement in statements:
+        while cancelled is None or not cancelled():
+            with conn:
+                count = conn.execute(statement, (chunk,)).rowcount
+            removed += count
+            if count < chunk:
+                break
+
+    return removed
@@ -0,0 +1,334 @@
+# ----------------------------------------------------------------------------
+# Datei:  exchange.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Export und Import von Sessions bzw. einzelnen Nachrichten. Das Format hängt
+# an der Datei-Endung:
+#
+#    .jsonl              eine Nachricht pro Zeile (verlustfrei)
+#    .md                 Markdown zum Lesen (kann auch wieder importiert werden)
+#    .parquet / .arrow   Spalten-Format für Auswertungen (braucht "pyarrow")
+#
+# Gelesen wird in Portionen (chunk) direkt vom Datenbank-Cursor, geschrieben
+# Portion für Portion - der Speicherbedarf bleibt gleich, egal ob 100 oder
+# eine Million Nachrichten exportiert werden. Die Funktionen laufen in der
+# Anwendung als Job im Hintergrund (mit eigener Datenbank-Verbindung):
+#
+#    python exchange.py export alles.jsonl               => alle Sessions
+#    python exchange.py export s.md --session 3 --session 7
+#    python exchange.py import alles.jsonl
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import json          # JSONL, id lists for SQL
+import os            # operating system stuff
+import sys           # system specifies
+
+from database import open_database, default_database_path, create_session
+from database import free_session_name
+from tokens   import count_tokens
+
+try:
+    import pyarrow   # columnar formats (optional)
+except ImportError:
+    pyarrow = None
+
+CHUNK = 1000
+
+FIELDS = ("session_id", "session", "session_date", "session_time",
+          "id", "role", "date", "time", "content")
+
+class ExchangeError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# die zu exportierenden Nachrichten, in Portionen von "chunk" Zeilen (Listen
+# von dicts mit den Schlüsseln aus FIELDS). Ohne Angaben: alle Nachrichten
+# aller Sessions; sonst eingeschränkt auf bzw. ohne die angegebenen ids.
+# ----------------------------------------------------------------------------
+def select_messages(conn, sessions=None, except_sessions=None,
+    messages=None, except_messages=None, chunk=CHUNK):
+
+    where  = ["m.deleted = 0", "s.deleted = 0"]
+    params = []
+    for ids, condition in (
+        (sessions,        "m.session_id IN"),
+        (except_sessions, "m.session_id NOT IN"),
+        (messages,        "m.id IN"),
+        (except_messages, "m.id NOT IN"),
+    ):
+        if ids is not None:
+            where.append(f"{condition} (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(ids)))
+
+    cursor = conn.execute(f'''
+        SELECT m.session_id, s.name, s.datum, s.zeit,
+               m.id, m.role, m.datum, m.zeit, m.content
+        FROM messages m JOIN session s ON s.id = m.session_id
+        WHERE {" AND ".join(where)}
+        ORDER BY m.session_id, m.id
+    ''', params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                return
+            yield [ dict(zip(FIELDS, row)) for row in rows ]
+    finally:
+        cursor.close()
+
+# ----------------------------------------------------------------------------
+# Schreiben. Jede Funktion bekommt die Portionen von select_messages, und
+# eine Funktion, die nach jeder Portion aufgerufen wird.
+# ----------------------------------------------------------------------------
+def write_jsonl(chunks, file, after_chunk):
+    for rows in chunks:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        after_chunk(rows)
+
+# ----------------------------------------
+# Zeilen, die mit "#" oder "\" beginnen,
+# bekommen ein "\" davor - so kann sie der
+# Import nicht mit Überschriften ver-
+# wechseln.
+# ----------------------------------------
+def escape_markdown(text):
+    return "\n".join("\\" + line if line.startswith(("#", "\\")) else line
+        for line in text.split("\n"))
+
+def unescape_markdown(line):
+    return line[1:] if line.startswith("\\") else line
+
+def write_markdown(chunks, file, after_chunk):
+    current = None
+    for rows in chunks:
+        for row in rows:
+            if row["session_id"] != current:
+                current = row["session_id"]
+                file.write(f"# Session: {row['session']}\n\n")
+                file.write(f"_{row['session_date']} {row['session_time']}_\n\n")
+            file.write(f"## {row['role']} · {row['date']} {row['time']}\n\n")
+            file.write(escape_markdown(row["content"]) + "\n\n")
+        after_chunk(rows)
+
+def arrow_schema():
+    return pyarrow.schema([
+        (name, pyarrow.int64() if name in ("session_id", "id") else pyarrow.string())
+        for name in FIELDS ])
+
+def arrow_batch(rows, schema):
+    return pyarrow.record_batch([
+        pyarrow.array([row[name] for row in rows], type=schema.field(name).type)
+        for name in FIELDS ], schema=schema)
+
+def write_parquet(chunks, path, after_chunk):
+    import pyarrow.parquet
+    schema = arrow_schema()
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(arrow_batch(rows, schema))
+            after_chunk(rows)
+
+def write_arrow(chunks, path, after_chunk):
+    import pyarrow.ipc
+    schema = arrow_schema()
+    with pyarrow.ipc.new_file(path, schema) as writer:
+        for rows in chunks:
+            writer.write_batch(arrow_batch(rows, schema))
+            after_chunk(rows)
+
+# ----------------------------------------------------------------------------
+# Lesen: jede Funktion liefert die Nachrichten einzeln (als dict) ...
+# ----------------------------------------------------------------------------
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def read_markdown(path):
+    session = None
+    row     = None
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if line.startswith("# Session: "):
+                if row is not None:
+                    yield finish_markdown_row(row)
+                    row = None
+                session = { "session_id": None, "session": line[len("# Session: "):],
+                            "session_date": None, "session_time": None }
+                continue
+
+            if line.startswith("## ") and session is not None:
+                if row is not None:
+                    yield finish_markdown_row(row)
+                role, _, stamp = line[3:].partition(" · ")
+                date_str, _, time_str = stamp.partition(" ")
+                row = dict(session, role=role, date=date_str or None,
+                    time=time_str or None, lines=[])
+                continue
+
+            if row is not None:
+                row["lines"].append(unescape_markdown(line))
+            elif session is not None and line.startswith("_") and line.endswith("_"):
+                date_str, _, time_str = line.strip("_").partition(" ")
+                session["session_date"] = date_str or None
+                session["session_time"] = time_str or None
+
+    if row is not None:
+        yield finish_markdown_row(row)
+
+def finish_markdown_row(row):
+    row["content"] = "\n".join(row.pop("lines")).strip("\n")
+    return row
+
+def read_parquet(path):
+    import pyarrow.parquet
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=CHUNK):
+        yield from batch.to_pylist()
+
+def read_arrow(path):
+    import pyarrow.ipc
+    with pyarrow.memory_map(path) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for number in range(reader.num_record_batches):
+            yield from reader.get_batch(number).to_pylist()
+
+# ----------------------------------------------------------------------------
+# Datei-Endung => (schreiben, lesen, braucht pyarrow, Pfad statt Datei)
+# ----------------------------------------------------------------------------
+FORMATS = {
+    ".jsonl"  : (write_jsonl,    read_jsonl,    False),
+    ".md"     : (write_markdown, read_markdown, False),
+    ".parquet": (write_parquet,  read_parquet,  True ),
+    ".arrow"  : (write_arrow,    read_arrow,    True ),
+}
+
+# Filter für den Datei-Dialog ...
+FILE_FILTER = ("JSON Lines (*.jsonl);;Markdown (*.md);;"
+               + "Parquet (*.parquet);;Arrow (*.arrow)")
+
+def get_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ExchangeError(f"unbekanntes Format: {extension or path}")
+    writer, reader, needs_arrow = FORMATS[extension]
+    if needs_arrow and pyarrow is None:
+        raise ExchangeError(f"für {extension} wird das Paket pyarrow gebraucht")
+    return writer, reader, needs_arrow
+
+# ----------------------------------------------------------------------------
+# exportieren; die Auswahl wie bei select_messages. Geschrieben wird zuerst
+# in eine .tmp Datei - bei Fehler oder Abbruch bleibt eine vorhandene Datei
+# unverändert. Zurück kommt die Anzahl der Nachrichten (None bei Abbruch).
+# ----------------------------------------------------------------------------
+def export_messages(conn, path, chunk=CHUNK, cancelled=None, progress=None, **selection):
+    writer, reader, binary = get_format(path)
+    chunks = select_messages(conn, chunk=chunk, **selection)
+    count  = 0
+
+    def after_chunk(rows):
+        nonlocal count
+        count += len(rows)
+        if progress is not None:
+            progress(count)
+        if cancelled is not None and cancelled():
+            raise InterruptedError()
+
+    temp = path + ".tmp"
+    try:
+        if binary:
+            writer(chunks, temp, after_chunk)
+        else:
+            with open(temp, "w", encoding="utf-8", newline="\n") as file:
+                writer(chunks, file, after_chunk)
+        os.replace(temp, path)
+    except InterruptedError:
+        return None
+    finally:
+        chunks.close()
+        if os.path.exists(temp):
+            os.remove(temp)
+    return count
+
+# ----------------------------------------------------------------------------
+# importieren: jede Session aus der Datei wird als neue Session angelegt;
+# die Nachrichten werden portionsweise in je einer Transaktion gespeichert.
+# ----------------------------------------------------------------------------
+def import_messages(conn, path, chunk=CHUNK, cancelled=None, progress=None):
+    writer, reader, binary = get_format(path)
+    stats    = { "sessions": 0, "messages": 0 }
+    sessions = {}   # (session_id, Name, Datum, Zeit) aus der Datei => neue id
+    pending  = []
+
+    def store():
+        with conn:
+            conn.executemany('''
+                INSERT INTO messages (session_id, role, datum, zeit, content, tokens)
+                VALUES (?,?,?,?,?,?)
+            ''', pending)
+        stats["messages"] += len(pending)
+        pending.clear()
+        if progress is not None:
+            progress(stats["messages"])
+
+    for row in reader(path):
+        if cancelled is not None and cancelled():
+            break
+
+        key = (row.get("session_id"), row.get("session"),
+               row.get("session_date"), row.get("session_time"))
+        session_id = sessions.get(key)
+        if session_id is None:
+            session_id = create_session(conn,
+                free_session_name(conn, row.get("session") or os.path.basename(path)),
+                row.get("session_date"), row.get("session_time"))
+            sessions[key] = session_id
+            stats["sessions"] += 1
+
+        content = row.get("content") or ""
+        pending.append((session_id, row.get("role") or "user",
+            row.get("date"), row.get("time"), content, count_tokens(content)))
+        if len(pending) >= chunk:
+            store()
+
+    if pending:
+        store()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sessions exportieren und importieren")
+    parser.add_argument("--database", default=default_database_path(), help="Datenbank")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Nachrichten in eine Datei schreiben")
+    export.add_argument("path", help="Ziel (.jsonl, .md, .parquet, .arrow)")
+    export.add_argument("--session", type=int, action="append", help="nur diese Session(s)")
+
+    load = commands.add_parser("import", help="Nachrichten aus einer Datei übernehmen")
+    load.add_argument("path", help="Quelle (.jsonl, .md, .parquet, .arrow)")
+    args = parser.parse_args(argv)
+
+    conn = open_database(args.database)
+    try:
+        if args.command == "export":
+            count = export_messages(conn, args.path, sessions=args.session)
+            print(f"{count} Nachrichten nach {args.path} geschrieben")
+        else:
+            stats = import_messages(conn, args.path)
+            print(f"übernommen: {stats['sessions']} Sessions, {stats['messages']} Nachrichten")
+    except ExchangeError as ex:
+        print(f"{ex}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
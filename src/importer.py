@@ -0,0 +1,188 @@
+# ----------------------------------------------------------------------------
+# Datei:  importer.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Früher wurde bei jedem Start der Anwendung eine neue Datenbank-Datei
+# data/chat_<datum>__<zeit>.db angelegt. Dieses Skript übernimmt die Sessions
+# (und - sofern vorhanden - die Nachrichten) aus diesen Dateien in die eine,
+# gemeinsame Datenbank data/chat.db:
+#
+#    python importer.py                 => alle data/chat_*.db Dateien
+#    python importer.py a.db b.db       => nur die angegebenen Dateien
+#    python importer.py --workers 8     => Anzahl paralleler Leser
+#
+# Die Quell-Dateien werden parallel gelesen; geschrieben wird pro Datei in
+# einer einzigen Transaktion. Sessions mit gleichem Namen, Datum und Zeit
+# werden nur einmal übernommen, und bereits importierte Dateien werden beim
+# nächsten Lauf übersprungen.
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import glob          # file name patterns
+import os            # operating system stuff
+import sqlite3       # database: sqlite
+import sys           # system specifies
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from database import open_database, default_database_path, DATA_PATH
+from database import free_session_name
+from tokens   import count_tokens
+
+# ----------------------------------------------------------------------------
+# alle alten Datenbank-Dateien im Daten-Verzeichnis finden ...
+# ----------------------------------------------------------------------------
+def find_legacy_databases(data_path=DATA_PATH):
+    target = os.path.abspath(default_database_path())
+    return sorted(
+        path for path in glob.glob(os.path.join(data_path, "chat_*.db"))
+        if os.path.abspath(path) != target)
+
+# ----------------------------------------------------------------------------
+# eine Quell-Datei lesen (läuft in einem Arbeits-Thread). Zurück kommen die
+# Sessions als (id, datum, zeit, name), und die Nachrichten als (session_id,
+# role, datum, zeit, content, tokens).
+# ----------------------------------------------------------------------------
+def read_legacy_database(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+        sessions = []
+        if "session" in tables:
+            sessions = conn.execute(
+                "SELECT id, datum, zeit, name FROM session ORDER BY id").fetchall()
+
+        messages = []
+        if "messages" in tables:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+            tokens  = "tokens" if "tokens" in columns else "NULL"
+            messages = conn.execute(f'''
+                SELECT session_id, role, datum, zeit, content, {tokens}
+                FROM messages ORDER BY id
+            ''').fetchall()
+    finally:
+        conn.close()
+
+    return sessions, messages
+
+# ----------------------------------------------------------------------------
+# bereits übernommene Dateien (gleicher Pfad, Größe und Zeitstempel) aus der
+# Liste entfernen ...
+# ----------------------------------------------------------------------------
+def pending_legacy_databases(conn, paths):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS imported_files (
+            path  TEXT PRIMARY KEY,
+            size  INTEGER,
+            mtime REAL
+        )
+    ''')
+
+    done = {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT path, size, mtime FROM imported_files")}
+    todo = []
+    for path in paths:
+        stat = os.stat(path)
+        if done.get(os.path.abspath(path)) != (stat.st_size, stat.st_mtime):
+            todo.append(path)
+    return todo
+
+# ----------------------------------------------------------------------------
+# der eigentliche Import ...
+# ----------------------------------------------------------------------------
+def import_databases(conn, paths, workers=4, progress=None):
+    todo = pending_legacy_databases(conn, paths)
+
+    # ------------------------------------------------------------------------
+    # vorhandene Sessions für die Duplikat-Prüfung (name, datum, zeit) ...
+    # ------------------------------------------------------------------------
+    known = {(name, datum, zeit): session_id for session_id, datum, zeit, name
+        in conn.execute("SELECT id, datum, zeit, name FROM session")}
+
+    stats = { "files": 0, "sessions": 0, "duplicates": 0, "messages": 0, "errors": [] }
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(read_legacy_database, path): path for path in todo}
+
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                sessions, messages = future.result()
+            except sqlite3.Error as ex:
+                stats["errors"].append((path, f"{ex}"))
+                continue
+
+            # ----------------------------------------------------------------
+            # eine Transaktion pro Quell-Datei ...
+            # ----------------------------------------------------------------
+            with conn:
+                id_map = {}
+                for old_id, datum, zeit, name in sessions:
+                    key = (name, datum, zeit)
+                    if key in known:
+                        stats["duplicates"] += 1
+                        continue
+
+                    cursor = conn.execute(
+                        "INSERT INTO session (datum,zeit,name) VALUES (?,?,?)",
+                        (datum, zeit, free_session_name(conn, name)))
+                    known[key]     = cursor.lastrowid
+                    id_map[old_id] = cursor.lastrowid
+                    stats["sessions"] += 1
+
+                rows = [
+                    (id_map[session_id], role, datum, zeit, content,
+                     tokens if tokens is not None else count_tokens(content))
+                    for session_id, role, datum, zeit, content, tokens in messages
+                    if session_id in id_map ]
+
+                conn.executemany('''
+                    INSERT INTO messages (session_id, role, datum, zeit, content, tokens)
+                    VALUES (?,?,?,?,?,?)
+                ''', rows)
+                stats["messages"] += len(rows)
+
+                stat = os.stat(path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO imported_files (path, size, mtime) VALUES (?,?,?)",
+                    (os.path.abspath(path), stat.st_size, stat.st_mtime))
+
+            stats["files"] += 1
+            if progress is not None:
+                progress(stats["files"], len(todo))
+
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="alte data/chat_*.db Dateien in data/chat.db übernehmen")
+    parser.add_argument("paths", nargs="*", help="Quell-Dateien (Standard: data/chat_*.db)")
+    parser.add_argument("--database", default=default_database_path(), help="Ziel-Datenbank")
+    parser.add_argument("--workers", type=int, default=4, help="Anzahl paralleler Leser")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or find_legacy_databases()
+
+    os.makedirs(os.path.dirname(args.database) or ".", exist_ok=True)
+    conn = open_database(args.database)
+    try:
+        stats = import_databases(conn, paths, args.workers,
+            lambda done, total: print(f"{done}/{total}", end="\r"))
+    finally:
+        conn.close()
+
+    print()
+    print(f"Dateien: {stats['files']}, Sessions: {stats['sessions']}, "
+        + f"Duplikate: {stats['duplicates']}, Nachrichten: {stats['messages']}")
+    for path, error in stats["errors"]:
+        print(f"Fehler: {path}: {error}")
+    return 1 if stats["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# ----------------------------------------------------------------------------
+# Datei:  loadgen.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Last-Generator: schickt viele Anfragen gleichzeitig über chatclient.py (also
+# genau so wie die Anwendung) an einen Server und misst:
+#
+#    - Zeit bis zum ersten Token (time to first token)
+#    - Token pro Sekunde während des Streams
+#    - Gesamt-Dauer einer Anfrage (p50/p95/p99)
+#
+#    python loadgen.py --requests 200 --concurrency 16
+#        => startet mockserver.py im Hintergrund und misst dagegen
+#    python loadgen.py --base-url http://127.0.0.1:8808/v1
+#        => gegen einen bereits laufenden Server
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import json          # machine readable results
+import os            # operating system stuff
+import sys           # system specifies
+import time          # high resolution timer
+
+from concurrent.futures import ThreadPoolExecutor
+
+import chatclient
+from metrics    import percentile
+from mockserver import MockSettings, start_background
+from tokens     import count_tokens
+
+# ----------------------------------------------------------------------------
+# eine einzelne Anfrage; zurück kommen die gemessenen Zeiten in Sekunden.
+# ----------------------------------------------------------------------------
+def run_request(number, stream=True, max_tokens=200):
+    messages = [
+        { "role": "system", "content": chatclient.SYSTEM_PROMPT },
+        { "role": "user",   "content": f"Frage Nummer {number}: was ist eine Schleife?" },
+    ]
+
+    begin = time.perf_counter()
+    first = None
+    if stream:
+        parts = []
+        for delta in chatclient.stream_chat(messages, max_tokens=max_tokens):
+            if first is None:
+                first = time.perf_counter()
+            parts.append(delta)
+        text = "".join(parts)
+    else:
+        text = chatclient.complete_chat(messages, max_tokens=max_tokens)
+    end = time.perf_counter()
+
+    first  = first or end
+    tokens = count_tokens(text)
+    return {
+        "ttft"   : first - begin,
+        "latency": end - begin,
+        "tokens" : tokens,
+        "rate"   : tokens / (end - first) if end > first else None,
+    }
+
+def run_load(requests, concurrency, stream=True, max_tokens=200):
+    results, errors = [], []
+
+    def task(number):
+        try:
+            return run_request(number, stream, max_tokens)
+        except Exception as ex:
+            return ex
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for outcome in pool.map(task, range(requests)):
+            if isinstance(outcome, Exception):
+                errors.append(f"{type(outcome).__name__}: {outcome}")
+            else:
+                results.append(outcome)
+    duration = time.perf_counter() - begin
+
+    def summary(key, scale=1000):
+        values = sorted(entry[key] * scale for entry in results if entry[key] is not None)
+        return { name: percentile(values, percent)
+            for name, percent in (("p50", 50), ("p95", 95), ("p99", 99)) }
+
+    return {
+        "requests"      : requests,
+        "concurrency"   : concurrency,
+        "stream"        : stream,
+        "ok"            : len(results),
+        "errors"        : len(errors),
+        "error_samples" : errors[:5],
+        "duration_s"    : duration,
+        "throughput_rps": len(results) / duration if duration else None,
+        "ttft_ms"       : summary("ttft"),
+        "latency_ms"    : summary("latency"),
+        "tokens_per_s"  : summary("rate", 1),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Last-Test für den Chat-Client")
+    parser.add_argument("--requests", type=int, default=100, help="Anzahl Anfragen")
+    parser.add_argument("--concurrency", type=int, default=8, help="gleichzeitige Anfragen")
+    parser.add_argument("--no-stream", action="store_true", help="Antworten am Stück holen")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--base-url", help="Server (Standard: eingebauter mockserver)")
+    parser.add_argument("--latency", type=float, default=200, help="mockserver: ms bis zum ersten Token")
+    parser.add_argument("--token-rate", type=float, default=50, help="mockserver: Token pro Sekunde")
+    parser.add_argument("--tokens", type=int, default=60, help="mockserver: Token pro Antwort")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mockserver: Anteil 500er Fehler")
+    parser.add_argument("--output", help="Ergebnis als JSON in diese Datei schreiben")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        server, base_url = start_background(MockSettings(
+            args.latency, token_rate=args.token_rate, tokens=args.tokens,
+            error_rate=args.error_rate))
+
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    chatclient.reset_client()
+    chatclient.get_client()   # openai laden, bevor die Uhr läuft
+
+    try:
+        report = run_load(args.requests, args.concurrency, not args.no_stream, args.max_tokens)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report["base_url"] = base_url
+    for key in ("ttft_ms", "latency_ms", "tokens_per_s"):
+        values = report[key]
+        print(f"{key:<14} " + "  ".join(
+            f"{name}={value:9.1f}" if value is not None else f"{name}=      -"
+            for name, value in values.items()))
+    print(f"{'ok/errors':<14} {report['ok']}/{report['errors']}  "
+        + f"({report['throughput_rps']:.1f} Anfragen/s)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -100,12 +100,49 @@ import locale        # internal system locale
 import sqlite3       # database: sqlite
 import configparser  # .ini files
 import traceback     # stack exception trace back
+import html          # escape rich text
 
 from PyQt5.QtWidgets import *             # Qt5 widgets
-from PyQt5.QtGui     import QIcon, QFont  # Qt5 gui
-from PyQt5.QtCore    import pyqtSlot, Qt  # Qt5 core
+from PyQt5.QtGui     import QIcon, QFont, QKeySequence  # Qt5 gui
+from PyQt5.QtCore    import pyqtSlot, Qt, QTimer, QPoint  # Qt5 core
 
-from openai import OpenAI                 # ChatGPT like AI
+from chatview   import ChatListModel, ChatItemDelegate, ChatMessage  # Chat-Verlauf
+from chatview   import CHAT_PAGE_SIZE, CHAT_MAX_ROWS, CHAT_KEEP_ROWS
+from sessionview import SessionListModel, SessionItemDelegate        # Session-Liste
+from sessionview import SessionIdRole
+from streaming  import StreamBuffer, StreamRenderer, stream_job      # Antwort-Stream
+from worker     import RequestExecutor                               # Hintergrund-Threads
+from chatclient import get_client, stream_chat, SYSTEM_PROMPT        # OpenAI Anfragen
+from chatclient import DEFAULT_MODEL, LANE_INTERACTIVE, LANE_BATCH
+from chatclient import scheduler                                     # Rate-Limits
+from cache      import CompletionCache, cache_key, cacheable         # Antwort-Cache
+from postprocess import postprocessor_from_config                    # Antworten aufbereiten
+from database   import open_database, create_session, add_turn       # Datenbank
+from database   import DATA_PATH, default_database_path
+from importer   import import_databases, pending_legacy_databases    # alte Datenbanken
+from importer   import find_legacy_databases
+from database   import latest_messages, messages_around, messages_after, search_messages
+from database   import SNIPPET_START, SNIPPET_END
+from database   import get_summary, save_summary
+from database   import delete_sessions, delete_messages, purge_deleted
+from database   import session_exists, free_session_name, live_sessions
+from catalog    import SessionCatalog, name_key                      # Session-Namen
+from context    import fit_messages, summarize                       # Token-Budget
+from context    import CONTEXT_BUDGET, COMPACTION_THRESHOLD
+from chatclient import ensure_assistant, stream_run, AssistantNotFoundError
+from chatclient import ASSISTANT_CONFIG
+from startup    import startup_timer, STARTUP_BUDGET_MS              # Start-Zeiten
+from metrics    import MetricsStore, RequestMetrics                  # Messwerte
+from tokens     import count_tokens
+from exchange   import export_messages, import_messages, FILE_FILTER  # Export/Import
+
+# ----------------------------------------------------------------------------
+# Anzeige-Namen im Chat-Verlauf für Benutzer und Assistent:
+# ----------------------------------------------------------------------------
+USER_MODE      = "Du"
+ASSISTANT_MODE = "paule32"
+
+FILTER_DELAY_MS = 150   # Pause beim Tippen, bevor die Session-Liste filtert
 
 # ------------------------------------------------
 # locales an Hand der System-Sprache verwenden ...
@@ -145,90 +182,145 @@ def get_current_date():
     return datetime.datetime.now().strftime("%Y_%m_%d")
 
 # ----------------------------------------------------------------------------
-# item
+# Such-Treffer kommen mit SNIPPET_START/SNIPPET_END markiert aus der Daten-
+# bank - der Text wird für die Anzeige als Rich-Text maskiert, und die Fund-
+# stellen werden hervorgehoben.
 # ----------------------------------------------------------------------------
-class SessionDatabaseListBoxWidget(QWidget):
-    def __init__(self, date_str, time_str , text):
-        super(SessionDatabaseListBoxWidget, self).__init__()
-        self.text = text
-    
-    def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
-            print(f"{self.text}")
+def highlight_snippet(snippet):
+    text = html.escape(snippet)
+    text = text.replace(SNIPPET_START, "<b style='background-color:yellow;'>")
+    text = text.replace(SNIPPET_END, "</b>")
+    return text
 
-class SessionDatabaseListboxItem(QListWidgetItem):
-    def __init__(self, text, listbox, date_str, time_str, extra_data=None):
-        super(SessionDatabaseListboxItem, self).__init__(text)
+# ----------------------------------------------------------------------------
+# das HauptFenster ist unsere Haupt-Anwendung GUI (graphical user interface).
+# ----------------------------------------------------------------------------
+class HauptFenster(QMainWindow):
+    def __init__(self):
+        super().__init__()
         
-        self.extra_data = extra_data
+        # ------------------------------------------------------------------------
+        # hier definieren wir für globale Verwendungs-Zwecke ein paar Objekte ...
+        # ------------------------------------------------------------------------
+        self.listbox_widget      = QListView()
+        self.listbox_widget_left = QListView()
         
-        # -----------------------------------------
-        # ein benutzerdefiniertes Widget erstellen
-        # -----------------------------------------
-        custom_widget = SessionDatabaseListBoxWidget( \
-        f"{date_str}",  \
-        f"{time_str}",  f"{text}")
+        # ------------------------------------------------------------------------
+        # der Chat-Verlauf arbeitet mit Model und Delegate: es werden nur die
+        # sichtbaren Zeilen gezeichnet, und es gibt keine Widgets pro Nachricht.
+        # ------------------------------------------------------------------------
+        self.chat_model    = ChatListModel(self)
+        self.chat_delegate = ChatItemDelegate(self.listbox_widget, { ASSISTANT_MODE })
+        self.chat_delegate.delete_clicked.connect(self.push_button_clicked_itemright)
+        
+        self.listbox_widget.setModel(self.chat_model)
+        self.listbox_widget.setItemDelegate(self.chat_delegate)
+        self.listbox_widget.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.listbox_widget.setResizeMode(QListView.Adjust)
+        self.listbox_widget.setLayoutMode(QListView.Batched)
+        self.listbox_widget.setBatchSize(100)
+        
+        # ------------------------------------------------------------------------
+        # beim Scrollen werden ältere (bzw. neuere) Seiten im Hintergrund nach-
+        # geladen, und Zeilen weit außerhalb des sichtbaren Bereichs verdrängt.
+        # ------------------------------------------------------------------------
+        self.chat_fetching = False
+        self.listbox_widget.verticalScrollBar().valueChanged.connect(self.chat_scrolled)
+        
+        # ------------------------------------------------------------------------
+        # alle Anfragen an OpenAI laufen im Hintergrund, damit die GUI niemals
+        # einfriert. Ergebnisse kommen über Qt-Signale zurück.
+        # ------------------------------------------------------------------------
+        self.executor = RequestExecutor(workers=4, parent=self)
+        self.executor.progress .connect(self.request_progress)
+        self.executor.result   .connect(self.request_result)
+        self.executor.error    .connect(self.request_error)
+        self.executor.cancelled.connect(self.request_cancelled)
         
-        check_box = QCheckBox()
-        check_box.setChecked(False)
-        check_box.setMaximumWidth(15)
+        # job_id => (on_result, on_error) für submit_job
+        self.job_handlers = {}
         
-        push_button = QPushButton("DEL")
-        push_button.setMaximumWidth(50)
-        push_button.clicked.connect(self.push_button_clicked)
+        # ------------------------------------------------------------------------
+        # laufende Antwort-Streams (job_id => Renderer), damit diese nicht vom
+        # Garbage-Collector entfernt werden, solange sie noch arbeiten.
+        # ------------------------------------------------------------------------
+        self.active_streams   = {}
+        self.last_first_token = None
+        
+        # ------------------------------------------------------------------------
+        # (assistant_id, thread_id) des Assistenten - gespeichert in der Daten-
+        # bank, und beim Start von prepare_assistant geholt.
+        # ------------------------------------------------------------------------
+        self.assistant_ids = None
         
-        date_label  = QLabel(f"{date_str}" + "  " + f"{time_str}")
-        name_label  = QLabel(text)
-        name_label.setStyleSheet("font-weight:bold;")
+        # ------------------------------------------------------------------------
+        # gleiche Anfragen werden aus dem Cache (in der Datenbank) beantwortet.
+        # ------------------------------------------------------------------------
+        self.completion_cache = CompletionCache(conn, evict_now=False)
         
+        # ------------------------------------------------------------------------
+        # ähnliche Fragen (config.ini: [semantic]) - wird in finish_startup an-
+        # gelegt, damit numpy den Start nicht aufhält.
+        # ------------------------------------------------------------------------
+        self.semantic_cache = None
         
-        custom_layout_0 = QVBoxLayout(custom_widget)
-        custom_layout_1 = QHBoxLayout()
-        custom_layout_2 = QHBoxLayout()
+        # ------------------------------------------------------------------------
+        # die aktuelle Session (id in der Tabelle "session"), in der die Chat-
+        # Nachrichten gespeichert werden.
+        # ------------------------------------------------------------------------
+        self.current_session_id = None
         
-        custom_layout_1.addWidget(check_box)
-        custom_layout_1.addWidget(date_label)
-        custom_layout_1.addWidget(push_button)
+        # ------------------------------------------------------------------------
+        # alle Session-Namen im Speicher (catalog.py) - für die Prüfung auf
+        # doppelte Namen und den Filter der Session-Liste. Er wird nach dem
+        # ersten Zeichnen im Hintergrund geladen; bis dahin fragen wir die
+        # Datenbank.
+        # ------------------------------------------------------------------------
+        self.session_catalog = None
+        self.catalog_dirty   = False   # Sessions geändert, während er lädt
         
-        custom_layout_2.addWidget(name_label)
+        # ------------------------------------------------------------------------
+        # Token-Budget für den gesendeten Verlauf (config.ini: [context]), und
+        # Sessions, deren ältere Nachrichten gerade zusammengefasst werden.
+        # ------------------------------------------------------------------------
+        config = configparser.ConfigParser()
+        config.read('config.ini')
         
-        custom_layout_0.addLayout(custom_layout_1)
-        custom_layout_0.addLayout(custom_layout_2)
+        self.context_budget       = config.getint("context", "budget",
+                                        fallback=CONTEXT_BUDGET)
+        self.compaction_threshold = config.getint("context", "compaction",
+                                        fallback=COMPACTION_THRESHOLD)
+        self.compacting           = set()
+        self.purging              = False
+        self.export_path          = None   # zuletzt exportierte Datei
         
-        self.setSizeHint(custom_widget.sizeHint())
+        self.startup_budget = config.getint("startup", "budget",
+                                  fallback=STARTUP_BUDGET_MS)
         
-        listbox.insertItem(0, self)
-        listbox.setItemWidget(self, custom_widget)
+        # ------------------------------------------------------------------------
+        # Messwerte jeder Anfrage (Tabelle "metrics"), und auf Wunsch regel-
+        # mäßig als Textdatei für den Prometheus node exporter (config.ini:
+        # [metrics] textfile, interval).
+        # ------------------------------------------------------------------------
+        self.metrics          = MetricsStore(conn)
+        self.metrics_textfile = config.get("metrics", "textfile", fallback="")
+        self.metrics_interval = config.getint("metrics", "interval", fallback=60)
         
-        # -----------------------------------------
-        # Signal-Slot-Verbindung für den Button:
-        # -----------------------------------------
-        #self.listbox_widget.itemClicked.connect(self.push_button_clicked)
-    
-    def item_clicked(self, item):
-        print(f"{item.text()}")
-    
-    # ----------------------------------------
-    # item aus der linken ListBox entfernen
-    # ----------------------------------------
-    def push_button_clicked(self):
-        selected_item = self.listbox_widget_left.currentItem()
-        if selected_item is not None:
-            row = self.listbox_widget_left.row(selected_item)
-            self.listbox_widget_left.takeItem(row)
-
-# ----------------------------------------------------------------------------
-# das HauptFenster ist unsere Haupt-Anwendung GUI (graphical user interface).
-# ----------------------------------------------------------------------------
-class HauptFenster(QMainWindow):
-    def __init__(self):
-        super().__init__()
+        # ------------------------------------------------------------------------
+        # Rate-Limits (config.ini: [ratelimit]); sie werden danach aus den Ant-
+        # worten des Servers nachgestellt.
+        # ------------------------------------------------------------------------
+        scheduler.configure(
+            rpm           = config.getint  ("ratelimit", "rpm", fallback=None),
+            tpm           = config.getint  ("ratelimit", "tpm", fallback=None),
+            batch_reserve = config.getfloat("ratelimit", "batch_reserve", fallback=None))
         
         # ------------------------------------------------------------------------
-        # hier definieren wir für globale Verwendungs-Zwecke ein paar Objekte ...
+        # Antworten aufbereiten (Code-Farben, Tabellen, Links; config.ini:
+        # [postprocess]) - lange Antworten in einem Pool von Prozessen.
         # ------------------------------------------------------------------------
-        self.listbox_widget      = QListWidget()
-        self.listbox_widget_left = QListWidget()
+        self.postprocessor = postprocessor_from_config(config)
+        self.chat_delegate.postprocessor = self.postprocessor
         
         self.initUI()
         
@@ -258,21 +350,6 @@ class HauptFenster(QMainWindow):
         menu_edit = menubar.addMenu(_("\05\02\01\02"))
         menu_help = menubar.addMenu(_("\05\02\01\03"))
         
-        # ----------------------------------------
-        # Menü-Aktionen hinzufügen ...
-        # ----------------------------------------
-        menu_file_new    = QWidgetAction(menu_file)
-        menu_file.addSeparator()
-        menu_file_open   = QWidgetAction(menu_file)
-        menu_file_save   = QWidgetAction(menu_file)
-        menu_file_saveas = QWidgetAction(menu_file)
-        menu_file.addSeparator()
-        menu_file_exit   = QWidgetAction(menu_file)
-        menu_file.setStyleSheet(_("\05\01\01"))
-        
-        menu_help_about  = QWidgetAction(menu_help)
-        menu_help.setStyleSheet(_("\05\01\01"))
-        
         menu_font = menu_file.font()
         menu_font.setPointSize(11)
         
@@ -280,127 +357,18 @@ class HauptFenster(QMainWindow):
         menu_edit.setFont(menu_font)
         menu_help.setFont(menu_font)
         
-        ltxt  = _("\05\01\02")
-        ltxt += _("\05\01\03")
-        
-        l_1 = QLabel(_("\05\02\01")); l_1.setStyleSheet(ltxt); l_1.setMinimumWidth(160)
-        l_2 = QLabel(_("\05\02\02")); l_2.setStyleSheet(ltxt); l_2.setMinimumWidth(160)
-        l_3 = QLabel(_("\05\02\03")); l_3.setStyleSheet(ltxt); l_3.setMinimumWidth(160)
-        l_4 = QLabel(_("\05\02\04")); l_4.setStyleSheet(ltxt); l_4.setMinimumWidth(160)
-        l_5 = QLabel(_("\05\02\05")); l_5.setStyleSheet(ltxt); l_5.setMinimumWidth(160)
-        
-        c_1_1 = QLabel("Ctrl-N")
-        c_1_1.setFont(menu_font)
-        c_1_1.setStyleSheet(_("\01\01"))
-        c_1_1.setMinimumWidth(100)
-        icon_1_1 = QWidget()
-        icon_1_1.setFixedWidth(26)
-        icon_1_1.setContentsMargins(0,0,0,0)
-        w_1_1 = QWidget()
-        l_1_1 = QHBoxLayout(w_1_1)
-        l_1_1.setContentsMargins(0,0,0,0)
-        l_1_1.addWidget(icon_1_1)
-        l_1_1.addWidget(l_1)
-        l_1_1.addWidget(c_1_1)
-        w_1_1.setLayout(l_1_1)
-        
-        c_1_2 = QLabel("Ctrl-O")
-        c_1_2.setFont(menu_font)
-        c_1_2.setStyleSheet(_("\01\01"))
-        c_1_2.setMinimumWidth(100)
-        icon_1_2 = QWidget()
-        icon_1_2.setFixedWidth(26)
-        icon_1_2.setContentsMargins(0,0,0,0)
-        w_1_2 = QWidget()
-        l_1_2 = QHBoxLayout(w_1_2)
-        l_1_2.setContentsMargins(0,0,0,0)
-        l_1_2.addWidget(icon_1_2)
-        l_1_2.addWidget(l_2)
-        l_1_2.addWidget(c_1_2)
-        w_1_2.setLayout(l_1_2)
-        
-        c_1_3 = QLabel("Ctrl-S")
-        c_1_3.setFont(menu_font)
-        c_1_3.setStyleSheet(_("\01\01"))
-        c_1_3.setMinimumWidth(100)
-        icon_1_3 = QWidget()
-        icon_1_3.setFixedWidth(26)
-        icon_1_3.setContentsMargins(0,0,0,0)
-        w_1_3 = QWidget()
-        l_1_3 = QHBoxLayout(w_1_3)
-        l_1_3.setContentsMargins(0,0,0,0)
-        l_1_3.addWidget(icon_1_3)
-        l_1_3.addWidget(l_3)
-        l_1_3.addWidget(c_1_3)
-        w_1_3.setLayout(l_1_3)
-        
-        icon_1_4 = QWidget()
-        icon_1_4.setFixedWidth(26)
-        icon_1_4.setContentsMargins(0,0,0,0)
-        w_1_4 = QWidget()
-        l_1_4 = QHBoxLayout(w_1_4)
-        l_1_4.setContentsMargins(0,0,0,0)
-        l_1_4.addWidget(icon_1_4)
-        l_1_4.addWidget(l_4)
-        w_1_4.setLayout(l_1_4)
-        
-        icon_1_5 = QWidget()
-        icon_1_5.setContentsMargins(0,0,0,0)
-        icon_1_5.setFixedWidth(26)
-        icon_1_5.setStyleSheet(_("\05\01\04"))
-        w_1_5 = QWidget()
-        l_1_5 = QHBoxLayout(w_1_5)
-        l_1_5.setContentsMargins(0,0,0,0)
-        w_1_5.setContentsMargins(0,0,0,0)
-        l_1_5.addWidget(icon_1_5)
-        l_1_5.addWidget(l_5)
-        w_1_5.setLayout(l_1_5)
-        
-        menu_file_new   .setDefaultWidget(w_1_1)
-        menu_file_open  .setDefaultWidget(w_1_2)
-        menu_file_save  .setDefaultWidget(w_1_3)
-        menu_file_saveas.setDefaultWidget(w_1_4)
-        menu_file_exit  .setDefaultWidget(w_1_5)
-        
-        #
-        l_2_3 = QLabel(_("\05\03\01")); l_2_3.setStyleSheet(ltxt); l_2_3.setMinimumWidth(160)
-        
-        icon_2_1 = QWidget()
-        icon_2_1.setContentsMargins(0,0,0,0)
-        icon_2_1.setFixedWidth(26)
-        icon_2_1.setStyleSheet(_("\05\01\04"))
-        w_2_1 = QWidget()
-        l_2_1 = QHBoxLayout(w_2_1)
-        l_2_1.setContentsMargins(0,0,0,0)
-        w_2_1.setContentsMargins(0,0,0,0)
-        l_2_1.addWidget(icon_2_1)
-        l_2_1.addWidget(l_2_3)
-        w_2_1.setLayout(l_2_1)
-        
-        menu_help_about .setDefaultWidget(w_2_1)
-        
-        
-        # ----------------------------------------
-        # Menü-Aktionen-Event (mausklick)
-        # ----------------------------------------
-        menu_file_new   .triggered.connect(self.menu_file_clicked_new)
-        menu_file_open  .triggered.connect(self.menu_file_clicked_open)
-        menu_file_save  .triggered.connect(self.menu_file_clicked_save)
-        menu_file_saveas.triggered.connect(self.menu_file_clicked_saveas)
-        menu_file_exit  .triggered.connect(self.menu_file_clicked_exit)
-        
-        menu_help_about .triggered.connect(self.menu_help_clicked_about)
-        
         # ----------------------------------------
-        # Menü darstellen, und Aktion schalten:
+        # die Menü-Einträge bestehen aus vielen
+        # kleinen Widgets - sie werden erst beim
+        # ersten Aufklappen erzeugt, damit das
+        # Fenster schneller erscheint.
         # ----------------------------------------
-        menu_file.addAction(menu_file_new)
-        menu_file.addAction(menu_file_open)
-        menu_file.addAction(menu_file_save)
-        menu_file.addAction(menu_file_saveas)
-        menu_file.addAction(menu_file_exit)
+        self.menu_file  = menu_file
+        self.menu_help  = menu_help
+        self.menu_built = False
         
-        menu_help.addAction(menu_help_about)
+        menu_file.aboutToShow.connect(self.build_menus)
+        menu_help.aboutToShow.connect(self.build_menus)
         
         # ----------------------------------------
         # eine ToolBar unter dem Menubalken:
@@ -422,6 +390,9 @@ class HauptFenster(QMainWindow):
         self.status_label = QLabel()
         self.statusBar().addWidget(self.status_label)
         
+        self.metrics_label = QLabel()
+        self.statusBar().addPermanentWidget(self.metrics_label)
+        
         # ----------------------------------------
         # eine Status-Zeile am Fuß des Formulars:
         # ----------------------------------------
@@ -460,6 +431,8 @@ class HauptFenster(QMainWindow):
         checkbox_header.addWidget(button_chat_part_save)
         checkbox_header.addWidget(button_chat_part_delete)
         
+        button_chat_part_delete.clicked.connect(self.delete_checked_messages)
+        
         central_layout.addLayout(checkbox_header)
         
         # ------------------------------------------
@@ -476,19 +449,9 @@ class HauptFenster(QMainWindow):
         vbox_right_container_main = QVBoxLayout()
         
         # ----------------------------------------
-        # Debug
-        # ----------------------------------------
-        text1 = "Zeile 1\nZeile 2\nZeile 3"
-        text2 = "Text für Item 2\nMit mehreren Zeilen"
-        text3 = "Einzeiliger Text"
-        
-        text_label_array = [text1,text2,text3]
-        
-        for element in text_label_array:
-            self.add_chat_item(element,"Du")
-        
-        # ----------------------------------------
-        # hier geht es normal weiter ...
+        # hier geht es normal weiter ... (keine
+        # Beispiel-Zeilen im Chat: alles, was dort
+        # steht, geht als Verlauf an den Server)
         # ----------------------------------------
         send_layout_0 = QHBoxLayout()
         send_layout_0.setAlignment(Qt.AlignLeft)
@@ -501,6 +464,7 @@ class HauptFenster(QMainWindow):
         
         send_layout_1_label = QLabel("Temperatur:")
         send_layout_1_spin1 = QSpinBox()
+        self.spin_temperature = send_layout_1_spin1
         
         send_layout_1_label.setMaximumWidth(100)
         send_layout_1_label.setMinimumWidth(100)
@@ -508,6 +472,11 @@ class HauptFenster(QMainWindow):
         send_layout_1_spin1.setMaximumWidth(80)
         send_layout_1_spin1.setMinimumWidth(80)
         
+        # Temperatur in Zehntel: 7 => 0.7
+        send_layout_1_spin1.setMaximum(20)
+        send_layout_1_spin1.setMinimum(0)
+        send_layout_1_spin1.setValue  (7)
+        
         send_layout_1.addWidget(send_layout_1_label)
         send_layout_1.addWidget(send_layout_1_spin1)
         # ----------------------------------------
@@ -516,6 +485,7 @@ class HauptFenster(QMainWindow):
         
         send_layout_2_label = QLabel("Top-D:")
         send_layout_2_spin2 = QSpinBox()
+        self.spin_top_p = send_layout_2_spin2
         
         send_layout_2_label.setMaximumWidth(100)
         send_layout_2_label.setMinimumWidth(100)
@@ -523,6 +493,11 @@ class HauptFenster(QMainWindow):
         send_layout_2_spin2.setMaximumWidth(80)
         send_layout_2_spin2.setMinimumWidth(80)
         
+        # Top-P in Zehntel: 10 => 1.0
+        send_layout_2_spin2.setMaximum(10)
+        send_layout_2_spin2.setMinimum(0)
+        send_layout_2_spin2.setValue  (10)
+        
         send_layout_2.addWidget(send_layout_2_label)
         send_layout_2.addWidget(send_layout_2_spin2)
         # ----------------------------------------
@@ -531,6 +506,7 @@ class HauptFenster(QMainWindow):
         
         send_layout_3_label = QLabel("Max-Token:")
         send_layout_3_spin3 = QSpinBox()
+        self.spin_max_tokens = send_layout_3_spin3
         
         send_layout_3_label.setMaximumWidth(100)
         send_layout_3_label.setMinimumWidth(100)
@@ -546,9 +522,29 @@ class HauptFenster(QMainWindow):
         send_layout_3.addWidget(send_layout_3_spin3)
         # ----------------------------------------
         
+        send_layout_4 = QVBoxLayout()
+        send_layout_4.setAlignment(Qt.AlignLeft)
+        
+        # je Anfrage: Antwort nicht aus dem Cache holen
+        # (der Cache gilt nur bei Temperatur 0)
+        self.checkbox_cache_bypass = QCheckBox("Cache umgehen")
+        self.checkbox_cache_bypass.setToolTip(
+            "Der Cache wird nur bei Temperatur 0 benutzt.")
+        
+        # Fragen im Thread des Assistenten stellen
+        # (sobald dieser bereit ist)
+        self.checkbox_assistant = QCheckBox("Assistent (Thread)")
+        self.checkbox_assistant.setEnabled(False)
+        
+        send_layout_4.addWidget(QLabel("Cache:"))
+        send_layout_4.addWidget(self.checkbox_cache_bypass)
+        send_layout_4.addWidget(self.checkbox_assistant)
+        # ----------------------------------------
+        
         send_layout_0.addLayout(send_layout_1)
         send_layout_0.addLayout(send_layout_2)
         send_layout_0.addLayout(send_layout_3)
+        send_layout_0.addLayout(send_layout_4)
         
         # ----------------------------------------
         # chat-Eingabe Komponenten ...
@@ -612,13 +608,50 @@ class HauptFenster(QMainWindow):
         # ----------------------------------------
         vbox_left = QVBoxLayout()
         
-        self.listbox_widget_left = QListWidget()
+        # ----------------------------------------
+        # die Session-Liste lädt beim Start nur
+        # die erste Seite aus der Datenbank, den
+        # Rest beim Scrollen (fetchMore).
+        # ----------------------------------------
+        self.session_model    = SessionListModel(conn, parent=self)
+        self.session_delegate = SessionItemDelegate(self.listbox_widget_left)
+        self.session_delegate.delete_clicked.connect(self.push_button_clicked_itemleft)
+        
+        self.listbox_widget_left.setModel(self.session_model)
+        self.listbox_widget_left.setItemDelegate(self.session_delegate)
+        self.listbox_widget_left.setUniformItemSizes(True)
         self.listbox_widget_left.setMaximumWidth(260)
         self.listbox_widget_left.setMinimumWidth(260)
+        self.listbox_widget_left.clicked.connect(self.open_session)
         
         
-        entryfield_left = QLineEdit(central_widget)
-        entryfield_left.setMaximumWidth(260)
+        self.entryfield_left = QLineEdit(central_widget)
+        self.entryfield_left.setMaximumWidth(260)
+        self.entryfield_left.setPlaceholderText("Filtern... (Enter: Volltext)")
+        self.entryfield_left.returnPressed.connect(self.search_history)
+        
+        # ----------------------------------------
+        # beim Tippen werden die Sessions nach dem
+        # Anfang des Namens gefiltert - erst, wenn
+        # FILTER_DELAY_MS lang nichts mehr getippt
+        # wurde.
+        # ----------------------------------------
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.filter_sessions)
+        self.entryfield_left.textChanged.connect(lambda text: self.filter_timer.start())
+        
+        # ----------------------------------------
+        # Treffer der Volltext-Suche werden an der
+        # Stelle der Session-Liste angezeigt.
+        # ----------------------------------------
+        self.listbox_search_left = QListWidget()
+        self.listbox_search_left.setMaximumWidth(260)
+        self.listbox_search_left.setMinimumWidth(260)
+        self.listbox_search_left.setWordWrap(True)
+        self.listbox_search_left.itemClicked.connect(self.search_result_clicked)
+        self.listbox_search_left.hide()
         
         label_left = QLabel("Chat-Verlauf / Archive:")
         
@@ -633,14 +666,17 @@ class HauptFenster(QMainWindow):
         hbox_left.addWidget(button2)
         hbox_left.addWidget(button3)
         
+        button3.clicked.connect(self.delete_checked_sessions)
+        
         vbox_left_2 = QVBoxLayout()
         button4 = QPushButton("Neu")
         
         vbox_left_2.addWidget(button4)
        
         vbox_left.addWidget(self.listbox_widget_left)
+        vbox_left.addWidget(self.listbox_search_left)
         vbox_left.addWidget(label_left)
-        vbox_left.addWidget(entryfield_left)
+        vbox_left.addWidget(self.entryfield_left)
         vbox_left.addLayout(hbox_left)
         vbox_left.addLayout(vbox_left_2)
         
@@ -669,96 +705,954 @@ class HauptFenster(QMainWindow):
         #   Anwendungen übernommen werden - Danke !
         # - öffnen der Anwendung (starten der GUI)
         # --------------------------------------------------------
+        # --------------------------------------------------------
+        # mit ESC werden alle laufenden Anfragen abgebrochen.
+        # --------------------------------------------------------
+        QShortcut(QKeySequence(Qt.Key_Escape), self, self.executor.cancel_all)
+        
         self.setGeometry(50,50,800,600)
         self.setWindowTitle("ChatGPT Toying Application (c) 2023 by paule32")
         self.show()
     
-    def push_button_clicked(self,item):
-        button = item.data(Qt.UserRole)
-        if button is not None:
-            self.push_button_clicked_itemleft(button)
-    
-    # ----------------------------------------
-    # item aus der rechten ListBox entfernen
-    # ----------------------------------------
-    def push_button_clicked_itemright(self):
-        print("links")
-    
     # ----------------------------------------
-    # Text an OpenAI und Chat-Fenster senden:
+    # Menü "Datei" und "Hilfe" aufbauen (wird
+    # beim ersten Aufklappen aufgerufen) ...
     # ----------------------------------------
-    def send_to_chat_clicked(self):
-        user_text = self.entryfield_right.toPlainText()
-        self.entryfield_right.setText("")
-        self.add_chat_item(f"{user_text}","Du")
-
-    def menu_help_clicked_about(self):
-        QMessageBox.information(self,
-        'Über diese Anwendung',
-        'ChatGPT Tool 1.0\n\n(c) 2023 by Jens Kallup - paule32\nAll rights reserved.')
-        return
-
-    # -----------------------------------------
-    # ein benutzerdefiniertes Widget erstellen
-    # - zuerst prüfen, ob Text vorhandne ist:
-    # -----------------------------------------
-    def add_chat_item(self,text,mode):
-        if not text.strip():
-            self.entryfield_right.setText("")
-            self.entryfield_right.setFocus()
+    def build_menus(self):
+        if self.menu_built:
             return
+        self.menu_built = True
         
-        item = QListWidgetItem()
-        
-        custom_widget = QWidget()
-        
-        check_box = QCheckBox()
-        check_box.setChecked(False)
-        check_box.setMaximumWidth(15)
-        
-        push_button = QPushButton("DEL")
-        push_button.setMaximumWidth(50)
-        push_button.clicked.connect(self.push_button_clicked_itemright)
-        
-        custom_layout_0 = QVBoxLayout(custom_widget)
-        custom_layout_3 = QVBoxLayout()
-        custom_layout_1 = QHBoxLayout()
-        custom_layout_2 = QVBoxLayout()
+        menu_file = self.menu_file
+        menu_help = self.menu_help
         
         # ----------------------------------------
-        # header (Datum)
+        # Menü-Aktionen hinzufügen ...
         # ----------------------------------------
-        date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-        time_str = datetime.datetime.now().strftime("%H:%M:%S")
+        menu_file_new    = QWidgetAction(menu_file)
+        menu_file.addSeparator()
+        menu_file_open   = QWidgetAction(menu_file)
+        menu_file_save   = QWidgetAction(menu_file)
+        menu_file_saveas = QWidgetAction(menu_file)
+        menu_file.addSeparator()
+        menu_file_exit   = QWidgetAction(menu_file)
+        menu_file.setStyleSheet(_("\05\01\01"))
         
-        custom_label = QLabel()
-        custom_date  = f"{date_str}&nbsp;&nbsp;&nbsp;<span style='font-style:italic;'>{time_str}</span>"
-        custom_text  = "" \
-            + "<span style='font-weight:bold;'>" + f"{mode}&nbsp;&nbsp;&nbsp;" + "</span>" \
-            + "<span style='color:green;'>"      + f"{custom_date}" + "</span>"
+        menu_help_about  = QWidgetAction(menu_help)
+        menu_help.setStyleSheet(_("\05\01\01"))
+        
+        menu_font = menu_file.font()
+        
+        ltxt  = _("\05\01\02")
+        ltxt += _("\05\01\03")
+        
+        l_1 = QLabel(_("\05\02\01")); l_1.setStyleSheet(ltxt); l_1.setMinimumWidth(160)
+        l_2 = QLabel(_("\05\02\02")); l_2.setStyleSheet(ltxt); l_2.setMinimumWidth(160)
+        l_3 = QLabel(_("\05\02\03")); l_3.setStyleSheet(ltxt); l_3.setMinimumWidth(160)
+        l_4 = QLabel(_("\05\02\04")); l_4.setStyleSheet(ltxt); l_4.setMinimumWidth(160)
+        l_5 = QLabel(_("\05\02\05")); l_5.setStyleSheet(ltxt); l_5.setMinimumWidth(160)
+        
+        c_1_1 = QLabel("Ctrl-N")
+        c_1_1.setFont(menu_font)
+        c_1_1.setStyleSheet(_("\01\01"))
+        c_1_1.setMinimumWidth(100)
+        icon_1_1 = QWidget()
+        icon_1_1.setFixedWidth(26)
+        icon_1_1.setContentsMargins(0,0,0,0)
+        w_1_1 = QWidget()
+        l_1_1 = QHBoxLayout(w_1_1)
+        l_1_1.setContentsMargins(0,0,0,0)
+        l_1_1.addWidget(icon_1_1)
+        l_1_1.addWidget(l_1)
+        l_1_1.addWidget(c_1_1)
+        w_1_1.setLayout(l_1_1)
+        
+        c_1_2 = QLabel("Ctrl-O")
+        c_1_2.setFont(menu_font)
+        c_1_2.setStyleSheet(_("\01\01"))
+        c_1_2.setMinimumWidth(100)
+        icon_1_2 = QWidget()
+        icon_1_2.setFixedWidth(26)
+        icon_1_2.setContentsMargins(0,0,0,0)
+        w_1_2 = QWidget()
+        l_1_2 = QHBoxLayout(w_1_2)
+        l_1_2.setContentsMargins(0,0,0,0)
+        l_1_2.addWidget(icon_1_2)
+        l_1_2.addWidget(l_2)
+        l_1_2.addWidget(c_1_2)
+        w_1_2.setLayout(l_1_2)
+        
+        c_1_3 = QLabel("Ctrl-S")
+        c_1_3.setFont(menu_font)
+        c_1_3.setStyleSheet(_("\01\01"))
+        c_1_3.setMinimumWidth(100)
+        icon_1_3 = QWidget()
+        icon_1_3.setFixedWidth(26)
+        icon_1_3.setContentsMargins(0,0,0,0)
+        w_1_3 = QWidget()
+        l_1_3 = QHBoxLayout(w_1_3)
+        l_1_3.setContentsMargins(0,0,0,0)
+        l_1_3.addWidget(icon_1_3)
+        l_1_3.addWidget(l_3)
+        l_1_3.addWidget(c_1_3)
+        w_1_3.setLayout(l_1_3)
+        
+        icon_1_4 = QWidget()
+        icon_1_4.setFixedWidth(26)
+        icon_1_4.setContentsMargins(0,0,0,0)
+        w_1_4 = QWidget()
+        l_1_4 = QHBoxLayout(w_1_4)
+        l_1_4.setContentsMargins(0,0,0,0)
+        l_1_4.addWidget(icon_1_4)
+        l_1_4.addWidget(l_4)
+        w_1_4.setLayout(l_1_4)
+        
+        icon_1_5 = QWidget()
+        icon_1_5.setContentsMargins(0,0,0,0)
+        icon_1_5.setFixedWidth(26)
+        icon_1_5.setStyleSheet(_("\05\01\04"))
+        w_1_5 = QWidget()
+        l_1_5 = QHBoxLayout(w_1_5)
+        l_1_5.setContentsMargins(0,0,0,0)
+        w_1_5.setContentsMargins(0,0,0,0)
+        l_1_5.addWidget(icon_1_5)
+        l_1_5.addWidget(l_5)
+        w_1_5.setLayout(l_1_5)
+        
+        menu_file_new   .setDefaultWidget(w_1_1)
+        menu_file_open  .setDefaultWidget(w_1_2)
+        menu_file_save  .setDefaultWidget(w_1_3)
+        menu_file_saveas.setDefaultWidget(w_1_4)
+        menu_file_exit  .setDefaultWidget(w_1_5)
+        
+        #
+        l_2_3 = QLabel(_("\05\03\01")); l_2_3.setStyleSheet(ltxt); l_2_3.setMinimumWidth(160)
+        
+        icon_2_1 = QWidget()
+        icon_2_1.setContentsMargins(0,0,0,0)
+        icon_2_1.setFixedWidth(26)
+        icon_2_1.setStyleSheet(_("\05\01\04"))
+        w_2_1 = QWidget()
+        l_2_1 = QHBoxLayout(w_2_1)
+        l_2_1.setContentsMargins(0,0,0,0)
+        w_2_1.setContentsMargins(0,0,0,0)
+        l_2_1.addWidget(icon_2_1)
+        l_2_1.addWidget(l_2_3)
+        w_2_1.setLayout(l_2_1)
+        
+        menu_help_about .setDefaultWidget(w_2_1)
+        
+        
+        # ----------------------------------------
+        # Menü-Aktionen-Event (mausklick)
+        # ----------------------------------------
+        menu_file_new   .triggered.connect(self.menu_file_clicked_new)
+        menu_file_open  .triggered.connect(self.menu_file_clicked_open)
+        menu_file_save  .triggered.connect(self.menu_file_clicked_save)
+        menu_file_saveas.triggered.connect(self.menu_file_clicked_saveas)
+        menu_file_exit  .triggered.connect(self.menu_file_clicked_exit)
+        
+        menu_help_about .triggered.connect(self.menu_help_clicked_about)
+        
+        # ----------------------------------------
+        # Menü darstellen, und Aktion schalten:
+        # ----------------------------------------
+        menu_file.addAction(menu_file_new)
+        menu_file.addAction(menu_file_open)
+        menu_file.addAction(menu_file_save)
+        menu_file.addAction(menu_file_saveas)
+        menu_file.addAction(menu_file_exit)
+        
+        menu_help.addAction(menu_help_about)
+    
+    # ----------------------------------------
+    # item aus der linken ListBox entfernen
+    # ----------------------------------------
+    def push_button_clicked_itemleft(self,row):
+        session_id = self.session_model.sessions[row].session_id
+        delete_sessions(conn, [session_id])
+        self.session_model.remove_row(row)
+        self.catalog_changed(removed=[session_id])
+        
+        if session_id == self.current_session_id:
+            self.current_session_id = None
+            self.chat_model.set_messages([])
+        self.schedule_purge()
+    
+    # ----------------------------------------
+    # item aus der rechten ListBox entfernen
+    # ----------------------------------------
+    def push_button_clicked_itemright(self,row):
+        msg_id = self.chat_model.messages[row].msg_id
+        if msg_id is not None:
+            delete_messages(conn, [msg_id])
+        self.chat_model.remove_row(row)
+        self.schedule_purge()
+    
+    # ----------------------------------------
+    # alle markierten Nachrichten löschen. Ist
+    # "Alles auswählen" gesetzt, wird die ge-
+    # samte Session (ohne die abgewählten Ein-
+    # träge) in einer Transaktion gelöscht -
+    # auch die noch nicht geladenen Nachrich-
+    # ten.
+    # ----------------------------------------
+    def delete_checked_messages(self):
+        checks = self.chat_model.checks
+        if not checks.any():
+            return
+        
+        if checks.all and self.current_session_id is not None:
+            delete_messages(conn, session_id=self.current_session_id,
+                except_ids=[message.msg_id for message in checks.toggled
+                    if message.msg_id is not None])
+            removed = self.chat_model.remove_checked()
+        else:
+            # ----------------------------------------
+            # markierte Nachrichten können bereits
+            # verdrängt sein - sie stehen aber noch
+            # in "checks".
+            # ----------------------------------------
+            checked = [] if checks.all else list(checks.toggled)
+            removed = self.chat_model.remove_checked()
+            delete_messages(conn, list({ message.msg_id for message in removed + checked
+                if message.msg_id is not None }))
+        
+        self.checkbox_header_right.setChecked(False)
+        self.status_label.setText(f"{len(removed)} Einträge gelöscht.")
+        self.schedule_purge()
+    
+    # ----------------------------------------
+    # alle markierten Sessions löschen (eine
+    # Transaktion) ...
+    # ----------------------------------------
+    def delete_checked_sessions(self):
+        checks = self.session_model.checks
+        if not checks.any():
+            return
+        
+        # ----------------------------------------
+        # bei aktivem Filter heißt "alle": alle
+        # Sessions, die der Filter zeigt.
+        # ----------------------------------------
+        if checks.all and self.session_model.prefix is not None:
+            deleted = [ session_id for session_id in self.filtered_session_ids()
+                if session_id not in checks.toggled ]
+            delete_sessions(conn, deleted)
+            removed = self.session_model.remove_checked()
+            self.catalog_changed(removed=deleted)
+        elif checks.all:
+            delete_sessions(conn, except_ids=list(checks.toggled))
+            removed = self.session_model.remove_checked()
+            self.load_catalog()
+        else:
+            removed = self.session_model.remove_checked()
+            delete_sessions(conn, [entry.session_id for entry in removed])
+            self.catalog_changed(removed=[entry.session_id for entry in removed])
+        
+        if self.current_session_id is not None and \
+            not any(entry.session_id == self.current_session_id
+                for entry in self.session_model.sessions):
+            self.current_session_id = None
+            self.chat_model.set_messages([])
+        
+        self.checkbox_header_left.setChecked(False)
+        self.status_label.setText(f"{len(removed)} Sessions gelöscht.")
+        self.schedule_purge()
+    
+    # ----------------------------------------
+    # ids aller Sessions, die der aktive Filter
+    # zeigt: aus dem Katalog der Liste - bzw.,
+    # falls es keinen gibt, aus der Datenbank.
+    # ----------------------------------------
+    def filtered_session_ids(self):
+        prefix  = self.session_model.prefix
+        catalog = self.session_model.catalog
+        if catalog is None:
+            catalog = self.session_catalog
+        if catalog is not None:
+            return catalog.ids(prefix)
+        
+        key = name_key(prefix)
+        return [ session_id for session_id, date_str, time_str, name in live_sessions(conn)
+            if name_key(name).startswith(key) ]
+    
+    # ----------------------------------------
+    # gelöschte Zeilen im Hintergrund endgül-
+    # tig entfernen (mit einer eigenen Daten-
+    # bank-Verbindung) ...
+    # ----------------------------------------
+    def schedule_purge(self):
+        if self.purging:
+            return
+        
+        def run(job):
+            purge_conn = open_database(default_database_path())
+            try:
+                return purge_deleted(purge_conn, cancelled=job.is_cancelled)
+            finally:
+                purge_conn.close()
+        
+        def done(value):
+            self.purging = False
+        
+        self.purging = True
+        self.submit_job(run, "Aufräumen", done, done, LANE_BATCH)
+    
+    # ----------------------------------------
+    # Text an OpenAI und Chat-Fenster senden:
+    # ----------------------------------------
+    def send_to_chat_clicked(self):
+        user_text = self.entryfield_right.toPlainText()
+        self.entryfield_right.setText("")
+        row = self.add_chat_item(f"{user_text}",USER_MODE)
+        if row is None:
+            return
+        
+        if self.checkbox_assistant.isChecked() and self.assistant_ids is not None:
+            self.start_thread_stream(self.chat_model.messages[row])
+            return
+        question = self.chat_model.messages[row]
+        self.start_assistant_stream(self.build_chat_messages(question), question)
+    
+    # ----------------------------------------
+    # den bisherigen Chat-Verlauf (und die neue
+    # Frage) in das Format für chat.completions
+    # .create umwandeln. Der Verlauf kommt aus
+    # der Datenbank - im Chat-Fenster steht
+    # nur ein Ausschnitt davon. Es wird nur so
+    # viel gesendet, wie in das Token-Budget
+    # passt; ältere Nachrichten ersetzt die Zu-
+    # sammenfassung.
+    # ----------------------------------------
+    def build_chat_messages(self, question):
+        summary = None
+        history = []
+        if self.current_session_id is not None:
+            summary = get_summary(conn, self.current_session_id)
+            history = [ (msg_id, role, content, tokens)
+                for msg_id, role, date_str, time_str, content, tokens
+                in latest_messages(conn, self.current_session_id)
+                if summary is None or msg_id > summary[0] ]
+        
+        messages, dropped = fit_messages(SYSTEM_PROMPT,
+            [ (role, content, tokens) for msg_id, role, content, tokens in history ]
+            + [ ("user", question.text, question.token_count()) ],
+            self.context_budget,
+            summary[1] if summary else None)
+        
+        self.schedule_compaction(summary, history[:dropped])
+        return messages
+    
+    # ----------------------------------------
+    # nicht mehr gesendete Nachrichten im Hin-
+    # tergrund zusammenfassen, sobald es genug
+    # davon gibt.
+    # ----------------------------------------
+    def schedule_compaction(self, summary, dropped):
+        session_id = self.current_session_id
+        
+        if session_id is None or session_id in self.compacting or not dropped:
+            return
+        if sum(tokens for msg_id, role, content, tokens in dropped) < self.compaction_threshold:
+            return
+        
+        previous = summary[1] if summary else None
+        history  = [ (role, content, tokens) for msg_id, role, content, tokens in dropped ]
+        upto_id  = max(msg_id for msg_id, role, content, tokens in dropped)
+        
+        metrics = RequestMetrics("summary", DEFAULT_MODEL)
+        
+        def done(text):
+            self.compacting.discard(session_id)
+            save_summary(conn, session_id, upto_id, text)
+            self.record_metrics(metrics)
+        
+        def failed(error):
+            self.compacting.discard(session_id)
+            self.record_metrics(metrics, error=error)
+        
+        self.compacting.add(session_id)
+        self.submit_job(lambda job: summarize(previous, history, metrics, job.is_cancelled),
+            "Zusammenfassung", done, failed, LANE_BATCH)
+    
+    # ----------------------------------------
+    # die Antwort des Assistenten wird in eine
+    # zunächst leere Chat-Nachricht gestreamt.
+    # ----------------------------------------
+    def start_assistant_stream(self, messages, question):
+        temperature = self.spin_temperature.value() / 10
+        top_p       = self.spin_top_p      .value() / 10
+        max_tokens  = self.spin_max_tokens .value()
+        
+        # ----------------------------------------
+        # zuerst im Cache nachsehen (nur bei Tem-
+        # peratur 0, und sofern nicht "Cache um-
+        # gehen" angehakt ist) ...
+        # ----------------------------------------
+        metrics = RequestMetrics("chat", DEFAULT_MODEL)
+        
+        key       = cache_key(DEFAULT_MODEL, messages, temperature, max_tokens, top_p)
+        use_cache = cacheable(temperature)
+        if use_cache and not self.checkbox_cache_bypass.isChecked():
+            cached = self.completion_cache.get(key)
+            status = ("Antwort aus dem Cache "
+                + f"(Trefferquote {self.completion_cache.hit_rate() * 100:.0f}%)")
+            
+            # ----------------------------------------
+            # ... und danach nach einer ähnlichen
+            # Frage (sofern eingeschaltet).
+            # ----------------------------------------
+            if cached is None and self.semantic_cache is not None:
+                found = self.semantic_cache.lookup(DEFAULT_MODEL, messages)
+                if found is not None:
+                    cached, score = found
+                    status = f"Antwort zu einer ähnlichen Frage (Ähnlichkeit {score:.2f})"
             
-        custom_label.setText(f"{custom_text}")
-        custom_layout_3.addWidget(custom_label)
+            if cached:
+                row = self.add_chat_item(cached, ASSISTANT_MODE)
+                if row is not None:
+                    metrics.cache_hit = True
+                    metrics.first()
+                    self.record_metrics(metrics, messages, cached)
+                    
+                    self.save_turn([question, self.chat_model.messages[row]])
+                    self.status_label.setText(status)
+                    return
+        
+        renderer = self.stream_into_chat(lambda cancelled: stream_chat(messages,
+            temperature = temperature,
+            max_tokens  = max_tokens,
+            top_p       = top_p,
+            metrics     = metrics,
+            cancelled   = cancelled), question, metrics, messages)
+        if not use_cache:
+            return
+        
+        renderer.finished.connect(lambda text: self.completion_cache.put(key, DEFAULT_MODEL, text))
+        if self.semantic_cache is not None:
+            renderer.finished.connect(lambda text:
+                self.semantic_cache.put(DEFAULT_MODEL, messages, text))
+    
+    # ----------------------------------------
+    # die Frage im Thread des Assistenten
+    # stellen: gesendet wird nur die Frage -
+    # den Verlauf kennt der Thread. Die Ant-
+    # wort hängt damit vom Thread ab, und
+    # kommt nicht in den Cache.
+    # ----------------------------------------
+    def start_thread_stream(self, question):
+        metrics  = RequestMetrics("assistant-run", ASSISTANT_CONFIG["model"])
+        content  = question.text
+        messages = [{ "role": "user", "content": content }]
         
         # ----------------------------------------
-        # Das Layout-Stretch hinzufügen, um die
-        # QCheckBox nach oben zu drücken
+        # self.assistant_ids gehört dem GUI-Thread:
+        # der Job bekommt eine Kopie, und neu an-
+        # gelegte ids werden erst nach dem Stream
+        # (im GUI-Thread) übernommen.
         # ----------------------------------------
-        custom_layout_2.addWidget(check_box)
-        custom_layout_2.addStretch(0)
+        assistant_ids = self.assistant_ids
+        renewed       = []
+        
+        def chunks(cancelled):
+            assistant_id, thread_id = assistant_ids
+            try:
+                yield from stream_run(thread_id, assistant_id, content, metrics,
+                    cancelled=cancelled)
+            except AssistantNotFoundError:
+                # auf dem Server gelöscht: neu anlegen, und noch einmal ...
+                run_conn = open_database(default_database_path())
+                try:
+                    renewed.append(ensure_assistant(run_conn,
+                        lane=LANE_INTERACTIVE, renew=True))
+                finally:
+                    run_conn.close()
+                assistant_id, thread_id = renewed[-1]
+                yield from stream_run(thread_id, assistant_id, content, metrics,
+                    cancelled=cancelled)
+        
+        def adopt_ids():
+            if renewed:
+                self.assistant_ids = renewed[-1]
+        
+        renderer = self.stream_into_chat(chunks, question, metrics, messages)
+        renderer.finished.connect(lambda text: adopt_ids())
+        renderer.failed  .connect(lambda error: adopt_ids())
+    
+    # ----------------------------------------
+    # die Text-Teile von "chunks" (Generator-
+    # Funktion, läuft im RequestExecutor) in
+    # eine zunächst leere Chat-Nachricht
+    # streamen; danach wird gespeichert.
+    # ----------------------------------------
+    def stream_into_chat(self, chunks, question, metrics, messages):
+        message = ChatMessage("", ASSISTANT_MODE)
+        self.chat_model.add_message(message)
+        self.listbox_widget.scrollToBottom()
+        
+        buffer   = StreamBuffer()
+        renderer = StreamRenderer(self.chat_model, self.chat_delegate, message, buffer, self)
+        
+        job_id = self.executor.submit(stream_job(chunks, buffer), "Antwort", LANE_INTERACTIVE)
+        self.active_streams[job_id] = renderer
+        
+        renderer.first_token.connect(self.stream_first_token)
+        renderer.finished.connect(lambda text: self.stream_done(job_id))
+        renderer.finished.connect(lambda text: self.finish_turn(question, message))
+        renderer.finished.connect(lambda text: self.chat_delegate.postprocess(message))
+        renderer.finished.connect(lambda text: self.record_metrics(metrics, messages, text))
+        renderer.failed  .connect(lambda error: self.stream_done(job_id))
+        renderer.failed  .connect(lambda error: self.record_metrics(metrics, messages,
+            message.text, error))
+        renderer.failed  .connect(lambda error: self.fail_turn(question, message, error))
+        renderer.start()
+        return renderer
+    
+    # ----------------------------------------
+    # fertig gestreamt: eine leere Antwort
+    # (z.B. abgebrochen) wird nicht gespei-
+    # chert, und ihre Zeile verschwindet.
+    # ----------------------------------------
+    def finish_turn(self, question, message):
+        if message.text.strip():
+            self.save_turn([question, message])
+            return
+        
+        self.chat_model.remove_row(self.chat_model.row_of(message))
+        self.save_turn([question])
+    
+    # ----------------------------------------
+    # fehlgeschlagen: die (leere oder halbe)
+    # Antwort wird nicht gespeichert, ihre
+    # Zeile verschwindet, und der Fehler
+    # steht in der Statuszeile.
+    # ----------------------------------------
+    def fail_turn(self, question, message, error):
+        self.chat_model.remove_row(self.chat_model.row_of(message))
+        self.save_turn([question])
+        self.status_label.setText(f"Fehler bei der Antwort: {error}")
+    
+    # ----------------------------------------
+    # die Nachrichten eines Durchgangs (Frage,
+    # und - sofern vorhanden - Antwort) in
+    # einer Transaktion speichern ...
+    # ----------------------------------------
+    def save_turn(self, turn):
+        if self.current_session_id is None:
+            self.current_session_id = self.new_session(
+                f"Chat {get_current_date()} {get_current_time()}")
+        
+        ids = add_turn(conn, self.current_session_id, [
+            ("user" if message.mode == USER_MODE else "assistant",
+             message.date_str, message.time_str, message.text)
+            for message in turn ])
+        
+        for message, msg_id in zip(turn, ids):
+            message.msg_id = msg_id
+    
+    # ----------------------------------------
+    # eine gespeicherte Session öffnen: es wer-
+    # den nur die neuesten Nachrichten geladen.
+    # ----------------------------------------
+    def open_session(self, index):
+        session_id = index.data(SessionIdRole)
+        if session_id is None:
+            return
+        
+        self.load_session(session_id)
+    
+    # ----------------------------------------
+    # Nachrichten einer Session laden: nur die
+    # neueste Seite; ist "around_id" gesetzt,
+    # werden die Nachrichten rund um diese
+    # Nachricht geladen und sie wird markiert.
+    # ----------------------------------------
+    def load_session(self, session_id, around_id=None):
+        if around_id is None:
+            rows = latest_messages(conn, session_id, CHAT_PAGE_SIZE)
+        else:
+            rows = messages_around(conn, session_id, around_id,
+                CHAT_PAGE_SIZE, CHAT_PAGE_SIZE)
+        
+        self.current_session_id = session_id
+        self.chat_model.set_messages([ self.chat_message(row) for row in rows ],
+            has_older = len(rows) >= CHAT_PAGE_SIZE,
+            has_newer = around_id is not None)
+        
+        if around_id is None:
+            self.listbox_widget.scrollToBottom()
+        else:
+            for row, message in enumerate(self.chat_model.messages):
+                if message.msg_id == around_id:
+                    index = self.chat_model.index(row)
+                    self.listbox_widget.setCurrentIndex(index)
+                    self.listbox_widget.scrollTo(index, QAbstractItemView.PositionAtCenter)
+                    break
+        
+        # ----------------------------------------
+        # füllt die erste Seite das Fenster nicht
+        # aus, gibt es kein Scroll-Ereignis ...
+        # ----------------------------------------
+        QTimer.singleShot(0, lambda: self.chat_scrolled(
+            self.listbox_widget.verticalScrollBar().value()))
+    
+    def chat_message(self, row):
+        msg_id, role, date_str, time_str, content, tokens = row
+        return ChatMessage(content, USER_MODE if role == "user" else ASSISTANT_MODE,
+            date_str, time_str, msg_id, tokens)
+    
+    # ----------------------------------------
+    # neue Nachrichten kommen immer ans Ende -
+    # wurde das Ende verdrängt, wird zuerst
+    # wieder die neueste Seite geladen.
+    # ----------------------------------------
+    def show_latest(self):
+        if self.chat_model.has_newer and self.current_session_id is not None:
+            self.load_session(self.current_session_id)
+    
+    # ----------------------------------------
+    # Scrollen im Chat-Verlauf: nahe am oberen
+    # (bzw. unteren) Rand die nächste Seite im
+    # Hintergrund laden ...
+    # ----------------------------------------
+    def chat_scrolled(self, value):
+        bar    = self.listbox_widget.verticalScrollBar()
+        height = self.listbox_widget.viewport().height()
+        
+        if value <= height and self.chat_model.has_older:
+            self.fetch_chat_page(older=True)
+        elif bar.maximum() - value <= height and self.chat_model.has_newer:
+            self.fetch_chat_page(older=False)
+        else:
+            self.evict_chat_rows()
+    
+    def fetch_chat_page(self, older):
+        model      = self.chat_model
+        session_id = self.current_session_id
+        edge_id    = model.first_id() if older else model.last_id()
+        if self.chat_fetching or session_id is None or edge_id is None:
+            return
+        
+        def run(job):
+            page_conn = open_database(default_database_path())
+            try:
+                if older:
+                    return latest_messages(page_conn, session_id, CHAT_PAGE_SIZE, edge_id)
+                return messages_after(page_conn, session_id, edge_id, CHAT_PAGE_SIZE)
+            finally:
+                page_conn.close()
+        
+        def done(rows):
+            self.chat_fetching = False
+            
+            # ----------------------------------------
+            # inzwischen eine andere Session geöffnet,
+            # oder der Rand hat sich verschoben?
+            # ----------------------------------------
+            if session_id != self.current_session_id:
+                return
+            if edge_id != (model.first_id() if older else model.last_id()):
+                return
+            
+            messages = [ self.chat_message(row) for row in rows ]
+            more     = len(rows) >= CHAT_PAGE_SIZE
+            if older:
+                self.keep_scroll_anchor(lambda: model.prepend_messages(messages, more))
+            else:
+                model.append_messages(messages, more)
+            self.evict_chat_rows()
+        
+        def failed(error):
+            self.chat_fetching = False
+        
+        self.chat_fetching = True
+        self.submit_job(run, "Verlauf", done, failed)
+    
+    # ----------------------------------------
+    # Zeilen weit über bzw. unter dem sicht-
+    # baren Bereich verdrängen - so hängt der
+    # Speicherbedarf nur von der Fenster-
+    # Größe ab, nicht von der Länge des Ver-
+    # laufs.
+    # ----------------------------------------
+    def evict_chat_rows(self):
+        model = self.chat_model
+        if len(model.messages) <= CHAT_MAX_ROWS:
+            return
+        
+        view  = self.listbox_widget
+        first = view.indexAt(QPoint(0, 0)).row()
+        last  = view.indexAt(QPoint(0, view.viewport().height() - 1)).row()
+        if first < 0:
+            return
+        if last < 0:
+            last = len(model.messages) - 1
+        
+        if len(model.messages) - 1 - last > CHAT_KEEP_ROWS:
+            model.drop_newer(last + CHAT_KEEP_ROWS + 1)
+        if first > CHAT_KEEP_ROWS:
+            self.keep_scroll_anchor(lambda: model.drop_older(first - CHAT_KEEP_ROWS))
+    
+    # ----------------------------------------
+    # Zeilen oben einfügen bzw. entfernen, ohne
+    # dass der sichtbare Inhalt springt: die
+    # oberste sichtbare Nachricht bleibt an
+    # derselben Stelle.
+    # ----------------------------------------
+    def keep_scroll_anchor(self, change):
+        view   = self.listbox_widget
+        anchor = view.indexAt(QPoint(0, 0))
+        if not anchor.isValid():
+            change()
+            return
+        
+        message = self.chat_model.messages[anchor.row()]
+        offset  = view.visualRect(anchor).top()
+        change()
         
-        label_custom = QLabel(text)
+        row = self.chat_model.row_of(message)
+        if row < 0:
+            return
+        view.scrollTo(self.chat_model.index(row), QAbstractItemView.PositionAtTop)
+        bar = view.verticalScrollBar()
+        bar.setValue(bar.value() - offset)
+    
+    # ----------------------------------------
+    # Volltext-Suche über den gesamten Chat-
+    # Verlauf (Enter im Suchfeld). Ein leeres
+    # Suchfeld zeigt wieder die Sessions an.
+    # ----------------------------------------
+    def search_history(self):
+        text = self.entryfield_left.text().strip()
+        
+        self.listbox_search_left.clear()
+        if not text:
+            self.listbox_search_left.hide()
+            self.listbox_widget_left.show()
+            return
+        
+        results = search_messages(conn, text)
+        for msg_id, session_id, name, date_str, time_str, snippet in results:
+            label = QLabel(
+                  "<span style='font-weight:bold;'>" + html.escape(f"{name}") + "</span>"
+                + "&nbsp;&nbsp;<span style='color:green;'>" + f"{date_str} {time_str}" + "</span><br>"
+                + highlight_snippet(snippet))
+            label.setWordWrap(True)
+            
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, (session_id, msg_id))
+            item.setSizeHint(label.sizeHint())
+            
+            self.listbox_search_left.addItem(item)
+            self.listbox_search_left.setItemWidget(item, label)
+        
+        self.listbox_widget_left.hide()
+        self.listbox_search_left.show()
+        self.status_label.setText(f"{len(results)} Treffer für: {text}")
+    
+    def search_result_clicked(self, item):
+        session_id, msg_id = item.data(Qt.UserRole)
+        self.load_session(session_id, msg_id)
+    
+    def stream_first_token(self, seconds):
+        self.last_first_token = f"erste Antwort nach {seconds * 1000:.0f} ms"
+        self.status_label.setText(self.last_first_token)
+    
+    def stream_done(self, job_id):
+        renderer = self.active_streams.pop(job_id, None)
+        if renderer is not None:
+            renderer.deleteLater()
+    
+    # ----------------------------------------
+    # Rückmeldungen vom RequestExecutor ...
+    # ----------------------------------------
+    def request_progress(self, pending, running):
+        if pending == 0 and running == 0:
+            self.status_label.setText(f"bereit. ({self.last_first_token})"
+                if self.last_first_token else "bereit.")
+        else:
+            self.status_label.setText(f"Anfragen: {running} laufend, {pending} wartend")
+    
+    def request_result(self, job_id, value):
+        on_result, on_error = self.job_handlers.pop(job_id, (None, None))
+        if on_result is not None:
+            on_result(value)
+    
+    def request_error(self, job_id, error):
+        on_result, on_error = self.job_handlers.pop(job_id, (None, None))
+        if on_error is not None:
+            on_error(error)
+        self.statusBar().showMessage(_("\05\02\02\05") + f"{error}")
+    
+    def request_cancelled(self, job_id):
+        on_result, on_error = self.job_handlers.pop(job_id, (None, None))
+        if on_error is not None:
+            on_error("abgebrochen")
+        renderer = self.active_streams.get(job_id)
+        if renderer is not None:
+            renderer.buffer.finish("abgebrochen")
+        self.statusBar().showMessage("Anfrage abgebrochen.")
+    
+    # ----------------------------------------
+    # Assistent und Thread im Hintergrund
+    # holen: aus der Datenbank, bzw. beim
+    # ersten Mal (oder nach Änderung von
+    # ASSISTANT_CONFIG) auf dem Server an-
+    # legen. Die Anweisungen landen in der
+    # Konsole, wie bisher.
+    # ----------------------------------------
+    def prepare_assistant(self):
+        assistant_metrics = RequestMetrics("assistant", ASSISTANT_CONFIG["model"])
+        thread_metrics    = RequestMetrics("thread")
+        
+        def run(job):
+            assistant_conn = open_database(default_database_path())
+            try:
+                return ensure_assistant(assistant_conn,
+                    metrics        = assistant_metrics,
+                    thread_metrics = thread_metrics,
+                    lane           = LANE_BATCH)
+            finally:
+                assistant_conn.close()
+        
+        def done(value):
+            if assistant_metrics.started is not None:
+                self.record_metrics(assistant_metrics)
+                self.record_metrics(thread_metrics)
+            self.assistant_ids = value
+            self.checkbox_assistant.setEnabled(True)
+            print("paule32: " + ASSISTANT_CONFIG["instructions"])
+        
+        def failed(error):
+            if assistant_metrics.started is not None:
+                self.record_metrics(assistant_metrics, error=error)
+        
+        self.submit_job(run, "Assistent", done, failed, LANE_BATCH)
+    
+    # ----------------------------------------
+    # Messwerte einer Anfrage speichern, und
+    # die Übersicht in der Status-Zeile neu
+    # anzeigen. Fehlen die Token-Zahlen vom
+    # Server, werden sie geschätzt.
+    # ----------------------------------------
+    def record_metrics(self, metrics, messages=None, answer=None, error=None):
+        metrics.finish(error)
+        if metrics.prompt_tokens is None and messages is not None:
+            metrics.prompt_tokens = sum(count_tokens(message["content"])
+                for message in messages)
+        if metrics.completion_tokens is None and answer is not None:
+            metrics.completion_tokens = count_tokens(answer)
+        
+        self.metrics.record(metrics)
+        self.metrics_label.setText(self.metrics.status_text())
+        
+        if metrics.kind == "chat" and error is None and not metrics.cache_hit:
+            self.status_label.setText(
+                  f"Antwort nach {metrics.total():.1f} s "
+                + f"({metrics.completion_tokens} Token, "
+                + f"{metrics.retries} Wiederholungen)")
+    
+    def export_metrics(self):
+        try:
+            self.metrics.export_prometheus(self.metrics_textfile)
+        except OSError as ex:
+            self.statusBar().showMessage(f"Metrik-Export fehlgeschlagen: {ex}")
+    
+    # ----------------------------------------
+    # alles, was für das erste Bild nicht nö-
+    # tig ist, läuft erst, wenn das Fenster
+    # gezeichnet ist (erster Durchlauf der
+    # Event-Loop).
+    # ----------------------------------------
+    def finish_startup(self):
+        startup_timer.mark("erstes Zeichnen")
+        
+        self.completion_cache.evict()
+        self.load_catalog()
+        
+        config = configparser.ConfigParser()
+        config.read('config.ini')
         
-        custom_layout_1.addLayout(custom_layout_2)
-        custom_layout_1.addWidget(label_custom,alignment=Qt.AlignTop)
-        custom_layout_1.addWidget(push_button ,alignment=Qt.AlignTop)
+        from semcache import semantic_cache_from_config
+        self.semantic_cache = semantic_cache_from_config(conn, config,
+            os.path.join(DATA_PATH, "semantic"))
         
-        custom_layout_0.addLayout(custom_layout_3)
-        custom_layout_0.addLayout(custom_layout_1)
-        item.setSizeHint(custom_widget.sizeHint())
+        if self.metrics_textfile:
+            self.metrics_timer = QTimer(self)
+            self.metrics_timer.timeout.connect(self.export_metrics)
+            self.metrics_timer.start(self.metrics_interval * 1000)
         
-        self.listbox_widget.addItem(item)
-        self.listbox_widget.setItemWidget(item,custom_widget)
+        legacy = pending_legacy_databases(conn, find_legacy_databases(DATA_PATH))
+        if legacy:
+            print(f"{len(legacy)} alte Datenbank-Dateien gefunden - Import mit: python importer.py")
+        
+        # --------------------------------------------------------------------
+        # Assistent und Thread werden im Hintergrund geholt bzw. beim ersten
+        # Mal erstellt (sofern ein API-Key vorhanden ist) - das openai Paket
+        # wird dabei ebenfalls im Hintergrund geladen.
+        # --------------------------------------------------------------------
+        if "OPENAI_API_KEY" in os.environ:
+            self.prepare_assistant()
+        
+        startup_timer.mark("verzögerte Aufgaben")
+        if startup_timer.enabled and not startup_timer.done:
+            startup_timer.done = True
+            startup_timer.report(self.startup_budget)
+    
+    # ----------------------------------------
+    # Job im Hintergrund starten; on_result
+    # (und on_error) werden im GUI-Thread mit
+    # dem Ergebnis aufgerufen. Arbeiten ohne
+    # Eile mit priority=LANE_BATCH einreihen.
+    # ----------------------------------------
+    def submit_job(self, func, label, on_result, on_error=None, priority=LANE_INTERACTIVE):
+        job_id = self.executor.submit(func, label, priority)
+        self.job_handlers[job_id] = (on_result, on_error)
+        return job_id
+    
+    # ----------------------------------------
+    # beim Schließen des Fensters alle Anfra-
+    # gen abbrechen, und die Threads beenden.
+    # ----------------------------------------
+    def closeEvent(self, event):
+        self.executor.shutdown()
+        if self.postprocessor is not None:
+            self.postprocessor.shutdown()
+        self.completion_cache.flush()
+        if self.metrics_textfile:
+            self.export_metrics()
+        event.accept()
+    
+    def menu_help_clicked_about(self):
+        QMessageBox.information(self,
+        'Über diese Anwendung',
+        'ChatGPT Tool 1.0\n\n(c) 2023 by Jens Kallup - paule32\nAll rights reserved.')
+        return
+
+    # -----------------------------------------
+    # eine neue Chat-Nachricht anfügen
+    # - zuerst prüfen, ob Text vorhandne ist:
+    # -----------------------------------------
+    def add_chat_item(self,text,mode):
+        if not text.strip():
+            self.entryfield_right.setText("")
+            self.entryfield_right.setFocus()
+            return
+        
+        # ----------------------------------------
+        # header (Datum), Checkbox, Text und DEL-
+        # Button zeichnet der ChatItemDelegate.
+        # Der Text steht sofort da; aufbereitet
+        # (postprocess.py) wird er - bei langen
+        # Antworten - im Hintergrund.
+        # ----------------------------------------
+        self.show_latest()
+        message = ChatMessage(text, mode)
+        row     = self.chat_model.add_message(message)
+        self.chat_delegate.postprocess(message)
+        self.listbox_widget.scrollToBottom()
+        return row
     
     # ----------------------------------------
     # Die Methode showEvent wird aufgerufen,
@@ -774,23 +1668,13 @@ class HauptFenster(QMainWindow):
     # -------------------------------------------------
     def ist_session_vorhanden(self,searchfor):
         # -----------------------------------------
-        # SQL-Abfrage, um zu überprüfen, ob der
-        # Wert bereits vorhanden ist
-        # -----------------------------------------
-        query = "SELECT COUNT(*) FROM session WHERE name = '" \
-        + f"{searchfor}" + "';";
-        conn_cursor.execute(query)
-        
-        # -----------------------------------------
-        # Ergebnis abrufen
+        # im Katalog (ein Zugriff auf ein dict),
+        # bzw. - solange er noch lädt - über den
+        # Index auf session.name.
         # -----------------------------------------
-        result = conn_cursor.fetchone()[0]
-        
-        # -----------------------------------------
-        # Wert ist vorhanden, wenn das Ergebnis
-        # größer als 0 ist
-        # -----------------------------------------
-        return result > 0
+        if self.session_catalog is not None:
+            return self.session_catalog.exists(searchfor)
+        return session_exists(conn, searchfor)
     
     # ----------------------------------------
     # Menu Aktion-Event's ...
@@ -821,35 +1705,87 @@ class HauptFenster(QMainWindow):
             "Session: " + f"{text}" + "\nbereits vorhanden.")
             return
             
-        date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-        time_str = datetime.datetime.now().strftime("%H:%M:%S")
+        self.current_session_id = self.new_session(text)
+        self.chat_model.set_messages([])
         
-        # -----------------------------------------
-        # Datenbank-Eintrag erstellen ...
-        # -----------------------------------------
-        conn_cursor.execute(
-        "INSERT INTO session (datum,zeit,name) VALUES (?,?,?)", \
-        (f"{date_str}",f"{time_str}",f"{text}"))
+        self.checkbox_header_left .setChecked(False)
+        self.checkbox_header_right.setChecked(False)
     
-        # -----------------------------------------
-        # Änderung an der Datenbank speichern.
-        # -----------------------------------------
-        conn.commit()
+    # -----------------------------------------
+    # Datenbank-Eintrag (in einer Transaktion)
+    # und Eintrag in der linken ListBox er-
+    # stellen ...
+    # -----------------------------------------
+    def new_session(self, text):
+        date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+        time_str = datetime.datetime.now().strftime("%H:%M:%S")
         
-        item = SessionDatabaseListboxItem( \
-            text,                          \
-            self.listbox_widget_left,      \
-            f"{date_str}",                 \
-            f"{time_str}",                 \
-            extra_data={"key": "value"})
+        name       = free_session_name(conn, f"{text}")
+        session_id = create_session(conn, name, date_str, time_str)
+        self.session_model.insert_session(session_id, date_str, time_str, name)
+        self.catalog_changed(added=[(session_id, date_str, time_str, name)])
         
+        return session_id
+    
+    # -----------------------------------------
+    # den Session-Katalog (neu) laden: im Hin-
+    # tergrund, mit eigener Verbindung. Wurden
+    # Sessions währenddessen geändert, wird
+    # noch einmal geladen.
+    # -----------------------------------------
+    def load_catalog(self):
+        self.session_catalog = None
+        self.catalog_dirty   = False
+        
+        def run(job):
+            catalog_conn = open_database(default_database_path())
+            try:
+                return SessionCatalog.load(catalog_conn)
+            finally:
+                catalog_conn.close()
+        
+        def done(catalog):
+            if self.catalog_dirty:
+                self.load_catalog()
+                return
+            self.session_catalog = catalog
+            self.filter_sessions()
+        
+        self.submit_job(run, "Sessions", done, priority=LANE_BATCH)
+    
+    def catalog_changed(self, added=(), removed=()):
+        if self.session_catalog is None:
+            self.catalog_dirty = True
+            return
+        for entry in added:
+            self.session_catalog.add(*entry)
+        for session_id in removed:
+            self.session_catalog.remove(session_id)
+    
+    # -----------------------------------------
+    # Session-Liste nach dem Text im Suchfeld
+    # filtern (Anfang des Namens, ohne Unter-
+    # schied von Groß-/Kleinschreibung) ...
+    # -----------------------------------------
+    def filter_sessions(self):
+        if self.session_catalog is None:
+            return
         
-        #QListWidgetItem()
-        #list_session_items.append(item)
-        #ööö
+        # ----------------------------------------
+        # gleicher Text: nichts zu tun - außer der
+        # Katalog wurde inzwischen neu geladen.
+        # ----------------------------------------
+        text = self.entryfield_left.text().strip()
+        if (text or None) == self.session_model.prefix and \
+            (not text or self.session_model.catalog is self.session_catalog):
+            return
         
-        self.checkbox_header_left .setChecked(False)
-        self.checkbox_header_right.setChecked(False)
+        self.listbox_search_left.hide()
+        self.listbox_widget_left.show()
+        self.session_model.set_filter(self.session_catalog, text)
+        if text:
+            self.status_label.setText(
+                f"{self.session_catalog.count(text)} Sessions beginnen mit: {text}")
     
     def left_listbox_item_clicked(self,item):
         QMessageBox.information(self,
@@ -857,27 +1793,134 @@ class HauptFenster(QMainWindow):
         f"{item.text()}")
         return
     
+    # ----------------------------------------
+    # Datei-Menü: Sessions importieren bzw.
+    # exportieren (exchange.py). "Speichern"
+    # schreibt noch einmal in die zuletzt
+    # gewählte Datei.
+    # ----------------------------------------
     def menu_file_clicked_open(self):
-        print("open clicked")
+        self.import_from_file()
     
     def menu_file_clicked_save(self):
-        print("save clicked")
+        if self.export_path is None:
+            return self.menu_file_clicked_saveas()
+        self.export_to_file(self.export_path, self.session_selection())
     
     def menu_file_clicked_saveas(self):
-        print("save as clicked")
+        path = self.ask_export_path()
+        if path:
+            self.export_to_file(path, self.session_selection())
     
     def menu_file_clicked_exit(self):
         print("exit clicked")
         sys.exit()
     
+    # ----------------------------------------
+    # was exportiert wird: die markierten
+    # Sessions, sonst die offene Session,
+    # sonst alle Sessions ...
+    # ----------------------------------------
+    def session_selection(self):
+        checks = self.session_model.checks
+        if checks.all and self.session_model.prefix is not None:
+            return { "sessions": [ session_id for session_id in self.filtered_session_ids()
+                if session_id not in checks.toggled ] }
+        if checks.all:
+            return { "except_sessions": list(checks.toggled) }
+        if checks.any():
+            return { "sessions": list(checks.toggled) }
+        if self.current_session_id is not None:
+            return { "sessions": [self.current_session_id] }
+        return {}
+    
+    # ----------------------------------------
+    # ... bzw. die markierten Nachrichten,
+    # sonst die offene Session (None, wenn
+    # es nichts gibt).
+    # ----------------------------------------
+    def message_selection(self):
+        checks = self.chat_model.checks
+        if checks.all and self.current_session_id is not None:
+            return { "sessions": [self.current_session_id],
+                     "except_messages": [message.msg_id for message in checks.toggled
+                         if message.msg_id is not None] }
+        if checks.any():
+            return { "messages": [message.msg_id for message in checks.toggled
+                if message.msg_id is not None] }
+        if self.current_session_id is not None:
+            return { "sessions": [self.current_session_id] }
+        return None
+    
+    def ask_export_path(self):
+        path, _filter = QFileDialog.getSaveFileName(self,
+            "Exportieren",
+            self.export_path or DATA_PATH,
+            FILE_FILTER)
+        return path
+    
+    # ----------------------------------------
+    # Export und Import laufen im Hintergrund
+    # mit einer eigenen Datenbank-Verbindung;
+    # gelesen bzw. geschrieben wird in Por-
+    # tionen.
+    # ----------------------------------------
+    def export_to_file(self, path, selection):
+        def run(job):
+            export_conn = open_database(default_database_path())
+            try:
+                return export_messages(export_conn, path,
+                    cancelled=job.is_cancelled, **selection)
+            finally:
+                export_conn.close()
+        
+        def done(count):
+            if count is not None:
+                self.export_path = path
+                self.status_label.setText(f"{count} Nachrichten nach {path} exportiert.")
+        
+        self.status_label.setText(f"exportiere nach {path} ...")
+        self.submit_job(run, "Export", done, priority=LANE_BATCH)
+    
+    def import_from_file(self):
+        path, _filter = QFileDialog.getOpenFileName(self,
+            "Importieren",
+            self.export_path or DATA_PATH,
+            FILE_FILTER)
+        if not path:
+            return
+        
+        def run(job):
+            import_conn = open_database(default_database_path())
+            try:
+                return import_messages(import_conn, path, cancelled=job.is_cancelled)
+            finally:
+                import_conn.close()
+        
+        def done(stats):
+            self.session_model.reload()
+            self.load_catalog()
+            self.status_label.setText(
+                  f"importiert: {stats['sessions']} Sessions, "
+                + f"{stats['messages']} Nachrichten")
+        
+        self.status_label.setText(f"importiere {path} ...")
+        self.submit_job(run, "Import", done, priority=LANE_BATCH)
+    
     # ----------------------------------------
     # Text-Eingabe/Chat Elemente ...
     # ----------------------------------------
     def send_edit_button_1(self):
-        print("load from")
+        self.import_from_file()
     
     def send_edit_button_2(self):
-        print("save to")
+        selection = self.message_selection()
+        if selection is None:
+            self.status_label.setText("Keine Nachrichten zum Speichern ausgewählt.")
+            return
+        path = self.ask_export_path()
+        if path:
+            self.export_to_file(path, selection)
     
     def send_edit_button_3(self):
         print("delete text")
@@ -893,32 +1936,14 @@ class HauptFenster(QMainWindow):
     # state => 2 "clicked"
     # ----------------------------------------
     def checkbox_click_header_right(self,state):
-        if state == 2:
-            for index in range(self.listbox_widget.count()):
-                item     = self.listbox_widget.item(index)
-                checkbox = self.listbox_widget.itemWidget(item)
-                checkbox.setChecked(True)
-        else:
-            for index in range(self.listbox_widget.count()):
-                item     = self.listbox_widget.item(index)
-                checkbox = self.listbox_widget.itemWidget(item)
-                checkbox.setChecked(False)
+        self.chat_model.set_all_checked(state == 2)
     
     # ----------------------------------------
     # linke checkbox: Alles auswählen
     # state => 2 "clicked"
     # ----------------------------------------
     def checkbox_click_header_left(self,state):
-        if state == 2:
-            for index in range(self.listbox_widget_left.count()):
-                item     = self.listbox_widget_left.item(index)
-                checkbox = self.listbox_widget_left.itemWidget(item)
-                checkbox.setChecked(True)
-        else:
-            for index in range(self.listbox_widget_left.count()):
-                item     = self.listbox_widget_left.item(index)
-                checkbox = self.listbox_widget_left.itemWidget(item)
-                checkbox.setChecked(False)
+        self.session_model.set_all_checked(state == 2)
     
     def handle_action_session_new(self):
         self.status_label.setText("bereite neue Datenbank vor...")
@@ -938,26 +1963,58 @@ class HauptFenster(QMainWindow):
         text = text[:max_length]
         text = text.rstrip()
         
-        time_now = get_current_time()  # aktuelle  Zeit für Datenbank-Name
-        date_now = get_current_date()  # aktuelles Datum ...
-        
-        data_stamp = "data\\"   \
-        + f"{text}"     + "_"   \
-        + f"{date_now}" + "__"  \
-        + f"{time_now}" + ".db"
-        
-        _, fileExtension = os.path.splitext(data_stamp)
-        if not fileExtension == ".db":
-            data_stamp += ".db"
+        if not text:
+            return
         
-        if os.path.exists(data_stamp):
+        # -----------------------------------------------------
+        # alle Sessions liegen in einer gemeinsamen Datenbank;
+        # eine "neue Datenbank" ist deshalb eine neue Session.
+        # -----------------------------------------------------
+        if self.ist_session_vorhanden(f"{text}"):
             QMessageBox.information(self,
             "Achtung",
-            "Datenbank bereits vorhanden.")
+            "Session: " + f"{text}" + "\nbereits vorhanden.")
             return
+        
+        self.current_session_id = self.new_session(text)
+        self.chat_model.set_messages([])
+        self.status_label.setText("Session angelegt: " + f"{text}")
     
+    # -----------------------------------------------------
+    # bestehende (alte) Datenbank-Dateien in die gemeinsame
+    # Datenbank übernehmen. Der Import läuft im Hintergrund
+    # mit einer eigenen Verbindung zur Datenbank.
+    # -----------------------------------------------------
     def handle_action_session_open(self):
         self.status_label.setText("öffne bestehende Datenbank...")
+        
+        paths, _filter = QFileDialog.getOpenFileNames(self,
+            "Bestehende Datenbank öffnen",
+            DATA_PATH,
+            "SQLite Datenbank (*.db)")
+        
+        paths = [path for path in paths
+            if os.path.abspath(path) != os.path.abspath(default_database_path())]
+        if not paths:
+            self.status_label.setText("")
+            return
+        
+        def run(job):
+            import_conn = open_database(default_database_path())
+            try:
+                return import_databases(import_conn, paths)
+            finally:
+                import_conn.close()
+        
+        def done(stats):
+            self.session_model.reload()
+            self.load_catalog()
+            self.statusBar().showMessage(
+                  f"übernommen: {stats['sessions']} Sessions, "
+                + f"{stats['messages']} Nachrichten "
+                + f"({stats['duplicates']} Duplikate)")
+        
+        self.submit_job(run, "Import", done, priority=LANE_BATCH)
 
 # ----------------------------------------------------------------------------
 # dies wird unsere "main" - Einstiegs-Funktions werden, ab der Python beginnt,
@@ -965,12 +2022,13 @@ class HauptFenster(QMainWindow):
 # ----------------------------------------------------------------------------
 def window():
     app = QApplication(sys.argv)
+    startup_timer.mark("QApplication")
 
     # ------------------------------------------------------------------------
     # bevor wir loslegen, erstmal prüfen, ob Verzeichnisse und andere Dateien
     # bereits vorhanden sind - wenn nicht, versuchen wir diese zu ersellen.
     # ------------------------------------------------------------------------
-    data_path  = ".\data"
+    data_path  = DATA_PATH
     loca_path  = ".\locales"
     
     if (os.path.exists(data_path) and os.path.isdir(data_path)) == False:
@@ -980,44 +2038,47 @@ def window():
     if (os.path.exists(loca_path) and os.path.isdir(loca_path)) == False:
         print(_("localization wird nicht unterstützt."))
     
-    time_today = get_current_time()  # aktuelle  Zeit für Datenbank-Name
-    date_today = get_current_date()  # aktuelles Datum ...
-    
     # ------------------------------------------------------------------------
     # Verbindung zur Datenbank herstellen. Die Datenbank ist SQLite. Sie kann
     # lokal auf dem Benutzer-Computer System abgespeichert werden und bietet
     # die Möglichkeit kleine Datenmengen zu speichern, die keinen Datenbank-
     # Server benötigen.
+    #
+    # Alle Sessions liegen in einer einzigen Datenbank (data/chat.db) im WAL-
+    # Modus. Falls noch kein Datenbestand vorliegt (zum Beispiel bei der ersten
+    # inbetriebnahme der Anwendung), werden dabei alle nötigen Daten-Objekte
+    # (Tabellen) erstellt.
     # ------------------------------------------------------------------------
     global conn
     global conn_cursor
     
-    date_stamp = f"{date_today}" + "__" + f"{time_today}"
-    conn = sqlite3.connect("data\chat_" + f"{date_stamp}" + ".db")
+    conn = open_database(default_database_path())
     
     # ------------------------------------------------------------------------
     # ein cursor-Objekt erstellen, damit wir SQL-Operationen ausführen können:
     # ------------------------------------------------------------------------
     conn_cursor = conn.cursor()
+    startup_timer.mark("Datenbank")
     
     # ------------------------------------------------------------------------
-    # falls noch kein Datenbestand vorliegt (zum Beispiel bei der ersten in-
-    # betriebnahme der Anwendung), erstellen wir erstmal alle nötigen Daten-
-    # Objekte (Tabellen), die später die abgefragten Daten speichern.
+    # okay. fast fertig - Anwendung muss noch gerendert werden.
     # ------------------------------------------------------------------------
-    conn_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS session (
-            id    INTEGER PRIMARY KEY,
-            datum TEXT,
-            zeit  TEXT,
-            name  TEXT
-        )
-    ''')
+    fenster = HauptFenster()
+    startup_timer.mark("Fenster aufbauen")
     
     # ------------------------------------------------------------------------
-    # okay. fast fertig - Anwendung muss noch gerendert werden.
+    # eine nette Begrüßung kann ja nicht schaden :) ...
     # ------------------------------------------------------------------------
-    fenster = HauptFenster()
+    print("Willkommen,  es ist: " + f"Es ist {get_current_time()}.")
+    
+    # ------------------------------------------------------------------------
+    # gibt es noch alte data/chat_<datum>__<zeit>.db Dateien, weisen wir auf
+    # den Import hin (Toolbar: "Bestehende Datenbank öffnen", oder importer.py)
+    # - das und alles Weitere (Cache aufräumen, Assistent vorbereiten) macht
+    # finish_startup, sobald das Fenster zu sehen ist.
+    # ------------------------------------------------------------------------
+    QTimer.singleShot(0, fenster.finish_startup)
+    
     result  = app.exec_()
     
     # ------------------------------------------------------------------------
@@ -1030,35 +2091,6 @@ def window():
     # schließen.
     # ------------------------------------------------------------------------
     sys.exit(result)
-    
-    # ------------------------------------------------------------------------
-    # eine nette Begrüßung kann ja nicht schaden :) ...
-    # ------------------------------------------------------------------------
-    print("Willkommen,  es ist: " + f"Es ist {get_current_time()}.")
-
-    # ------------------------------------------------------------------------
-    # einen Assistenten (who is that :) erstellen ...
-    # ------------------------------------------------------------------------
-    my_assistant = client.beta.assistants.create(
-        instructions = "Ich bin Dein persönlicher Tutor. Gerne stehe ich Dir bei Fragen zur Verfügung.",
-        description  = "Online-Lehrkraft",
-        name         = "Jens Kallup",
-        tools        = [{"type": "code_interpreter"}],
-        model        = "gpt-4",
-    )
-    print("paule32: " + my_assistant.instructions)
-    
-    # ------------------------------------------------------------------------
-    # einen Thread für Aufgaben und Berechnungen ...
-    # ------------------------------------------------------------------------
-    thread = client.beta.threads.create(
-        messages=[
-            {
-                "role": "user",
-                "content": "unterhalten wir uns ein wenig",
-            }
-        ]
-    )
 
 # ----------------------------------------------------------------------------
 # unsere erste Anfrage, wie soll's denn anders sein - das Hallo Welt Beispiel.
@@ -1071,7 +2103,7 @@ def window():
 # ----------------------------------------------------------------------------
 def Anfrage_1():
     S1 = "Hallo Welt"
-    re_1 = client.chat.completions.create(
+    re_1 = get_client().chat.completions.create(
         model = "gpt-3.5-turbo",
         messages = [
             { "role": "system", "content": "Übung 1" },
@@ -1189,6 +2221,12 @@ def main_function():
         # --------------------------------------------------------------------
         sys.exit("\nProgramm erfolgreich beendet.")
 
+# ----------------------------------------------------------------------------
+# die Übungen 1 bis 7 stehen auch in uebungen.jsonl - und können damit alle
+# auf einmal abgearbeitet werden:
+#
+#    python batch.py uebungen.jsonl antworten.jsonl
+#
 # ----------------------------------------------------------------------------
 #re_2 = client.chat.completions.create(
 #    model="gpt-3.5-turbo",
@@ -0,0 +1,251 @@
+# ----------------------------------------------------------------------------
+# Datei:  metrics.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Messwerte pro Anfrage an den Server: Wartezeit in der Warteschlange, Zeit
+# bis zum ersten Token, Gesamt-Dauer, Token (Frage/Antwort), Wiederholungen
+# und Cache-Treffer. Jede Anfrage landet als eine Zeile in der Tabelle
+# "metrics"; über die letzten Anfragen wird eine laufende Übersicht für die
+# Status-Zeile geführt, und auf Wunsch regelmäßig eine Textdatei für den
+# Prometheus node exporter (textfile collector) geschrieben.
+# ----------------------------------------------------------------------------
+import os            # operating system stuff
+import time          # high resolution timer
+
+from collections import deque
+
+# ----------------------------------------------------------------------------
+# Perzentil (lineare Interpolation) einer sortierten Liste ...
+# ----------------------------------------------------------------------------
+def percentile(values, percent):
+    if not values:
+        return None
+    position = (len(values) - 1) * percent / 100
+    lower    = int(position)
+    upper    = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+# ----------------------------------------------------------------------------
+# die Messwerte einer einzelnen Anfrage. Das Objekt wird im GUI-Thread beim
+# Einreihen erstellt, im Arbeits-Thread (chatclient.py) gefüllt, und danach
+# wieder im GUI-Thread gespeichert.
+# ----------------------------------------------------------------------------
+class RequestMetrics:
+    __slots__ = ("kind", "model", "submitted", "started", "first_token", "finished",
+                 "prompt_tokens", "completion_tokens", "retries", "cache_hit", "error")
+
+    def __init__(self, kind, model=None):
+        self.kind              = kind   # "chat", "summary", "assistant", "thread", ...
+        self.model             = model
+        self.submitted         = time.perf_counter()
+        self.started           = None
+        self.first_token       = None
+        self.finished          = None
+        self.prompt_tokens     = None
+        self.completion_tokens = None
+        self.retries           = 0
+        self.cache_hit         = False
+        self.error             = None
+
+    def start(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def first(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def finish(self, error=None):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        if error is not None:
+            self.error = error
+
+    def set_usage(self, usage):
+        self.prompt_tokens     = usage.prompt_tokens
+        self.completion_tokens = usage.completion_tokens
+
+    # ----------------------------------------
+    # abgeleitete Zeiten (Sekunden, oder None)
+    # ----------------------------------------
+    def queue_wait(self):
+        return (self.started or self.finished or self.submitted) - self.submitted
+
+    def time_to_first_token(self):
+        if self.first_token is None:
+            return None
+        return self.first_token - (self.started or self.submitted)
+
+    def total(self):
+        if self.finished is None:
+            return None
+        return self.finished - self.submitted
+
+# ----------------------------------------------------------------------------
+# die Tabelle "metrics", und die laufende Übersicht ...
+# ----------------------------------------------------------------------------
+class MetricsStore:
+    def __init__(self, conn, window=100):
+        self.conn   = conn
+        self.recent = deque(maxlen=window)   # die letzten RequestMetrics
+        self.totals = None                   # (kind, status) => Summen, siehe load_totals
+
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS metrics (
+                id                INTEGER PRIMARY KEY AUTOINCREMENT,
+                created           REAL    NOT NULL,
+                kind              TEXT    NOT NULL,
+                model             TEXT,
+                queue_ms          REAL,
+                ttft_ms           REAL,
+                total_ms          REAL,
+                prompt_tokens     INTEGER,
+                completion_tokens INTEGER,
+                retries           INTEGER NOT NULL DEFAULT 0,
+                cache_hit         INTEGER NOT NULL DEFAULT 0,
+                error             TEXT
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS metrics_created ON metrics (created)
+        ''')
+
+    # ----------------------------------------
+    # eine Anfrage speichern (GUI-Thread) ...
+    # ----------------------------------------
+    def record(self, metrics):
+        metrics.finish()
+
+        def ms(seconds):
+            return None if seconds is None else seconds * 1000
+
+        with self.conn:
+            self.conn.execute('''
+                INSERT INTO metrics (created, kind, model, queue_ms, ttft_ms, total_ms,
+                    prompt_tokens, completion_tokens, retries, cache_hit, error)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?)
+            ''', (time.time(), metrics.kind, metrics.model,
+                  ms(metrics.queue_wait()), ms(metrics.time_to_first_token()),
+                  ms(metrics.total()), metrics.prompt_tokens, metrics.completion_tokens,
+                  metrics.retries, int(metrics.cache_hit), metrics.error))
+
+        self.recent.append(metrics)
+        if self.totals is not None:
+            self.add_total(metrics.kind, metrics.error is None, 1, metrics.total() or 0,
+                metrics.prompt_tokens or 0, metrics.completion_tokens or 0,
+                metrics.retries, int(metrics.cache_hit))
+
+    # ----------------------------------------
+    # Summen seit Beginn der Aufzeichnung -
+    # werden erst beim ersten Export aus der
+    # Tabelle gelesen, danach mitgezählt.
+    # ----------------------------------------
+    def load_totals(self):
+        self.totals = {}
+        for row in self.conn.execute('''
+            SELECT kind, error IS NULL, COUNT(*), COALESCE(SUM(total_ms), 0) / 1000,
+                   COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0),
+                   SUM(retries), SUM(cache_hit)
+            FROM metrics GROUP BY kind, error IS NULL
+        '''):
+            self.add_total(*row)
+        return self.totals
+
+    def add_total(self, kind, ok, count, seconds, prompt, completion, retries, cache_hits):
+        key    = (kind, "ok" if ok else "error")
+        totals = self.totals.setdefault(key, [0, 0.0, 0, 0, 0, 0])
+        for position, value in enumerate((count, seconds, prompt, completion, retries, cache_hits)):
+            totals[position] += value
+
+    # ----------------------------------------
+    # Übersicht über die letzten Anfragen ...
+    # ----------------------------------------
+    def summary(self):
+        recent   = list(self.recent)
+        totals   = sorted(m.total() for m in recent if m.total() is not None and not m.cache_hit)
+        firsts   = sorted(m.time_to_first_token() for m in recent
+            if m.time_to_first_token() is not None and not m.cache_hit)
+        waits    = sorted(m.queue_wait() for m in recent)
+        return {
+            "count"       : len(recent),
+            "errors"      : sum(1 for m in recent if m.error is not None),
+            "retries"     : sum(m.retries for m in recent),
+            "cache_hits"  : sum(1 for m in recent if m.cache_hit),
+            "tokens"      : sum((m.prompt_tokens or 0) + (m.completion_tokens or 0) for m in recent),
+            "latency_p50" : percentile(totals, 50),
+            "latency_p95" : percentile(totals, 95),
+            "ttft_p50"    : percentile(firsts, 50),
+            "ttft_p95"    : percentile(firsts, 95),
+            "queue_p50"   : percentile(waits, 50),
+            "queue_p95"   : percentile(waits, 95),
+        }
+
+    def status_text(self):
+        summary = self.summary()
+        if not summary["count"]:
+            return ""
+
+        parts = []
+        if summary["latency_p50"] is not None:
+            parts.append(f"Dauer p50 {summary['latency_p50']:.1f} s"
+                + f" / p95 {summary['latency_p95']:.1f} s")
+        if summary["ttft_p50"] is not None:
+            parts.append(f"1. Token p50 {summary['ttft_p50'] * 1000:.0f} ms")
+        parts.append(f"Cache {summary['cache_hits'] * 100 // summary['count']}%")
+        parts.append(f"{summary['tokens']} Token")
+        if summary["errors"]:
+            parts.append(f"{summary['errors']} Fehler")
+        return " | ".join(parts)
+
+    # ----------------------------------------
+    # Textdatei für den node exporter. Sie
+    # wird erst als .tmp geschrieben und dann
+    # umbenannt, damit nie eine halbe Datei
+    # gelesen wird.
+    # ----------------------------------------
+    def export_prometheus(self, path):
+        totals  = self.totals if self.totals is not None else self.load_totals()
+        summary = self.summary()
+
+        lines = [
+            "# HELP chatgpt_requests_total Anzahl Anfragen an den Server.",
+            "# TYPE chatgpt_requests_total counter",
+        ]
+        for (kind, status), values in sorted(totals.items()):
+            lines.append(f'chatgpt_requests_total{{kind="{kind}",status="{status}"}} {values[0]}')
+
+        def counter(name, help_text, position):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {sum(v[position] for v in totals.values())}")
+
+        counter("chatgpt_request_duration_seconds_total",
+            "Summe der Anfrage-Dauer in Sekunden.", 1)
+        lines.append("# HELP chatgpt_tokens_total Verbrauchte Token.")
+        lines.append("# TYPE chatgpt_tokens_total counter")
+        lines.append(f'chatgpt_tokens_total{{type="prompt"}} {sum(v[2] for v in totals.values())}')
+        lines.append(f'chatgpt_tokens_total{{type="completion"}} {sum(v[3] for v in totals.values())}')
+        counter("chatgpt_retries_total", "Wiederholte Anfragen.", 4)
+        counter("chatgpt_cache_hits_total", "Aus dem Cache beantwortete Anfragen.", 5)
+
+        for name, key, help_text in (
+            ("chatgpt_request_latency_seconds", "latency", "Dauer der letzten Anfragen."),
+            ("chatgpt_time_to_first_token_seconds", "ttft", "Zeit bis zum ersten Token."),
+            ("chatgpt_queue_wait_seconds", "queue", "Wartezeit in der Warteschlange."),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for quantile, label in (("p50", "0.5"), ("p95", "0.95")):
+                value = summary[f"{key}_{quantile}"]
+                if value is not None:
+                    lines.append(f'{name}{{quantile="{label}"}} {value:.6f}')
+
+        temp = path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp, path)
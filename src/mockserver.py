@@ -0,0 +1,436 @@
+# ----------------------------------------------------------------------------
+# Datei:  mockserver.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Ein lokaler Ersatz für den OpenAI Server - für Last-Tests ohne Netzwerk und
+# ohne API-Key. Er versteht die Endpunkte, die chatclient.py benutzt:
+#
+#    POST /v1/chat/completions              (mit und ohne "stream")
+#    POST /v1/assistants
+#    POST /v1/threads
+#    POST /v1/threads/<id>/messages         GET /v1/threads/<id>/messages
+#    POST /v1/threads/<id>/runs (auch mit "stream": true)  GET /v1/threads/<id>/runs/<id>
+#
+# Gestartet wird er mit:
+#
+#    python mockserver.py --port 8808 --latency 300 --token-rate 50
+#
+# und die Anwendung (bzw. loadgen.py) mit:
+#
+#    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=mock python start.py
+#
+# Wartezeit bis zum ersten Token, Token pro Sekunde, Länge der Antworten und
+# der Anteil fehlerhafter Antworten (500 bzw. 429 mit Retry-After) sind ein-
+# stellbar. Mit --rpm-limit / --tpm-limit verhält sich der Server wie das
+# Rate-Limit von OpenAI: er schickt x-ratelimit-* Header mit, und antwortet
+# mit 429, sobald das Kontingent (es läuft über eine Minute wieder voll)
+# aufgebraucht ist.
+# ----------------------------------------------------------------------------
+import argparse      # command line
+import itertools     # id counter
+import json          # request and response bodies
+import random        # latency jitter, error injection
+import re            # url patterns
+import sys           # system specifies
+import threading     # id counter lock
+import time          # latency
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "Gerne erkläre ich das Schritt für Schritt . Eine Funktion in Python wird "
+    "mit def angelegt , eine Schleife mit for oder while . Probiere es einfach "
+    "aus und melde Dich , wenn etwas nicht klappt !"
+).split()
+
+# ----------------------------------------------------------------------------
+# die Einstellungen des Servers (werden von allen Anfragen gelesen) ...
+# ----------------------------------------------------------------------------
+class MockSettings:
+    def __init__(self, latency=200, jitter=50, token_rate=50, tokens=60,
+        error_rate=0.0, rate_limit_rate=0.0, seed=None, rpm_limit=0, tpm_limit=0):
+        self.latency         = latency           # ms bis zum ersten Byte
+        self.jitter          = jitter            # +/- ms auf die Wartezeit
+        self.token_rate      = token_rate        # Token pro Sekunde (0 = sofort)
+        self.tokens          = tokens            # Länge einer Antwort in Token
+        self.error_rate      = error_rate        # Anteil mit "500 Internal Server Error"
+        self.rate_limit_rate = rate_limit_rate   # Anteil mit "429 Too Many Requests"
+        self.rpm_limit       = rpm_limit         # Anfragen pro Minute (0 = unbegrenzt)
+        self.tpm_limit       = tpm_limit         # Token pro Minute (0 = unbegrenzt)
+        self.quota           = [rpm_limit, tpm_limit]   # verbleibendes Kontingent
+        self.quota_stamp     = time.monotonic()
+        self.random          = random.Random(seed)
+        self.lock            = threading.Lock()
+        self.counter         = itertools.count(1)
+
+    def next_id(self, prefix):
+        with self.lock:
+            return f"{prefix}_{next(self.counter):06d}"
+
+    def roll(self):
+        with self.lock:
+            return self.random.random()
+
+    def wait_first(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, delay) / 1000)
+
+    def wait_token(self):
+        if self.token_rate > 0:
+            time.sleep(1.0 / self.token_rate)
+
+    # ----------------------------------------
+    # Kontingent für eine Anfrage mit "tokens"
+    # Token nehmen; zurück kommen "erlaubt?"
+    # und die x-ratelimit-* Header. Wie bei
+    # OpenAI läuft das Kontingent gleichmäßig
+    # über die Minute wieder voll.
+    # ----------------------------------------
+    def take_quota(self, tokens):
+        if not self.rpm_limit and not self.tpm_limit:
+            return True, {}
+
+        with self.lock:
+            now     = time.monotonic()
+            elapsed = now - self.quota_stamp
+            self.quota_stamp = now
+            self.quota = [ min(limit, level + elapsed * limit / 60)
+                for limit, level in zip((self.rpm_limit, self.tpm_limit), self.quota) ]
+
+            allowed = (not self.rpm_limit or self.quota[0] >= 1) \
+                  and (not self.tpm_limit or self.quota[1] >= tokens)
+            if allowed:
+                self.quota[0] -= 1
+                self.quota[1] -= tokens
+
+            headers = {}
+            for kind, limit, level in (("requests", self.rpm_limit, self.quota[0]),
+                                       ("tokens",   self.tpm_limit, self.quota[1])):
+                if limit:
+                    headers[f"x-ratelimit-limit-{kind}"]     = str(limit)
+                    headers[f"x-ratelimit-remaining-{kind}"] = str(max(0, int(level)))
+                    headers[f"x-ratelimit-reset-{kind}"]     = \
+                        f"{(limit - level) * 60 / limit:.3f}s"
+            return allowed, headers
+
+    def answer(self, max_tokens=None):
+        count = self.tokens if not max_tokens else min(self.tokens, max_tokens)
+        return [WORDS[number % len(WORDS)] + " " for number in range(count)]
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings         = None   # MockSettings, wird vom Server gesetzt
+    threads          = {}     # thread_id => Liste von Nachrichten
+    runs             = {}     # run_id    => run Objekt
+
+    def log_message(self, format, *args):
+        pass
+
+    # ----------------------------------------
+    # Hilfsfunktionen für die Antworten ...
+    # ----------------------------------------
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, { "error": {
+            "message": message, "type": "mock_error", "code": status } }, headers)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    # ----------------------------------------
+    # eingestellte Fehler auslösen; True,
+    # wenn die Anfrage damit beantwortet ist.
+    # ----------------------------------------
+    def inject_error(self):
+        roll = self.settings.roll()
+        if roll < self.settings.rate_limit_rate:
+            self.send_error_json(429, "Rate limit reached (mock)", { "Retry-After": "1" })
+            return True
+        if roll < self.settings.rate_limit_rate + self.settings.error_rate:
+            self.send_error_json(500, "Internal server error (mock)")
+            return True
+        return False
+
+    # ----------------------------------------
+    # HTTP Methoden ...
+    # ----------------------------------------
+    def do_POST(self):
+        body = self.read_json()
+        path = self.path.split("?")[0].rstrip("/")
+
+        if self.inject_error():
+            return
+
+        if path == "/v1/chat/completions":
+            return self.chat_completions(body)
+        if path == "/v1/assistants":
+            return self.create_object("asst", "assistant", body)
+        if path == "/v1/threads":
+            return self.create_thread(body)
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/messages", path)
+        if match:
+            return self.add_message(match.group(1), body)
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/runs", path)
+        if match:
+            return self.create_run(match.group(1), body)
+
+        self.send_error_json(404, f"unknown endpoint {path}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/messages", path)
+        if match:
+            messages = list(reversed(self.threads.get(match.group(1), [])))
+            return self.send_json(200, { "object": "list", "data": messages,
+                "has_more": False })
+
+        match = re.fullmatch(r"/v1/threads/([^/]+)/runs/([^/]+)", path)
+        if match and match.group(2) in self.runs:
+            return self.send_json(200, self.runs[match.group(2)])
+
+        self.send_error_json(404, f"unknown endpoint {path}")
+
+    # ----------------------------------------
+    # chat.completions ...
+    # ----------------------------------------
+    def chat_completions(self, body):
+        settings = self.settings
+        model    = body.get("model", "mock")
+        prompt   = sum(len(str(message.get("content", "")).split())
+            for message in body.get("messages", []))
+        parts    = settings.answer(body.get("max_tokens"))
+        ident    = settings.next_id("chatcmpl")
+        created  = int(time.time())
+        usage    = { "prompt_tokens": prompt, "completion_tokens": len(parts),
+                     "total_tokens": prompt + len(parts) }
+
+        allowed, headers = settings.take_quota(prompt + (body.get("max_tokens") or settings.tokens))
+        if not allowed:
+            headers["Retry-After"] = "1"
+            return self.send_error_json(429, "Rate limit reached (mock quota)", headers)
+
+        settings.wait_first()
+
+        if not body.get("stream"):
+            for part in parts:
+                settings.wait_token()
+            return self.send_json(200, {
+                "id": ident, "object": "chat.completion", "created": created,
+                "model": model,
+                "choices": [{ "index": 0, "finish_reason": "stop",
+                    "message": { "role": "assistant", "content": "".join(parts) } }],
+                "usage": usage }, headers)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish=None, with_usage=None):
+            chunk = { "id": ident, "object": "chat.completion.chunk",
+                "created": created, "model": model,
+                "choices": [] if with_usage else
+                    [{ "index": 0, "delta": delta, "finish_reason": finish }] }
+            if with_usage:
+                chunk["usage"] = with_usage
+            self.wfile.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        try:
+            event({ "role": "assistant", "content": "" })
+            for part in parts:
+                event({ "content": part })
+                settings.wait_token()
+            event({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                event(None, with_usage=usage)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # Client hat abgebrochen
+
+    # ----------------------------------------
+    # Assistants und Threads ...
+    # ----------------------------------------
+    def create_object(self, prefix, kind, body):
+        self.settings.wait_first()
+        result = dict(body)
+        result.update({ "id": self.settings.next_id(prefix), "object": kind,
+            "created_at": int(time.time()) })
+        result.setdefault("tools", [])
+        result.setdefault("metadata", {})
+        self.send_json(200, result)
+
+    def message_object(self, thread_id, role, content):
+        return { "id": self.settings.next_id("msg"), "object": "thread.message",
+            "created_at": int(time.time()), "thread_id": thread_id, "role": role,
+            "content": [{ "type": "text", "text": { "value": content,
+                "annotations": [] } }],
+            "attachments": [], "metadata": {}, "status": "completed" }
+
+    def create_thread(self, body):
+        self.settings.wait_first()
+        thread_id = self.settings.next_id("thread")
+        self.threads[thread_id] = [
+            self.message_object(thread_id, message.get("role", "user"),
+                str(message.get("content", "")))
+            for message in body.get("messages", []) ]
+        self.send_json(200, { "id": thread_id, "object": "thread",
+            "created_at": int(time.time()), "metadata": {},
+            "tool_resources": {} })
+
+    def add_message(self, thread_id, body):
+        if thread_id not in self.threads:
+            return self.send_error_json(404, f"no thread {thread_id}")
+        message = self.message_object(thread_id, body.get("role", "user"),
+            str(body.get("content", "")))
+        self.threads[thread_id].append(message)
+        self.send_json(200, message)
+
+    # ----------------------------------------
+    # Run: mit "stream": true kommen die Er-
+    # eignisse (thread.run.created, ...,
+    # thread.message.delta, ...) als SSE.
+    # ----------------------------------------
+    def create_run(self, thread_id, body):
+        if thread_id not in self.threads:
+            return self.send_error_json(404, f"no thread {thread_id}")
+
+        settings = self.settings
+        messages = self.threads[thread_id]
+        for message in body.get("additional_messages") or []:
+            messages.append(self.message_object(thread_id, message.get("role", "user"),
+                str(message.get("content", ""))))
+
+        prompt = sum(len(part["text"]["value"].split())
+            for message in messages for part in message["content"])
+        parts  = settings.answer()
+        run    = { "id": settings.next_id("run"), "object": "thread.run",
+            "created_at": int(time.time()), "thread_id": thread_id,
+            "assistant_id": body.get("assistant_id"), "status": "queued",
+            "model": body.get("model", "mock"), "instructions": "",
+            "tools": [], "metadata": {}, "last_error": None, "usage": None }
+        self.runs[run["id"]] = run
+
+        def complete():
+            answer = self.message_object(thread_id, "assistant", "".join(parts))
+            messages.append(answer)
+            run.update(status="completed", usage={ "prompt_tokens": prompt,
+                "completion_tokens": len(parts), "total_tokens": prompt + len(parts) })
+            return answer
+
+        settings.wait_first()
+        if not body.get("stream"):
+            for part in parts:
+                settings.wait_token()
+            complete()
+            return self.send_json(200, run)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(name, data):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        message_id = settings.next_id("msg")
+        try:
+            event("thread.run.created", dict(run))
+            event("thread.run.in_progress", dict(run, status="in_progress"))
+            event("thread.message.created", { "id": message_id,
+                "object": "thread.message", "thread_id": thread_id, "role": "assistant",
+                "content": [], "status": "in_progress", "metadata": {} })
+            for part in parts:
+                event("thread.message.delta", { "id": message_id,
+                    "object": "thread.message.delta", "delta": { "content": [
+                        { "index": 0, "type": "text",
+                          "text": { "value": part, "annotations": [] } }] } })
+                settings.wait_token()
+            answer = complete()
+            answer["id"] = message_id
+            event("thread.message.completed", answer)
+            event("thread.run.completed", run)
+            self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass   # Client hat abgebrochen
+
+# ----------------------------------------------------------------------------
+# Server erzeugen; mit port=0 sucht sich das System einen freien Port aus
+# (server.server_address[1]).
+# ----------------------------------------------------------------------------
+def create_server(host="127.0.0.1", port=8808, settings=None):
+    handler = type("Handler", (MockHandler,), {
+        "settings": settings or MockSettings(), "threads": {}, "runs": {} })
+    server  = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+# ----------------------------------------------------------------------------
+# Server in einem Hintergrund-Thread starten (z.B. für loadgen.py); zurück
+# kommen der Server und die base_url für den OpenAI Client.
+# ----------------------------------------------------------------------------
+def start_background(settings=None, host="127.0.0.1", port=0):
+    server = create_server(host, port, settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="lokaler OpenAI Ersatz-Server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency", type=float, default=200, help="ms bis zum ersten Token")
+    parser.add_argument("--jitter", type=float, default=50, help="+/- ms auf die Wartezeit")
+    parser.add_argument("--token-rate", type=float, default=50, help="Token pro Sekunde")
+    parser.add_argument("--tokens", type=int, default=60, help="Token pro Antwort")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anteil 500er Fehler")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Anteil 429er Fehler")
+    parser.add_argument("--seed", type=int, help="Startwert für den Zufall")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Anfragen pro Minute")
+    parser.add_argument("--tpm-limit", type=int, default=0, help="Token pro Minute")
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(args.latency, args.jitter, args.token_rate, args.tokens,
+        args.error_rate, args.rate_limit_rate, args.seed, args.rpm_limit, args.tpm_limit)
+    server = create_server(args.host, args.port, settings)
+
+    print(f"OPENAI_BASE_URL=http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
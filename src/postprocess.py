@@ -0,0 +1,357 @@
+# ----------------------------------------------------------------------------
+# Datei:  postprocess.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Aufbereitung der Antworten des Assistenten für die Anzeige: Markdown (Über-
+# schriften, Listen, Tabellen, **fett**, `code`) wird zu HTML, Code-Blöcke
+# bekommen Farben (syntax highlighting), und Links - auch nackte URLs - wer-
+# den anklickbar.
+#
+# Bei langen Antworten (z.B. 5000 Zeilen Code) ist das viel Rechenarbeit. Sie
+# läuft deshalb nicht im GUI-Thread, sondern in einem Pool von Prozessen; bis
+# das Ergebnis da ist, zeigt der Chat den rohen Text. Ergebnisse werden nach
+# dem Hash des Inhalts zwischengespeichert (LRU).
+#
+# Hier wird kein Qt geladen - die Funktionen laufen in den Pool-Prozessen.
+# Ist das Paket "pygments" installiert, färbt es den Code; sonst tut es ein
+# einfacher Highlighter für die üblichen Sprachen.
+# ----------------------------------------------------------------------------
+import html          # escaping
+import os            # cpu count
+import re            # markdown, tokens
+import threading     # cache lock
+
+from collections        import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pygments  # syntax highlighting (optional)
+    from pygments            import highlight
+    from pygments.lexers     import get_lexer_by_name, guess_lexer
+    from pygments.formatters import HtmlFormatter
+    from pygments.util       import ClassNotFound
+except ImportError:
+    pygments = None
+
+INLINE_LIMIT        = 4000   # kürzere Texte werden direkt aufbereitet
+CACHE_SIZE          = 256    # aufbereitete Texte im Speicher
+MAX_HIGHLIGHT_LINES = 2000   # längere Code-Blöcke bleiben ohne Farben
+WORKERS             = 2
+
+# ----------------------------------------------------------------------------
+# Code-Blöcke einfärben ...
+# ----------------------------------------------------------------------------
+CODE_COLORS = {
+    "comment": "#6a737d",
+    "string" : "#22863a",
+    "number" : "#005cc5",
+    "keyword": "#d73a49",
+}
+
+KEYWORDS = frozenset("""
+    and as assert async await break case catch class const continue def default
+    del do elif else enum except export extends false False final finally for
+    from func function global if import in interface is lambda let match new
+    nil None nonlocal not null or package pass private protected public raise
+    return self static struct super switch this throw true True try type var
+    void while with yield
+""".split())
+
+CODE_TOKENS = re.compile(r'''
+      (?P<comment> \#[^\n]* | //[^\n]* | /\*.*?\*/ )
+    | (?P<string>  """.*?""" | \'\'\'.*?\'\'\' | "(?:\\.|[^"\\\n])*" | '(?:\\.|[^'\\\n])*' )
+    | (?P<number>  \b\d+(?:\.\d+)?\b )
+    | (?P<word>    \b[A-Za-z_]\w*\b )
+''', re.S | re.X)
+
+def highlight_simple(code):
+    parts = []
+    last  = 0
+    for match in CODE_TOKENS.finditer(code):
+        kind = match.lastgroup
+        if kind == "word":
+            if match.group() not in KEYWORDS:
+                continue
+            kind = "keyword"
+        parts.append(html.escape(code[last:match.start()]))
+        parts.append(f'<span style="color:{CODE_COLORS[kind]}">'
+            + html.escape(match.group()) + "</span>")
+        last = match.end()
+    parts.append(html.escape(code[last:]))
+    return "".join(parts)
+
+def highlight_code(code, language=""):
+    if code.count("\n") > MAX_HIGHLIGHT_LINES:
+        return html.escape(code)
+
+    if pygments is not None:
+        try:
+            lexer = get_lexer_by_name(language) if language else guess_lexer(code)
+        except ClassNotFound:
+            lexer = None
+        if lexer is not None:
+            return highlight(code, lexer, HtmlFormatter(nowrap=True, noclasses=True))
+    return highlight_simple(code)
+
+# ----------------------------------------------------------------------------
+# Text innerhalb einer Zeile: `code`, [Text](URL), nackte URLs, **fett** und
+# *kursiv*. Code und Links werden zuerst durch Platzhalter ersetzt, damit
+# darin nichts weiter umgewandelt wird.
+# ----------------------------------------------------------------------------
+URL = re.compile(r"\bhttps?://[^\s<>()\[\]]+[^\s<>()\[\].,;:!?'\"]")
+
+def extract_links(text):
+    return list(dict.fromkeys(match.group() for match in URL.finditer(text)))
+
+def inline(text):
+    saved = []
+
+    def keep(fragment):
+        saved.append(fragment)
+        return f"\x00{len(saved) - 1}\x00"
+
+    def link(url, label):
+        return keep(f'<a href="{html.escape(url, quote=True)}">{label}</a>')
+
+    text = re.sub(r"`([^`]+)`", lambda match: keep(
+        "<code>" + html.escape(match.group(1)) + "</code>"), text)
+    text = re.sub(r"\[([^\]]+)\]\((https?://[^)\s]+)\)", lambda match: link(
+        match.group(2), html.escape(match.group(1))), text)
+    text = URL.sub(lambda match: link(match.group(), html.escape(match.group())), text)
+
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\*\*(.+?)\*\*|__(.+?)__", lambda match:
+        "<b>" + (match.group(1) or match.group(2)) + "</b>", text)
+    text = re.sub(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?!\w)", r"<i>\1</i>", text)
+    text = re.sub(r"(?<!\w)_(?!\s)(.+?)(?<!\s)_(?!\w)", r"<i>\1</i>", text)
+
+    return re.sub(r"\x00(\d+)\x00", lambda match: saved[int(match.group(1))], text)
+
+# ----------------------------------------------------------------------------
+# Markdown-Tabellen:
+#
+#    | Name | Wert |
+#    |------|-----:|
+#    | a    |    1 |
+#
+# Wie bei GFM reicht ein "-" pro Zelle ("|---|--:|", "|:-|:-:|"), und Kopf-
+# und Trenn-Zeile müssen gleich viele Zellen haben.
+# ----------------------------------------------------------------------------
+TABLE_RULE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+def table_cells(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [ cell.strip() for cell in line.split("|") ]
+
+def render_table(header, rule, rows):
+    aligns = []
+    for cell in table_cells(rule):
+        if cell.startswith(":") and cell.endswith(":"):
+            aligns.append("center")
+        elif cell.endswith(":"):
+            aligns.append("right")
+        else:
+            aligns.append("left")
+
+    def row_html(cells, tag):
+        return "<tr>" + "".join(
+            f'<{tag} align="{aligns[number] if number < len(aligns) else "left"}">'
+            + inline(cell) + f"</{tag}>"
+            for number, cell in enumerate(cells)) + "</tr>"
+
+    return ('<table border="1" cellspacing="0" cellpadding="4">'
+        + row_html(table_cells(header), "th")
+        + "".join(row_html(table_cells(row), "td") for row in rows)
+        + "</table>")
+
+# ----------------------------------------------------------------------------
+# den ganzen Text (Markdown) zu HTML für QTextDocument.setHtml ...
+# ----------------------------------------------------------------------------
+LIST_ITEM = re.compile(r"^\s*(?:([-*+])|(\d+)[.)])\s+(.*)$")
+HEADING   = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE     = re.compile(r"^\s*(```|~~~)\s*([\w+#.-]*)")
+
+def render(text):
+    lines = text.split("\n")
+    out   = []
+    para  = []
+    items = None   # (Tag, [Einträge]) der offenen Liste
+
+    def close_paragraph():
+        if para:
+            out.append("<p>" + inline(" ".join(para)) + "</p>")
+            para.clear()
+
+    def close_list():
+        nonlocal items
+        if items is not None:
+            tag, entries = items
+            out.append(f"<{tag}>" + "".join(f"<li>{entry}</li>" for entry in entries)
+                + f"</{tag}>")
+            items = None
+
+    def close_all():
+        close_paragraph()
+        close_list()
+
+    number = 0
+    while number < len(lines):
+        line = lines[number]
+
+        fence = FENCE.match(line)
+        if fence:
+            close_all()
+            end = number + 1
+            while end < len(lines) and not lines[end].strip().startswith(fence.group(1)):
+                end += 1
+            code = "\n".join(lines[number + 1:end])
+            out.append('<pre style="background-color:#f6f8fa">'
+                + highlight_code(code, fence.group(2)) + "</pre>")
+            number = end + 1
+            continue
+
+        if "|" in line and number + 1 < len(lines) and TABLE_RULE.match(lines[number + 1]) \
+            and len(table_cells(line)) == len(table_cells(lines[number + 1])):
+            close_all()
+            end = number + 2
+            while end < len(lines) and "|" in lines[end] and lines[end].strip():
+                end += 1
+            out.append(render_table(line, lines[number + 1], lines[number + 2:end]))
+            number = end
+            continue
+
+        heading = HEADING.match(line)
+        item    = LIST_ITEM.match(line)
+        if not line.strip():
+            close_all()
+        elif heading:
+            close_all()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>" + inline(heading.group(2)) + f"</h{level}>")
+        elif line.startswith(">"):
+            close_all()
+            out.append("<blockquote>" + inline(line.lstrip("> ")) + "</blockquote>")
+        elif item:
+            close_paragraph()
+            tag = "ul" if item.group(1) else "ol"
+            if items is None or items[0] != tag:
+                close_list()
+                items = (tag, [])
+            items[1].append(inline(item.group(3)))
+        elif items is not None and line.startswith((" ", "\t")):
+            items[1][-1] += " " + inline(line.strip())
+        else:
+            close_list()
+            para.append(line.strip())
+        number += 1
+
+    close_all()
+    return "".join(out)
+
+# ----------------------------------------------------------------------------
+# das Ergebnis der Aufbereitung: HTML, und die Links im Text (jeder einmal,
+# in der Reihenfolge ihres Auftretens).
+# ----------------------------------------------------------------------------
+Processed = namedtuple("Processed", ("html", "links"))
+
+def process(text):
+    return Processed(render(text), extract_links(text))
+
+# ----------------------------------------------------------------------------
+# der Pool: request() liefert das Ergebnis (Processed), wenn es schon da ist
+# (bzw. bei kurzen Texten sofort berechnet werden kann); sonst None, und
+# "callback(key, result)" wird später aufgerufen - aus einem Thread des
+# Pools, nicht aus dem GUI-Thread. Schlägt die Aufbereitung fehl, ist
+# "result" None.
+# ----------------------------------------------------------------------------
+class PostProcessor:
+    def __init__(self, workers=None, inline_limit=INLINE_LIMIT, cache_size=CACHE_SIZE):
+        self.workers      = workers or min(WORKERS, os.cpu_count() or 1)
+        self.inline_limit = inline_limit
+        self.cache_size   = cache_size
+        self.cache        = OrderedDict()   # key => Processed
+        self.waiting      = {}              # key => [callback, ...]
+        self.lock         = threading.Lock()
+        self.pool         = None
+
+    def cached(self, key):
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+            return result
+
+    def remember(self, key, result):
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def request(self, key, text, callback):
+        result = self.cached(key)
+        if result is not None:
+            return result
+
+        if len(text) <= self.inline_limit:
+            result = process(text)
+            self.remember(key, result)
+            return result
+
+        with self.lock:
+            if key in self.waiting:
+                self.waiting[key].append(callback)
+                return None
+            self.waiting[key] = [callback]
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            future = self.pool.submit(process, text)
+
+        future.add_done_callback(lambda future: self.done(key, future))
+        return None
+
+    def done(self, key, future):
+        if future.cancelled():   # beim Beenden (shutdown)
+            with self.lock:
+                self.waiting.pop(key, None)
+            return
+
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        if result is not None:
+            self.remember(key, result)
+
+        with self.lock:
+            callbacks = self.waiting.pop(key, [])
+        for callback in callbacks:
+            callback(key, result)
+
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+# ----------------------------------------------------------------------------
+# den PostProcessor nach config.ini ([postprocess]) anlegen; None, wenn er
+# ausgeschaltet ist.
+# ----------------------------------------------------------------------------
+def postprocessor_from_config(config):
+    if not config.getboolean("postprocess", "enabled", fallback=True):
+        return None
+
+    return PostProcessor(
+        workers      = config.getint("postprocess", "workers",      fallback=None),
+        inline_limit = config.getint("postprocess", "inline_limit", fallback=INLINE_LIMIT),
+        cache_size   = config.getint("postprocess", "cache_size",   fallback=CACHE_SIZE))
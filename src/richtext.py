@@ -0,0 +1,136 @@
+# ----------------------------------------------------------------------------
+# Datei:  richtext.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Die Antworten des Assistenten enthalten oft Markdown (Listen, **fett**,
+# Code-Blöcke). Ein QTextDocument daraus zu bauen (parsen) und es für eine
+# Breite umzubrechen (layout) ist teuer - und würde sonst bei jedem Zeichnen,
+# Scrollen und bei jeder Größen-Änderung des Fensters wiederholt.
+#
+# Der DocumentCache merkt sich deshalb:
+#
+#    Inhalt (hash)          => geparstes Dokument
+#    Inhalt (hash), Breite  => umgebrochenes Dokument und seine Höhe
+#
+# Beide mit fester Größe (LRU). Die Breite wird auf WIDTH_STEP Pixel abge-
+# rundet, damit beim Ziehen am Fenster-Rand nicht jedes Pixel ein neues
+# Layout braucht.
+#
+# Ein Inhalt ist reiner Text (PLAIN), Markdown (MARKDOWN), oder das fertige
+# HTML aus postprocess.py (HTML).
+# ----------------------------------------------------------------------------
+import hashlib       # content hash
+
+from collections import OrderedDict
+
+from PyQt5.QtGui     import QTextDocument, QAbstractTextDocumentLayout, QPalette
+from PyQt5.QtCore    import QRectF
+
+WIDTH_STEP     = 16
+PARSED_SIZE    = 512
+LAYOUT_SIZE    = 512
+TRANSIENT_SIZE = 8
+
+PLAIN    = "txt"
+MARKDOWN = "md"
+HTML     = "html"
+
+def content_key(text, kind):
+    return hashlib.sha1((kind + ":" + text).encode("utf-8")).digest()
+
+def layout_width(width):
+    return max(WIDTH_STEP, width - width % WIDTH_STEP)
+
+class DocumentCache:
+    def __init__(self, font, parsed_size=PARSED_SIZE, layout_size=LAYOUT_SIZE):
+        self.font        = font
+        self.parsed_size = parsed_size
+        self.layout_size = layout_size
+        self.parsed      = OrderedDict()   # key => QTextDocument
+        self.layouts     = OrderedDict()   # (key, breite) => (QTextDocument, höhe)
+        self.transient   = OrderedDict()   # wie layouts, für Text im Wandel
+
+    def set_font(self, font):
+        if font != self.font:
+            self.font = font
+            self.parsed .clear()
+            self.layouts.clear()
+            self.transient.clear()
+
+    def parse(self, text, kind):
+        document = QTextDocument()
+        document.setDefaultFont(self.font)
+        document.setDocumentMargin(0)
+        if kind == HTML:
+            document.setHtml(text)
+        elif kind == MARKDOWN:
+            document.setMarkdown(text)
+        else:
+            document.setPlainText(text)
+        return document
+
+    # ----------------------------------------
+    # geparstes Dokument zu einem Inhalt ...
+    # ----------------------------------------
+    def document(self, key, text, kind):
+        document = self.parsed.get(key)
+        if document is not None:
+            self.parsed.move_to_end(key)
+            return document
+
+        document = self.parse(text, kind)
+        self.parsed[key] = document
+        while len(self.parsed) > self.parsed_size:
+            self.parsed.popitem(last=False)
+        return document
+
+    # ----------------------------------------
+    # ... und für eine Breite umgebrochen;
+    # zurück kommen Dokument und Höhe.
+    #
+    # "transient" ist für Text, der sich noch
+    # ändert (eine gestreamte Antwort): jeder
+    # Zwischenstand würde sonst die fertigen
+    # Dokumente aus dem Cache verdrängen - sie
+    # landen in einem eigenen, kleinen Cache.
+    # ----------------------------------------
+    def layout(self, key, text, kind, width, transient=False):
+        width   = layout_width(width)
+        layouts = self.transient if transient else self.layouts
+        limit   = TRANSIENT_SIZE if transient else self.layout_size
+
+        cached = layouts.get((key, width))
+        if cached is not None:
+            layouts.move_to_end((key, width))
+            return cached
+
+        if transient:
+            document = self.parse(text, kind)
+        else:
+            document = self.document(key, text, kind).clone()
+        document.setTextWidth(width)
+
+        cached = (document, int(document.size().height() + 0.5))
+        layouts[(key, width)] = cached
+        while len(layouts) > limit:
+            layouts.popitem(last=False)
+        return cached
+
+    # ----------------------------------------
+    # Dokument an "rect" (QRect) zeichnen ...
+    # ----------------------------------------
+    def draw(self, painter, document, rect, color):
+        painter.save()
+        painter.translate(rect.topLeft())
+
+        context = QAbstractTextDocumentLayout.PaintContext()
+        context.palette.setColor(QPalette.Text, color)
+        context.clip = QRectF(0, 0, rect.width(), rect.height())
+        document.documentLayout().draw(painter, context)
+
+        painter.restore()
@@ -0,0 +1,199 @@
+# ----------------------------------------------------------------------------
+# Datei:  scheduler.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# OpenAI begrenzt Anfragen pro Minute (RPM) und Token pro Minute (TPM). Statt
+# blind zu senden und 429-Fehler zu kassieren, holt sich jede Anfrage vorher
+# eine Freigabe beim RateLimitScheduler:
+#
+#    - zwei "Token-Eimer" (token bucket) für RPM und TPM, die gleichmäßig
+#      nachlaufen; Größe und Füllstand werden aus den x-ratelimit-* Headern
+#      der Antworten nachgestellt.
+#    - zwei Spuren: Eingaben im Chat-Fenster (LANE_INTERACTIVE) kommen immer
+#      vor Hintergrund-Arbeit (LANE_BATCH) dran, und für sie bleibt ein Teil
+#      des Kontingents frei (batch_reserve).
+#    - nach einem 429 (oder Server-Fehler) wird mit zufälliger Streuung
+#      (jitter) exponentiell länger gewartet; bei 429 pausieren alle Spuren.
+# ----------------------------------------------------------------------------
+import heapq         # waiting queue ordered by lane
+import itertools     # ticket counter
+import random        # jitter
+import re            # reset durations
+import threading     # condition variable
+import time          # monotonic clock
+
+LANE_INTERACTIVE = 0   # Chat-Eingaben des Benutzers
+LANE_BATCH       = 1   # Zusammenfassungen, batch.py, ...
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 60000
+
+BACKOFF_BASE = 0.5    # Sekunden
+BACKOFF_MAX  = 30.0   # Sekunden
+
+class CancelledError(Exception):
+    pass
+
+# ----------------------------------------------------------------------------
+# ein Eimer, der mit "rate" Einheiten pro Sekunde bis "capacity" nachläuft.
+# ----------------------------------------------------------------------------
+class TokenBucket:
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.rate     = capacity / 60.0
+        self.level    = float(capacity)
+        self.stamp    = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_limit(self, capacity):
+        self.capacity = float(capacity)
+        self.rate     = capacity / 60.0
+        self.level    = min(self.level, self.capacity)
+
+    # ----------------------------------------
+    # Sekunden, bis "amount" entnommen werden
+    # kann, ohne unter "reserve" (Anteil der
+    # Kapazität) zu fallen.
+    # ----------------------------------------
+    def wait_time(self, amount, reserve=0.0):
+        keep   = self.capacity * reserve
+        amount = min(amount, self.capacity - keep)
+        short  = amount + keep - self.level
+        if short <= 0:
+            return 0.0
+        return short / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+# ----------------------------------------------------------------------------
+# "6m0s", "1.5s", "20ms" => Sekunden ...
+# ----------------------------------------------------------------------------
+def parse_duration(text):
+    if not text:
+        return None
+    total = 0.0
+    for value, unit in re.findall(r"([\d.]+)(ms|h|m|s)", text):
+        total += float(value) * { "ms": 0.001, "s": 1, "m": 60, "h": 3600 }[unit]
+    return total
+
+class RateLimitScheduler:
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, batch_reserve=0.2):
+        self.condition     = threading.Condition()
+        self.requests      = TokenBucket(rpm)
+        self.tokens        = TokenBucket(tpm)
+        self.batch_reserve = batch_reserve
+        self.waiting       = []   # heap von (lane, ticket)
+        self.counter       = itertools.count()
+        self.paused_until  = 0.0
+
+    def configure(self, rpm=None, tpm=None, batch_reserve=None):
+        with self.condition:
+            if rpm:
+                self.requests.set_limit(rpm)
+            if tpm:
+                self.tokens.set_limit(tpm)
+            if batch_reserve is not None:
+                self.batch_reserve = batch_reserve
+            self.condition.notify_all()
+
+    # ----------------------------------------
+    # Freigabe für eine Anfrage mit (geschätzt)
+    # "tokens" Token holen - blockiert, bis
+    # die Anfrage an der Reihe ist.
+    # ----------------------------------------
+    def acquire(self, tokens, lane=LANE_INTERACTIVE, cancelled=None):
+        ticket = (lane, next(self.counter))
+
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        raise CancelledError()
+
+                    now  = time.monotonic()
+                    wait = 0.25
+                    if self.waiting[0] == ticket:
+                        self.requests.refill(now)
+                        self.tokens  .refill(now)
+
+                        reserve = 0.0 if lane == LANE_INTERACTIVE else self.batch_reserve
+                        wait    = max(self.paused_until - now,
+                            self.requests.wait_time(1, reserve),
+                            self.tokens  .wait_time(tokens, reserve))
+                        if wait <= 0:
+                            self.requests.take(1)
+                            self.tokens  .take(tokens)
+                            return
+
+                    self.condition.wait(min(wait, 0.25))
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    # ----------------------------------------
+    # geschätzte gegen tatsächlich verbrauchte
+    # Token verrechnen ...
+    # ----------------------------------------
+    def settle(self, estimated, actual):
+        if actual is None:
+            return
+        with self.condition:
+            self.tokens.level = min(self.tokens.capacity,
+                self.tokens.level + estimated - actual)
+            self.condition.notify_all()
+
+    # ----------------------------------------
+    # Grenzen und Füllstand aus den Headern
+    # einer Antwort übernehmen ...
+    # ----------------------------------------
+    def update_from_headers(self, headers):
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        with self.condition:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit     = number(f"x-ratelimit-limit-{kind}")
+                remaining = number(f"x-ratelimit-remaining-{kind}")
+                reset     = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+
+                if limit and limit != bucket.capacity:
+                    bucket.set_limit(limit)
+                if remaining is not None:
+                    bucket.refill(time.monotonic())
+                    bucket.level = min(bucket.level, remaining)
+                    if reset and remaining < bucket.capacity:
+                        bucket.rate = max(bucket.rate,
+                            (bucket.capacity - remaining) / reset)
+            self.condition.notify_all()
+
+    # ----------------------------------------
+    # Wartezeit vor der nächsten Wiederholung:
+    # exponentiell, mit "full jitter". Ein
+    # Retry-After vom Server hat Vorrang. Bei
+    # 429 pausieren alle Spuren so lange.
+    # ----------------------------------------
+    def backoff(self, attempt, retry_after=None, rate_limited=False):
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.25 * retry_after + 0.1)
+        else:
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+        if rate_limited:
+            with self.condition:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                self.condition.notify_all()
+        return delay
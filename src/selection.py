@@ -0,0 +1,37 @@
+# ----------------------------------------------------------------------------
+# Datei:  selection.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Die Häkchen der beiden ListBoxen werden nicht pro Zeile gespeichert, sondern
+# als "alle an/aus" plus die Menge der Ausnahmen. "Alles auswählen" ändert
+# damit nur ein einziges Flag - egal wie viele Zeilen es gibt, und auch für
+# Zeilen, die noch gar nicht aus der Datenbank geladen wurden.
+# ----------------------------------------------------------------------------
+class CheckSelection:
+    def __init__(self):
+        self.all     = False   # Grundzustand aller Zeilen
+        self.toggled = set()   # Zeilen (Schlüssel), die davon abweichen
+
+    def set_all(self, checked):
+        self.all = checked
+        self.toggled.clear()
+
+    def is_checked(self, key):
+        return self.all != (key in self.toggled)
+
+    def set_checked(self, key, checked):
+        if checked == self.all:
+            self.toggled.discard(key)
+        else:
+            self.toggled.add(key)
+
+    def forget(self, key):
+        self.toggled.discard(key)
+
+    def any(self):
+        return self.all or bool(self.toggled)
@@ -0,0 +1,360 @@
+# ----------------------------------------------------------------------------
+# Datei:  semcache.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Semantischer Cache: viele Fragen werden mit anderen Worten gleich gestellt
+# ("Was ist eine Schleife?" - "Was ist in Python eine Schleife") - der Cache in
+# cache.py findet dafür nichts, weil der Schlüssel ein Hash über den genauen
+# Text ist. Hier wird die Frage deshalb in einen Vektor umgerechnet (embed);
+# ist ein gespeicherter Vektor ähnlich genug (Kosinus-Ähnlichkeit >= threshold),
+# und passen die Wörter der beiden Fragen zusammen (same_question), kommt die
+# dazu gespeicherte Antwort.
+#
+# Die Vektoren liegen pro Modell (und Embedder) in einer NumPy Matrix, die als
+# Datei in den Speicher abgebildet wird (memmap, data/semantic/...). Die Suche
+# ist eine einzige Matrix-Multiplikation plus Auswahl der k besten Zeilen -
+# schnell genug für jede Anfrage. Fragen und Antworten stehen in der Tabelle
+# "semantic_cache" der Anwendungs-Datenbank.
+#
+# Es werden nur Fragen ohne vorherigen Verlauf beachtet: mitten in einem
+# Gespräch hängt die Antwort vom Verlauf ab, nicht nur von der Frage.
+#
+# Das Paket "numpy" ist optional - ohne numpy gibt es keinen semantischen
+# Cache. Eingeschaltet wird er in config.ini, Abschnitt [semantic]; erst dann
+# wird numpy geladen (das kostet Zeit und Speicher beim Start).
+# ----------------------------------------------------------------------------
+import hashlib       # feature hashing
+import os            # operating system stuff
+import re            # words
+import time          # timestamps
+
+numpy = None   # vectors (optional, load_numpy)
+
+EMBED_DIM     = 256
+THRESHOLD     = 0.6     # kalibriert für den HashingEmbedder (s. config.ini)
+TOP_K         = 5
+MAX_ENTRIES   = 100000
+GROW_ROWS     = 1024    # um so viele Zeilen wächst die Matrix-Datei
+MAX_EXTRA     = 1       # so viele Wörter darf eine Frage mehr haben
+WORD_MATCH    = 0.6     # ab dieser Ähnlichkeit (Dice) gelten Wörter als gleich
+
+# ----------------------------------------------------------------------------
+# Füllwörter ("was", "ist", "eine", "how", "the", ...) sagen nichts über das
+# Thema einer Frage - sie werden weder in den Vektor, noch beim Vergleich der
+# Wörter beachtet. Verneinungen ("nicht", "kein", "not", ...) gehören nicht
+# dazu: sie drehen den Sinn einer Frage um.
+# ----------------------------------------------------------------------------
+STOPWORDS = frozenset('''
+    a an and are can could do does explain how i in is it me my of on please
+    tell the to what which why with you your
+    aber alle als am an auch auf aus bei bitte bin bist da das dass dem den der
+    des die dir du ein eine einem einen einer eines eigentlich er es für gibt
+    hat ich ihr im in ist ja kann kannst man mir mit nach noch oder sich
+    sie sind so und uns von was welche welcher welches wie wir wird zu zum zur
+    zwischen
+'''.split())
+
+NEGATIONS = frozenset('''
+    no none never nobody nothing not without
+    kein keine keinem keinen keiner keines nicht nichts nie niemals niemand
+    ohne
+'''.split())
+
+def content_words(text):
+    return [ word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS ]
+
+def word_trigrams(word):
+    padded = f"<{word}>"
+    return { padded[start:start + 3] for start in range(len(padded) - 2) }
+
+def similar_words(first, second):
+    first, second = word_trigrams(first), word_trigrams(second)
+    return 2 * len(first & second) / (len(first) + len(second)) >= WORD_MATCH
+
+# ----------------------------------------------------------------------------
+# Ähnliche Vektoren allein reichen nicht: "Liste sortieren in Python" und
+# "... in Java" sind sich ähnlicher als manche Umformulierung. Zwei Fragen
+# gelten deshalb nur dann als gleich, wenn keine ein Wort enthält, das in der
+# anderen fehlt, während die andere ihrerseits ein eigenes Wort hat (ein Wort
+# ausgetauscht: Python/Java, addiert/multipliziert) - und wenn eine höch-
+# stens MAX_EXTRA Wörter mehr hat ("Was ist [in Python] eine Schleife?").
+# Gebeugte Formen ("Schleife"/"Schleifen") zählen als dasselbe Wort.
+#
+# Verneinungen und Zahlen (bzw. Wörter mit Ziffern: "python3") sind davon
+# ausgenommen - sie müssen in beiden Fragen genau gleich vorkommen, und
+# zählen nie als zusätzliches Wort ("Was ist 12 mal 12" / "... 12 mal 13").
+# ----------------------------------------------------------------------------
+def is_exact(word):
+    return word in NEGATIONS or any(char.isdigit() for char in word)
+
+def same_question(first, second, max_extra=MAX_EXTRA):
+    first, second = content_words(first), content_words(second)
+    if sorted(word for word in first  if is_exact(word)) \
+    != sorted(word for word in second if is_exact(word)):
+        return False
+
+    first  = { word for word in first  if not is_exact(word) }
+    second = { word for word in second if not is_exact(word) }
+    only_first  = [ word for word in first
+        if not any(similar_words(word, other) for other in second) ]
+    only_second = [ word for word in second
+        if not any(similar_words(word, other) for other in first) ]
+
+    if only_first and only_second:
+        return False
+    return len(only_first) + len(only_second) <= max_extra
+
+# ----------------------------------------------------------------------------
+# ein lokaler Embedder ohne Netzwerk und ohne Modell-Datei ("hashing trick"):
+# Wörter, Wort-Paare und Buchstaben-Tripel (ohne Füllwörter) werden per Hash
+# auf eine der "dim" Spalten abgebildet (mit Vorzeichen, damit sich Kolli-
+# sionen aufheben), der Vektor wird danach auf die Länge 1 gebracht. Die
+# Buchstaben-Tripel machen ihn robust gegen Beugungen und Tippfehler
+# ("Schleife" / "Schleifen"); Wort-Paare zählen wenig, weil Umformulierungen
+# oft die Reihenfolge ändern.
+#
+# Ein anderer Embedder braucht nur "name", "dim" und embed(text) => Vektor
+# der Länge 1 (numpy float32), und kann in EMBEDDERS eingetragen werden.
+# Ändern sich die Merkmale, braucht er einen neuen "name" - sonst passen die
+# gespeicherten Vektoren nicht mehr.
+# ----------------------------------------------------------------------------
+class HashingEmbedder:
+    name = "hashing-v3"
+
+    def __init__(self, dim=EMBED_DIM):
+        self.dim = dim
+        load_numpy()
+
+    def features(self, text):
+        words = content_words(text)
+        for word in words:
+            yield "w:" + word, 1.0
+            for trigram in word_trigrams(word):
+                yield "c:" + trigram, 0.5
+        for first, second in zip(words, words[1:]):
+            yield "b:" + first + " " + second, 0.25
+
+    def embed(self, text):
+        vector = numpy.zeros(self.dim, dtype=numpy.float32)
+        for feature, weight in self.features(text):
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"),
+                digest_size=8).digest(), "little")
+            vector[value % self.dim] += weight if value >> 63 else -weight
+
+        norm = numpy.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+# ----------------------------------------------------------------------------
+# numpy erst bei Bedarf laden; None, wenn es nicht installiert ist.
+# ----------------------------------------------------------------------------
+def load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        numpy = module
+    return numpy
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+}
+
+# ----------------------------------------------------------------------------
+# die Frage, nach der gesucht wird: die letzte Benutzer-Nachricht - sofern es
+# davor keine Benutzer- oder Assistenten-Nachrichten gibt, sonst None.
+# ----------------------------------------------------------------------------
+def standalone_question(messages):
+    dialog = [ message for message in messages if message["role"] != "system" ]
+    if len(dialog) != 1 or dialog[0]["role"] != "user":
+        return None
+    return f"{dialog[0]['content']}".strip() or None
+
+class SemanticCache:
+    def __init__(self, conn, directory,
+        embedder    = None,
+        threshold   = THRESHOLD,
+        top_k       = TOP_K,
+        max_entries = MAX_ENTRIES):
+
+        self.conn        = conn
+        self.directory   = directory
+        self.embedder    = embedder or HashingEmbedder()
+        self.threshold   = threshold
+        self.top_k       = top_k
+        self.max_entries = max_entries
+        self.spaces      = {}     # model => [Matrix (memmap), Anzahl Zeilen]
+        self.last        = None   # (model, Frage, Vektor) der letzten Suche
+        self.hits        = 0
+        self.misses      = 0
+
+        load_numpy()
+        os.makedirs(directory, exist_ok=True)
+
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                space    TEXT    NOT NULL,
+                row      INTEGER NOT NULL,
+                question TEXT    NOT NULL,
+                response TEXT    NOT NULL,
+                created  REAL,
+                PRIMARY KEY (space, row)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS semantic_cache_created
+            ON semantic_cache (space, created)
+        ''')
+        self.conn.commit()
+
+    # ----------------------------------------
+    # Modell + Embedder: nur Vektoren aus dem-
+    # selben Raum sind vergleichbar.
+    # ----------------------------------------
+    def space_name(self, model):
+        return f"{model}:{self.embedder.name}:{self.embedder.dim}"
+
+    def space(self, model):
+        space = self.spaces.get(model)
+        if space is not None:
+            return space
+
+        name  = self.space_name(model)
+        path  = os.path.join(self.directory,
+            re.sub(r"[^\w.-]", "_", name) + ".f32")
+        count = self.conn.execute(
+            "SELECT COALESCE(MAX(row) + 1, 0) FROM semantic_cache WHERE space = ?",
+            (name,)).fetchone()[0]
+
+        # ----------------------------------------
+        # fehlt die Datei (oder ist sie zu kurz),
+        # passen die Zeilen nicht mehr zusammen -
+        # dann wird neu begonnen.
+        # ----------------------------------------
+        row_bytes = self.embedder.dim * 4
+        size      = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < count * row_bytes:
+            with self.conn:
+                self.conn.execute("DELETE FROM semantic_cache WHERE space = ?", (name,))
+            count = 0
+            size  = 0
+
+        rows  = max(size // row_bytes, GROW_ROWS)
+        space = [self.open_matrix(path, rows), count]
+        self.spaces[model] = space
+        return space
+
+    def open_matrix(self, path, rows):
+        return numpy.memmap(path, dtype=numpy.float32,
+            mode = "r+" if os.path.exists(path) else "w+",
+            shape = (rows, self.embedder.dim))
+
+    def vector(self, model, question):
+        if self.last is not None and self.last[:2] == (model, question):
+            return self.last[2]
+        vector = self.embedder.embed(question)
+        self.last = (model, question, vector)
+        return vector
+
+    # ----------------------------------------
+    # die k ähnlichsten Zeilen, die beste zu-
+    # erst: Liste von (Zeile, Ähnlichkeit).
+    # ----------------------------------------
+    def search(self, model, vector, k=None):
+        matrix, count = self.space(model)
+        if count == 0:
+            return []
+
+        k      = min(k or self.top_k, count)
+        scores = matrix[:count] @ vector
+        best   = numpy.argpartition(-scores, k - 1)[:k]
+        best   = best[numpy.argsort(-scores[best])]
+        return [ (int(row), float(scores[row])) for row in best ]
+
+    # ----------------------------------------
+    # Antwort suchen: (Antwort, Ähnlichkeit),
+    # oder None.
+    # ----------------------------------------
+    def lookup(self, model, messages):
+        question = standalone_question(messages)
+        if question is None:
+            return None
+
+        name = self.space_name(model)
+        for row, score in self.search(model, self.vector(model, question)):
+            if score < self.threshold:
+                break
+            found = self.conn.execute(
+                "SELECT question, response FROM semantic_cache WHERE space = ? AND row = ?",
+                (name, row)).fetchone()
+            if found is not None and same_question(question, found[0]):
+                self.hits += 1
+                return found[1], score
+
+        self.misses += 1
+        return None
+
+    # ----------------------------------------
+    # Antwort speichern. Ist der Cache voll,
+    # wird die älteste Zeile überschrieben.
+    # ----------------------------------------
+    def put(self, model, messages, response):
+        question = standalone_question(messages)
+        if question is None or not response:
+            return
+
+        name   = self.space_name(model)
+        vector = self.vector(model, question)
+        space  = self.space(model)
+        matrix, count = space
+
+        if count >= self.max_entries:
+            row = self.conn.execute('''
+                SELECT row FROM semantic_cache WHERE space = ?
+                ORDER BY created LIMIT 1
+            ''', (name,)).fetchone()[0]
+        else:
+            row = count
+            if row >= matrix.shape[0]:
+                matrix.flush()
+                matrix = self.open_matrix(matrix.filename, matrix.shape[0] + GROW_ROWS)
+                space[0] = matrix
+            space[1] = count + 1
+
+        matrix[row] = vector
+        matrix.flush()
+        with self.conn:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO semantic_cache (space, row, question, response, created)
+                VALUES (?,?,?,?,?)
+            ''', (name, row, question, response, time.time()))
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+# ----------------------------------------------------------------------------
+# den Cache nach config.ini ([semantic]) anlegen; None, wenn er ausgeschaltet
+# ist, oder numpy fehlt.
+# ----------------------------------------------------------------------------
+def semantic_cache_from_config(conn, config, directory):
+    if not config.getboolean("semantic", "enabled", fallback=False) or load_numpy() is None:
+        return None
+
+    embedder = EMBEDDERS[config.get("semantic", "embedder", fallback="hashing")](
+        config.getint("semantic", "dim", fallback=EMBED_DIM))
+    return SemanticCache(conn, directory,
+        embedder    = embedder,
+        threshold   = config.getfloat("semantic", "threshold",   fallback=THRESHOLD),
+        top_k       = config.getint  ("semantic", "top_k",       fallback=TOP_K),
+        max_entries = config.getint  ("semantic", "max_entries", fallback=MAX_ENTRIES))
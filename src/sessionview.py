@@ -0,0 +1,313 @@
+# ----------------------------------------------------------------------------
+# Datei:  sessionview.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Die Session-Liste (linke ListBox) nach dem Model/View Prinzip. Beim Start
+# wird nur die erste Seite (eine Bildschirm-Höhe) aus der Datenbank geladen;
+# weitere Seiten holt Qt selbst über canFetchMore/fetchMore, sobald der
+# Benutzer an das Ende der Liste scrollt.
+#
+# Mit set_filter zeigt die Liste nur Sessions, deren Name mit einem Text be-
+# ginnt - die Seiten kommen dann aus dem SessionCatalog (catalog.py) statt
+# aus der Datenbank, nach Namen sortiert.
+# ----------------------------------------------------------------------------
+from bisect import bisect_left
+
+from PyQt5.QtWidgets import QStyle, QStyledItemDelegate, QStyleOptionButton
+from PyQt5.QtGui     import QFont, QFontMetrics, QPalette
+from PyQt5.QtCore    import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent
+from PyQt5.QtCore    import pyqtSignal
+
+from catalog   import name_key
+from database  import session_page
+from selection import CheckSelection
+
+SessionIdRole = Qt.UserRole + 1
+
+# ----------------------------------------------------------------------------
+# eine Session in der Liste ...
+# ----------------------------------------------------------------------------
+class SessionEntry:
+    __slots__ = ("session_id", "date_str", "time_str", "name")
+
+    def __init__(self, session_id, date_str, time_str, name):
+        self.session_id = session_id
+        self.date_str   = date_str
+        self.time_str   = time_str
+        self.name       = name
+
+# ----------------------------------------------------------------------------
+# das Model für die linke ListBox ...
+# ----------------------------------------------------------------------------
+class SessionListModel(QAbstractListModel):
+    def __init__(self, conn, page_size=50, parent=None):
+        super(SessionListModel, self).__init__(parent)
+        self.conn      = conn
+        self.page_size = page_size
+        self.sessions  = []
+        self.more      = True
+        self.checks    = CheckSelection()   # Schlüssel: die session_id
+        self.catalog   = None               # SessionCatalog, bei aktivem Filter
+        self.prefix    = None               # Filter: Anfang des Namens
+
+        self.fetchMore()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.sessions)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        entry = self.sessions[index.row()]
+
+        if role == Qt.DisplayRole:
+            return entry.name
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self.checks.is_checked(entry.session_id) else Qt.Unchecked
+        if role == SessionIdRole:
+            return entry.session_id
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.CheckStateRole:
+            return False
+
+        self.checks.set_checked(self.sessions[index.row()].session_id, value == Qt.Checked)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    # ----------------------------------------
+    # seitenweises Nachladen (keyset pagina-
+    # tion) - wird von der View aufgerufen.
+    # ----------------------------------------
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.more:
+            return
+
+        last = self.sessions[-1] if self.sessions else None
+        if self.prefix is not None:
+            after = (name_key(last.name), last.session_id) if last else None
+            rows  = self.catalog.page(self.prefix, self.page_size, after)
+        else:
+            after = (last.date_str, last.time_str, last.session_id) if last else None
+            rows  = session_page(self.conn, self.page_size, after)
+        if len(rows) < self.page_size:
+            self.more = False
+        if not rows:
+            return
+
+        first = len(self.sessions)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.sessions.extend(SessionEntry(*row) for row in rows)
+        self.endInsertRows()
+
+    def matches(self, name):
+        return self.prefix is None or name_key(name).startswith(name_key(self.prefix))
+
+    # ----------------------------------------
+    # neue Session einfügen: ohne Filter oben,
+    # mit Filter nach Namen einsortiert - und
+    # nur, wenn der Filter sie zeigt. Gehört
+    # sie hinter die bisher geladenen Zeilen,
+    # kommt sie mit der nächsten Seite.
+    # ----------------------------------------
+    def insert_session(self, session_id, date_str, time_str, name):
+        if self.prefix is None:
+            row = 0
+        elif not self.matches(name):
+            return
+        else:
+            keys = [ (name_key(entry.name), entry.session_id) for entry in self.sessions ]
+            row  = bisect_left(keys, (name_key(name), session_id))
+            if row == len(self.sessions) and self.more:
+                return
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.sessions.insert(row, SessionEntry(session_id, date_str, time_str, name))
+        self.endInsertRows()
+
+    # ----------------------------------------
+    # Liste neu von der ersten Seite laden
+    # (z.B. nach einem Import) ...
+    # ----------------------------------------
+    def reload(self):
+        self.beginResetModel()
+        self.sessions = []
+        self.more     = True
+        self.checks.set_all(False)
+        self.endResetModel()
+        self.fetchMore()
+
+    # ----------------------------------------
+    # nur Sessions zeigen, deren Name mit
+    # "prefix" beginnt; ein leerer Text zeigt
+    # wieder alle.
+    # ----------------------------------------
+    def set_filter(self, catalog, prefix):
+        self.catalog = catalog
+        self.prefix  = prefix or None
+        self.reload()
+
+    def remove_row(self, row):
+        if row < 0 or row >= len(self.sessions):
+            return False
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.checks.forget(self.sessions[row].session_id)
+        del self.sessions[row]
+        self.endRemoveRows()
+        return True
+
+    # ----------------------------------------
+    # alle markierten Sessions auf einmal aus
+    # der Liste entfernen; zurück kommen die
+    # entfernten Einträge.
+    # ----------------------------------------
+    def remove_checked(self):
+        if not self.checks.any():
+            return []
+
+        keep, removed = [], []
+        for entry in self.sessions:
+            (removed if self.checks.is_checked(entry.session_id) else keep).append(entry)
+
+        self.beginResetModel()
+        self.sessions = keep
+        self.checks.set_all(False)
+        self.endResetModel()
+        return removed
+
+    def set_all_checked(self, checked):
+        self.checks.set_all(checked)
+        if not self.sessions:
+            return
+
+        self.dataChanged.emit(
+            self.index(0),
+            self.index(len(self.sessions) - 1),
+            [Qt.CheckStateRole])
+
+# ----------------------------------------------------------------------------
+# zeichnet eine Session-Zeile wie das frühere SessionDatabaseListBoxWidget:
+#
+#    +---------------------------------+
+#    | [x]  2023-12-15  20:33:00 [DEL] |
+#    | Name der Session                |
+#    +---------------------------------+
+#
+# Alle Zeilen sind gleich hoch - die View muss daher für das Layout nicht
+# jede Zeile einzeln vermessen.
+# ----------------------------------------------------------------------------
+class SessionItemDelegate(QStyledItemDelegate):
+    delete_clicked = pyqtSignal(int)
+
+    margin       = 4
+    spacing      = 2
+    button_width = 50
+
+    def __init__(self, view):
+        super(SessionItemDelegate, self).__init__(view)
+        self.view = view
+
+    def line_height(self, option):
+        return QFontMetrics(option.font).height() + 6
+
+    def checkbox_rect(self, option):
+        size = self.view.style().pixelMetric(QStyle.PM_IndicatorWidth)
+        top  = option.rect.top() + self.margin + (self.line_height(option) - size) // 2
+        return QRect(option.rect.left() + self.margin, top, size, size)
+
+    def button_rect(self, option):
+        return QRect(
+            option.rect.right() - self.margin - self.button_width,
+            option.rect.top() + self.margin,
+            self.button_width, self.line_height(option))
+
+    def sizeHint(self, option, index):
+        return QSize(self.view.viewport().width(),
+            self.margin + 2 * self.line_height(option) + self.spacing + self.margin)
+
+    def paint(self, painter, option, index):
+        entry = index.model().sessions[index.row()]
+        style = self.view.style()
+
+        painter.save()
+        style.drawPrimitive(QStyle.PE_PanelItemViewItem, option, painter, self.view)
+
+        check_option = QStyleOptionButton()
+        check_option.rect  = self.checkbox_rect(option)
+        check_option.state = QStyle.State_Enabled | \
+            (QStyle.State_On if index.model().checks.is_checked(entry.session_id)
+             else QStyle.State_Off)
+        style.drawControl(QStyle.CE_CheckBox, check_option, painter, self.view)
+
+        button_option = QStyleOptionButton()
+        button_option.rect  = self.button_rect(option)
+        button_option.text  = "DEL"
+        button_option.state = QStyle.State_Enabled | QStyle.State_Raised
+        style.drawControl(QStyle.CE_PushButton, button_option, painter, self.view)
+
+        line = self.line_height(option)
+        left = self.checkbox_rect(option).right() + self.margin
+
+        painter.setFont(option.font)
+        painter.setPen(option.palette.color(QPalette.Text))
+        painter.drawText(
+            QRect(left, option.rect.top() + self.margin,
+                  self.button_rect(option).left() - left, line),
+            Qt.AlignLeft | Qt.AlignVCenter,
+            entry.date_str + "  " + entry.time_str)
+
+        bold_font = QFont(option.font)
+        bold_font.setBold(True)
+        painter.setFont(bold_font)
+        painter.drawText(
+            QRect(option.rect.left() + self.margin,
+                  option.rect.top() + self.margin + line + self.spacing,
+                  option.rect.width() - 2 * self.margin, line),
+            Qt.AlignLeft | Qt.AlignVCenter,
+            entry.name)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease,
+                                QEvent.MouseButtonDblClick):
+            return False
+
+        if event.button() != Qt.LeftButton:
+            return False
+
+        on_checkbox = self.checkbox_rect(option).contains(event.pos())
+        on_button   = self.button_rect  (option).contains(event.pos())
+
+        if not (on_checkbox or on_button):
+            return False
+
+        if event.type() == QEvent.MouseButtonRelease:
+            if on_checkbox:
+                state = index.data(Qt.CheckStateRole)
+                model.setData(index,
+                    Qt.Unchecked if state == Qt.Checked else Qt.Checked,
+                    Qt.CheckStateRole)
+            else:
+                self.delete_clicked.emit(index.row())
+        return True
@@ -0,0 +1,171 @@
+# ----------------------------------------------------------------------------
+# Datei:  singleflight.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Gleiche Anfragen zur gleichen Zeit (mehrfacher Klick auf "Senden", mehrere
+# Fenster, Batch-Arbeiter mit denselben Zeilen) gehen nur einmal an den
+# Server ("single flight"): wer eine Anfrage stellt, die gerade schon unter-
+# wegs ist, wartet auf deren Ergebnis - bzw. liest deren Stream mit.
+#
+#    flights = SingleFlight()
+#    result  = flights.call(key, lambda: ...)            => ein Ergebnis
+#    for part in flights.stream(key, lambda: iter(...)):  => ein Stream
+#
+# Der Schlüssel ist ein Hash über die Anfrage (cache.cache_key). Ist die An-
+# frage fertig, wird sie vergessen - das hier ist kein Cache.
+#
+# "joined(leader)" (optional) wird aufgerufen, sobald der Aufrufer dabei ist -
+# leader ist False, wenn er nur mitwartet bzw. mitliest.
+# ----------------------------------------------------------------------------
+import threading     # locks, conditions
+
+# ----------------------------------------------------------------------------
+# eine laufende Anfrage: ihr Ergebnis, bzw. die bisher gelesenen Teile ihres
+# Streams - jeder, der mitliest, bekommt alle Teile von Anfang an.
+# ----------------------------------------------------------------------------
+class Flight:
+    def __init__(self, start=None):
+        self.cond    = threading.Condition()
+        self.start   = start    # liefert den Stream (nur bei stream())
+        self.source  = None
+        self.parts   = []
+        self.result  = None
+        self.error   = None
+        self.done    = False
+        self.pumping = False    # liest gerade jemand den nächsten Teil?
+        self.readers = 0
+
+    def finish(self, result=None, error=None):
+        with self.cond:
+            self.result = result
+            self.error  = error
+            self.done   = True
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            while not self.done:
+                self.cond.wait()
+
+class SingleFlight:
+    def __init__(self):
+        self.lock      = threading.Lock()
+        self.flights   = {}   # key => Flight
+        self.coalesced = 0    # so viele Anfragen mussten nicht gesendet werden
+
+    def join(self, key, start=None):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None or flight.done
+            if leader:
+                flight = self.flights[key] = Flight(start)
+            else:
+                self.coalesced += 1
+            with flight.cond:
+                flight.readers += 1
+            return flight, leader
+
+    def land(self, key, flight, result=None, error=None):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.finish(result, error)
+
+    # ----------------------------------------
+    # "func" ausführen - bzw. auf das Ergebnis
+    # des gleichen, laufenden Aufrufs warten.
+    # Zurück kommt (Ergebnis, geteilt).
+    # ----------------------------------------
+    def call(self, key, func, joined=None):
+        flight, leader = self.join(key)
+        if joined is not None:
+            joined(leader)
+        if not leader:
+            flight.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            result = func()
+        except BaseException as ex:
+            self.land(key, flight, error=ex)
+            raise
+        self.land(key, flight, result)
+        return result, False
+
+    # ----------------------------------------
+    # die Teile des Streams, den "start" lie-
+    # fert - einmal gestartet, und an alle
+    # verteilt, die mitlesen. Gelesen wird von
+    # dem, der als erster einen noch fehlen-
+    # den Teil braucht; bricht einer ab, lesen
+    # die anderen weiter. Erst wenn keiner
+    # mehr liest, wird der Stream geschlossen.
+    # ----------------------------------------
+    def stream(self, key, start, joined=None):
+        flight, leader = self.join(key, start)
+        index          = 0
+        try:
+            if joined is not None:
+                joined(leader)
+            while True:
+                with flight.cond:
+                    while index >= len(flight.parts) and not flight.done and flight.pumping:
+                        flight.cond.wait()
+                    if index < len(flight.parts):
+                        part   = flight.parts[index]
+                        index += 1
+                    elif flight.done:
+                        if flight.error is not None:
+                            raise flight.error
+                        return
+                    else:
+                        flight.pumping = True
+                        part = None
+
+                if part is None:
+                    self.pump(key, flight)
+                    continue
+                yield part
+        finally:
+            self.leave(key, flight)
+
+    # ----------------------------------------
+    # ein Leser weniger; war es der letzte,
+    # wird der Stream geschlossen.
+    # ----------------------------------------
+    def leave(self, key, flight):
+        with self.lock:
+            with flight.cond:
+                flight.readers -= 1
+                abandoned = flight.readers == 0 and not flight.done
+            if abandoned and self.flights.get(key) is flight:
+                del self.flights[key]
+
+        if abandoned:
+            flight.finish(error=InterruptedError("abgebrochen"))
+            if hasattr(flight.source, "close"):
+                flight.source.close()
+
+    def pump(self, key, flight):
+        try:
+            if flight.source is None:
+                flight.source = iter(flight.start())
+            part = next(flight.source)
+        except StopIteration:
+            self.land(key, flight)
+        except BaseException as ex:
+            self.land(key, flight, error=ex)
+        else:
+            with flight.cond:
+                flight.parts.append(part)
+        finally:
+            with flight.cond:
+                flight.pumping = False
+                flight.cond.notify_all()
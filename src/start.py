@@ -14,6 +14,8 @@
 # anfangen, und den Benutzer des Skript's/Applikation zu informieren, was er
 # denn so noch so schönes installieren sollte.
 # ----------------------------------------------------------------------------
+from startup import startup_timer   # Stoppuhr für den Start (zuerst laden!)
+
 import os            # operating system stuff
 import sys           # system specifies
 import datetime      # date, and time routines
@@ -23,13 +25,21 @@ import sqlite3       # database: sqlite
 import configparser  # .ini files
 import traceback     # stack exception trace back
 
-from PyQt5.QtWidgets import *             # Qt5 widgets
-from PyQt5.QtGui     import QIcon, QFont  # Qt5 gui
-from PyQt5.QtCore    import pyqtSlot, Qt  # Qt5 core
-
-from openai import OpenAI                 # ChatGPT like AI
+# ----------------------------------------------------------------------------
+# das OpenAI Paket wird erst geladen, wenn es gebraucht wird (chatclient.py) -
+# es kostet beim Start sonst spürbar Zeit.
+#
+# Mit --cli läuft der Chat ohne Fenster (cli.py); dann wird main.py - und
+# damit Qt - gar nicht erst geladen. Ebenso nicht in den Prozessen des Pools
+# von postprocess.py: sie laden dieses Skript als "__mp_main__".
+# ----------------------------------------------------------------------------
+HEADLESS = __name__ == "__main__" and "--cli" in sys.argv[1:]
+WORKER   = __name__ == "__mp_main__"
 
-from main import *
+if not (HEADLESS or WORKER):
+    from main import *
+    
+    startup_timer.mark("Module laden")
 
 # ------------------------------------------------
 # locales an Hand der System-Sprache verwenden ...
@@ -62,6 +72,14 @@ def handle_language(ini_sprache):
 # haben eine höhere Priorität.
 # ------------------------------------------------
 if __name__ == "__main__":
+    # ------------------------------------------------
+    # --startup-report: Zeiten der einzelnen Start-
+    # Abschnitte ausgeben ...
+    # ------------------------------------------------
+    if "--startup-report" in sys.argv:
+        sys.argv.remove("--startup-report")
+        startup_timer.enabled = True
+    
     config = configparser.ConfigParser()
     config.read('config.ini')
 
@@ -69,5 +87,11 @@ if __name__ == "__main__":
    
     loca = handle_language(ini_sprache)
     _    = loca.gettext
-        
+    
+    if HEADLESS:
+        import cli
+        sys.argv.remove("--cli")
+        sys.exit(cli.main(sys.argv[1:], _))
+    
+    startup_timer.mark("Konfiguration")
     main_function()
@@ -0,0 +1,61 @@
+# ----------------------------------------------------------------------------
+# Datei:  startup.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Misst, wie lange die einzelnen Abschnitte beim Start der Anwendung dauern.
+# Mit "python start.py --startup-report" wird die Aufstellung ausgegeben,
+# sobald das Fenster zum ersten Mal gezeichnet ist:
+#
+#    Module laden               412.3 ms
+#    Konfiguration                3.1 ms
+#    ...
+#    gesamt                     687.0 ms  (Budget: 1500 ms)
+#
+# Dieses Modul darf selbst nichts Schweres importieren - es wird als erstes
+# geladen.
+# ----------------------------------------------------------------------------
+import sys           # system specifies
+import time          # high resolution timer
+
+STARTUP_BUDGET_MS = 1500   # Standard-Wert (config.ini: [startup] budget)
+
+class StartupTimer:
+    def __init__(self):
+        self.origin  = time.perf_counter()
+        self.last    = self.origin
+        self.phases  = []      # (name, ms)
+        self.enabled = False   # Aufstellung ausgeben?
+        self.done    = False
+
+    # ----------------------------------------
+    # einen Abschnitt abschließen: gemessen
+    # wird die Zeit seit der letzten Marke.
+    # ----------------------------------------
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def total(self):
+        return (self.last - self.origin) * 1000
+
+    def report(self, budget=STARTUP_BUDGET_MS, file=None):
+        file = file or sys.stderr
+        for name, ms in self.phases:
+            print(f"{name:<26} {ms:8.1f} ms", file=file)
+
+        total = self.total()
+        print(f"{'gesamt':<26} {total:8.1f} ms  (Budget: {budget} ms)", file=file)
+        if total > budget:
+            print("Startzeit liegt über dem Budget!", file=file)
+        return total <= budget
+
+# ----------------------------------------------------------------------------
+# die (einzige) Stoppuhr für den Programm-Start ...
+# ----------------------------------------------------------------------------
+startup_timer = StartupTimer()
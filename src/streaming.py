@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------------
+# Datei:  streaming.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Antworten von ChatGPT können Stück für Stück (stream) abgerufen werden. Der
+# Benutzer sieht dann schon die ersten Worte, während der Rest noch unterwegs
+# ist. Damit schnelle Streams die Qt Ereignis-Schleife nicht mit einem Signal
+# pro Token überfluten, sammelt ein StreamBuffer die Text-Teile, und der
+# StreamRenderer überträgt sie höchstens einmal pro Bild (Frame) in den
+# Chat-Verlauf.
+# ----------------------------------------------------------------------------
+import threading     # locks
+import time          # time measurement
+
+from PyQt5.QtCore    import QObject, QTimer, pyqtSignal
+
+# ----------------------------------------------------------------------------
+# ca. 60 Bilder pro Sekunde
+# ----------------------------------------------------------------------------
+FRAME_INTERVAL_MS = 16
+
+# ----------------------------------------------------------------------------
+# Zwischenspeicher zwischen Hintergrund-Thread (schreibt) und GUI (liest):
+# ----------------------------------------------------------------------------
+class StreamBuffer:
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.parts   = []
+        self.done    = False
+        self.error   = None
+        self.started = time.perf_counter()
+        self.first   = None   # Zeitpunkt des ersten Text-Teils
+
+    def append(self, text):
+        with self.lock:
+            if self.first is None:
+                self.first = time.perf_counter()
+            self.parts.append(text)
+
+    def finish(self, error=None):
+        with self.lock:
+            if self.done:
+                return
+            self.done  = True
+            self.error = error
+
+    # ----------------------------------------
+    # alles bisher gesammelte abholen ...
+    # ----------------------------------------
+    def take(self):
+        with self.lock:
+            text = "".join(self.parts)
+            self.parts = []
+            return text, self.done, self.error
+
+    def time_to_first_token(self):
+        if self.first is None:
+            return None
+        return self.first - self.started
+
+# ----------------------------------------------------------------------------
+# erzeugt die Job-Funktion für den RequestExecutor (worker.py), die einen
+# Stream vom Server liest. "chunks(cancelled)" liefert einen beliebigen Ite-
+# rator über Text-Teile (z.B. chatclient.stream_chat); "cancelled" ist
+# job.is_cancelled - damit endet auch das Warten auf die Rate-Limits. Bei
+# einem Abbruch wird der Stream geschlossen, und damit auch die Verbindung
+# zum Server.
+# ----------------------------------------------------------------------------
+def stream_job(chunks, buffer):
+    def run(job):
+        iterator = chunks(job.is_cancelled)
+        try:
+            for text in iterator:
+                if job.is_cancelled():
+                    break
+                buffer.append(text)
+        except Exception as ex:
+            buffer.finish(f"{ex}")
+            raise
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+        buffer.finish("abgebrochen" if job.is_cancelled() else None)
+        return buffer
+    return run
+
+# ----------------------------------------------------------------------------
+# überträgt den Inhalt eines StreamBuffer's in eine Chat-Nachricht. Es wird
+# pro Frame höchstens einmal das Model geändert, und damit auch höchstens
+# einmal neu gezeichnet.
+# ----------------------------------------------------------------------------
+class StreamRenderer(QObject):
+    first_token = pyqtSignal(float)   # Zeit bis zum ersten Token (Sekunden)
+    finished    = pyqtSignal(str)     # vollständiger Text
+    failed      = pyqtSignal(str)     # Fehlermeldung
+
+    def __init__(self, model, delegate, message, buffer, parent=None):
+        super(StreamRenderer, self).__init__(parent)
+        self.model    = model
+        self.delegate = delegate
+        self.message  = message
+        self.buffer   = buffer
+        self.reported = False
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self):
+        self.timer.start()
+
+    def flush(self):
+        text, done, error = self.buffer.take()
+
+        if text:
+            if not self.reported:
+                self.reported = True
+                self.first_token.emit(self.buffer.time_to_first_token())
+
+            index = self.model.append_text(self.message, text)
+            if index is not None:
+                self.delegate.sizeHintChanged.emit(index)
+
+        if done:
+            self.timer.stop()
+            if error is None:
+                self.finished.emit(self.message.text)
+            else:
+                self.failed.emit(error)
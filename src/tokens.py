@@ -0,0 +1,44 @@
+# ----------------------------------------------------------------------------
+# Datei:  tokens.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# OpenAI rechnet nicht in Zeichen, sondern in Token ab. Ist das Paket
+# "tiktoken" installiert, zählen wir genau so wie der Server; ansonsten wird
+# geschätzt (ca. 4 Zeichen pro Token).
+# ----------------------------------------------------------------------------
+try:
+    import tiktoken  # exact token counting (optional)
+except ImportError:
+    tiktoken = None
+
+_encodings = {}
+
+# ----------------------------------------------------------------------------
+# Encoding für ein Model holen (und merken, da das Laden teuer ist) ...
+# ----------------------------------------------------------------------------
+def get_encoding(model):
+    if tiktoken is None:
+        return None
+
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return encoding
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    if not text:
+        return 0
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, (len(text) + 3) // 4)
+    return len(encoding.encode(text))
@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------------
+# Datei:  worker.py
+# Author: Jens Kallup - paule32
+#
+# Rechte: (c) 2023 by kallup non-profit software
+#         Alle Rechte vorbehalten.
+#
+# Nur für schulische, oder nicht kommerzielle Zwecke !!!
+#
+# Anfragen an den OpenAI Server dauern oft mehrere Sekunden. Würden wir sie
+# direkt in einem Qt-Slot ausführen, wäre das HauptFenster für die gesamte
+# Zeit eingefroren. Der RequestExecutor führt solche Anfragen deshalb auf
+# eigenen Threads (QThread) aus, und liefert die Ergebnisse über Qt-Signale
+# zurück an die GUI.
+#
+# Beispiel:
+#
+#    executor = RequestExecutor(workers=4)
+#    executor.result.connect(lambda job_id, value: print(value))
+#    job_id = executor.submit(lambda job: complete_chat(messages), "Anfrage")
+#    executor.cancel(job_id)
+#
+# Wartende Jobs werden nach "priority" (kleiner = früher) abgearbeitet; so
+# überholt eine Chat-Eingabe die Arbeiten, die im Hintergrund warten.
+# ----------------------------------------------------------------------------
+import itertools     # counter
+import queue         # thread safe queue
+import threading     # locks, and events
+
+from PyQt5.QtCore    import QObject, QThread, pyqtSignal
+
+# ----------------------------------------------------------------------------
+# eine einzelne Aufgabe. Die Funktion "func" bekommt den Job übergeben und
+# sollte bei länger laufenden Arbeiten (z.B. beim Lesen eines Streams) ab und
+# zu "job.is_cancelled()" prüfen.
+# ----------------------------------------------------------------------------
+class RequestJob:
+    def __init__(self, job_id, func, label):
+        self.job_id    = job_id
+        self.func      = func
+        self.label     = label
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+# ----------------------------------------------------------------------------
+# ein Arbeits-Thread: holt Jobs aus der Warteschlange, bis er ein "None"
+# bekommt.
+# ----------------------------------------------------------------------------
+class RequestThread(QThread):
+    def __init__(self, executor):
+        super(RequestThread, self).__init__()
+        self.executor = executor
+
+    def run(self):
+        while True:
+            _, _, job = self.executor.jobs.get()
+            if job is None:
+                return
+            self.executor.run_job(job)
+
+# ----------------------------------------------------------------------------
+# der Executor selbst ...
+# ----------------------------------------------------------------------------
+class RequestExecutor(QObject):
+    started   = pyqtSignal(int, str)      # job_id, label
+    result    = pyqtSignal(int, object)   # job_id, Ergebnis
+    error     = pyqtSignal(int, str)      # job_id, Fehlermeldung
+    cancelled = pyqtSignal(int)           # job_id
+    progress  = pyqtSignal(int, int)      # wartend, laufend
+
+    def __init__(self, workers=4, parent=None):
+        super(RequestExecutor, self).__init__(parent)
+
+        self.jobs    = queue.PriorityQueue()   # (priority, job_id, job)
+        self.lock    = threading.Lock()
+        self.counter = itertools.count(1)
+        self.pending = {}   # job_id => RequestJob (wartend)
+        self.running = {}   # job_id => RequestJob (laufend)
+
+        self.threads = [RequestThread(self) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    # ----------------------------------------
+    # neuen Job einreihen; zurück kommt die
+    # job_id, über die die Signale zugeordnet
+    # werden können.
+    # ----------------------------------------
+    def submit(self, func, label="", priority=0):
+        job = RequestJob(next(self.counter), func, label)
+        with self.lock:
+            self.pending[job.job_id] = job
+        self.jobs.put((priority, job.job_id, job))
+        self.report_progress()
+        return job.job_id
+
+    # ----------------------------------------
+    # Job abbrechen: wartende Jobs werden gar
+    # nicht erst gestartet, laufende Jobs be-
+    # kommen das Abbruch-Flag gesetzt.
+    # ----------------------------------------
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.pending.get(job_id) or self.running.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self):
+        with self.lock:
+            jobs = list(self.pending.values()) + list(self.running.values())
+        for job in jobs:
+            job.cancel()
+
+    def counts(self):
+        with self.lock:
+            return len(self.pending), len(self.running)
+
+    def report_progress(self):
+        pending, running = self.counts()
+        self.progress.emit(pending, running)
+
+    # ----------------------------------------
+    # wird von den Arbeits-Threads aufgerufen:
+    # ----------------------------------------
+    def run_job(self, job):
+        with self.lock:
+            self.pending.pop(job.job_id, None)
+            if not job.is_cancelled():
+                self.running[job.job_id] = job
+
+        if job.is_cancelled():
+            self.cancelled.emit(job.job_id)
+            self.report_progress()
+            return
+
+        self.started.emit(job.job_id, job.label)
+        self.report_progress()
+
+        try:
+            value = job.func(job)
+        except Exception as ex:
+            value = ex
+
+        with self.lock:
+            self.running.pop(job.job_id, None)
+
+        if job.is_cancelled():
+            self.cancelled.emit(job.job_id)
+        elif isinstance(value, Exception):
+            self.error.emit(job.job_id, f"{value}")
+        else:
+            self.result.emit(job.job_id, value)
+
+        self.report_progress()
+
+    # ----------------------------------------
+    # beim Beenden der Anwendung: alle Jobs ab-
+    # brechen, und auf die Threads warten.
+    # ----------------------------------------
+    def shutdown(self, wait_ms=2000):
+        self.cancel_all()
+        for _ in self.threads:
+            self.jobs.put((-1, 0, None))
+        for thread in self.threads:
+            thread.wait(wait_ms)